@@ -1,18 +1,44 @@
 import os
 import sqlite3
 import xml.etree.ElementTree as ET
+from xml.parsers import expat
 import json
 import requests
+import redis
+from requests.adapters import HTTPAdapter
 import time
 import io
+import mmap
 import zipfile
+import hashlib
+import shutil
+import uuid
 import re
-from flask import Flask, jsonify, request, send_file
+import random
+import unicodedata
+import tempfile
+import threading
+from array import array
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape as escape_xml_text
+from flask import (Flask, Response, jsonify, request, send_file,
+                   stream_with_context)
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import dump_options_header
+from werkzeug.sansio.multipart import (Data, Epilogue, Field, File,
+                                       MultipartDecoder, NeedData)
 from dotenv import load_dotenv
 from flask_cors import CORS
-from celery import Celery
-from contextlib import contextmanager
-from datetime import datetime, timedelta
+from celery import Celery, chord, group
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
 
 
 # --- SETUP ---
@@ -69,6 +95,144 @@ MAIN_GENRE_BUCKETS = [
     "Miscellaneous"
 ]
 
+# Maximum number of concurrent AI tagging calls per job
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 8))
+
+# Number of tracks sent per AI tagging request (1 disables batching)
+LLM_BATCH_SIZE = int(os.environ.get("LLM_BATCH_SIZE", 1))
+
+# Number of tracks buffered before each database write during a job
+TRACK_WRITE_BATCH_SIZE = int(os.environ.get("TRACK_WRITE_BATCH_SIZE", 500))
+
+# SQLite database location and connection tuning
+DATABASE_PATH = os.environ.get("DATABASE_PATH", "tag_genius.db")
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 20000))
+
+# Stored in PRAGMA user_version by migrate_schema. Bump it whenever
+# migrate_schema changes, so existing databases are migrated the next time
+# a web or worker process opens them.
+SCHEMA_VERSION = 2
+
+# OpenAI-compatible API endpoint and HTTP client tuning
+OPENAI_BASE_URL = os.environ.get(
+    "OPENAI_BASE_URL", "https://api.openai.com/v1"
+).rstrip('/')
+OPENAI_CHAT_URL = f"{OPENAI_BASE_URL}/chat/completions"
+OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE",
+                                    max(16, LLM_MAX_CONCURRENCY)))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 5))
+
+# AI requests share one token-bucket limiter across every worker. Limits
+# start from these per-minute values (0 means unknown) and follow the
+# provider's x-ratelimit-* headers once seen, scaled by
+# LLM_RATE_LIMIT_HEADROOM so all workers together stay just under them.
+LLM_REQUESTS_PER_MINUTE = float(os.environ.get("LLM_REQUESTS_PER_MINUTE", 0))
+LLM_TOKENS_PER_MINUTE = float(os.environ.get("LLM_TOKENS_PER_MINUTE", 0))
+LLM_RATE_LIMIT_HEADROOM = float(os.environ.get("LLM_RATE_LIMIT_HEADROOM",
+                                               0.9))
+LLM_RATE_LIMIT_REDIS_URL = os.environ.get("LLM_RATE_LIMIT_REDIS_URL",
+                                          app.config['CELERY_BROKER_URL'])
+LLM_RATE_LIMIT_REDIS_KEY = "tag_genius:llm_rate_limit"
+LLM_COMPLETION_TOKENS_ESTIMATE = 300
+
+# Concurrent lookups of the same track, in this process or in other
+# workers, share one AI call. A waiting job makes its own call if the
+# other lookup has not finished after LLM_COALESCE_WAIT_SECONDS.
+LLM_COALESCE_WAIT_SECONDS = float(os.environ.get("LLM_COALESCE_WAIT_SECONDS",
+                                                 120))
+LLM_COALESCE_POLL_SECONDS = 0.25
+LLM_COALESCE_REDIS_PREFIX = "tag_genius:lookup:"
+
+# Job event stream tuning (seconds). Each stream ends after
+# JOB_EVENTS_MAX_SECONDS, well inside a gunicorn worker timeout, and the
+# browser reconnects after JOB_EVENTS_RETRY_MS.
+JOB_EVENTS_POLL_SECONDS = float(os.environ.get("JOB_EVENTS_POLL_SECONDS", 1))
+JOB_EVENTS_HEARTBEAT_SECONDS = 15
+JOB_EVENTS_MAX_SECONDS = float(os.environ.get("JOB_EVENTS_MAX_SECONDS", 25))
+JOB_EVENTS_RETRY_MS = 2000
+
+# Metrics are aggregated across web and worker processes in this Redis
+METRICS_REDIS_URL = os.environ.get("METRICS_REDIS_URL",
+                                   app.config['CELERY_BROKER_URL'])
+METRICS_REDIS_KEY = "tag_genius:metrics"
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", 5))
+
+# XML is parsed and serialised with lxml when it is installed ("auto"), or
+# always with the standard library when XML_BACKEND is "stdlib". Both write
+# identical output.
+XML_BACKEND = os.environ.get("XML_BACKEND", "auto")
+
+# Tagging jobs checkpoint every JOB_CHECKPOINT_INTERVAL tracks. A job whose
+# checkpoint has not moved for JOB_STALE_MINUTES is presumed dead and may be
+# resumed. Failed jobs stay resumable for JOB_CHECKPOINT_RETENTION_DAYS,
+# after which their checkpoint and partial output are deleted.
+JOB_CHECKPOINT_INTERVAL = int(os.environ.get("JOB_CHECKPOINT_INTERVAL", 500))
+JOB_STALE_MINUTES = int(os.environ.get("JOB_STALE_MINUTES", 10))
+JOB_CHECKPOINT_RETENTION_DAYS = int(
+    os.environ.get("JOB_CHECKPOINT_RETENTION_DAYS", 7)
+)
+
+# Large tagging jobs can be split into chunks of TAG_CHUNK_SIZE tracks that
+# run as separate Celery tasks. Jobs with at least TAG_CHUNKED_MIN_TRACKS
+# tracks are chunked automatically (0 leaves it to the job's config).
+TAG_CHUNK_SIZE = int(os.environ.get("TAG_CHUNK_SIZE", 2000))
+TAG_CHUNKED_MIN_TRACKS = int(os.environ.get("TAG_CHUNKED_MIN_TRACKS", 0))
+
+# Uploads are read from the request in UPLOAD_CHUNK_KB chunks and never
+# buffered whole; requests over MAX_UPLOAD_MB are refused with a 413.
+MAX_UPLOAD_MB = int(os.environ.get("MAX_UPLOAD_MB", 500))
+UPLOAD_CHUNK_BYTES = int(os.environ.get("UPLOAD_CHUNK_KB", 1024)) * 1024
+UPLOAD_MAX_FIELD_BYTES = 1024 * 1024
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
+
+# Job archives are streamed to the client while a copy is written to
+# ARCHIVE_CACHE_DIR; repeat downloads are served from that copy until either
+# job file changes. ARCHIVE_COMPRESSION_LEVEL is the deflate level (1-9), or 0
+# to store the files uncompressed.
+ARCHIVE_CACHE_DIR = os.environ.get("ARCHIVE_CACHE_DIR", "archives")
+ARCHIVE_COMPRESSION_LEVEL = int(os.environ.get("ARCHIVE_COMPRESSION_LEVEL", 6))
+ARCHIVE_CHUNK_BYTES = 1024 * 1024
+
+# Job history pagination
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
+HISTORY_FIELDS = [
+    "id", "timestamp", "job_display_name", "original_filename",
+    "input_file_path", "output_file_path", "track_count", "status",
+    "job_type", "resumable", "result_data"
+]
+# History fields computed rather than read from a column. A job is
+# resumable while it is unfinished and still has a checkpoint.
+HISTORY_COMPUTED_FIELDS = {
+    "resumable": "(status != 'Completed' AND id IN "
+                 "(SELECT job_id FROM job_checkpoints)) AS resumable"
+}
+
+# Track search pagination. Only tags with up to TRACK_SEARCH_COUNT_CAP links
+# are counted exactly when choosing which tag drives an AND search.
+TRACK_SEARCH_PAGE_SIZE = 50
+TRACK_SEARCH_MAX_PAGE_SIZE = 500
+TRACK_SEARCH_COUNT_CAP = 10000
+TRACK_SEARCH_FIELDS = [
+    "id", "name", "artist", "bpm", "tonality", "genre", "label", "comments",
+    "grouping"
+]
+
+# TRACK attributes that decide how a track is tagged, rendered and saved
+# to the tracks table, and the attributes tagging writes. Incremental jobs
+# reuse a stored render when the fingerprint of the first set is unchanged.
+TRACK_FINGERPRINT_ATTRIBUTES = [
+    "Name", "Artist", "Genre", "Year", "Comments", "Colour", "Grouping",
+    "AverageBpm", "Tonality", "Label"
+]
+TRACK_RENDERED_ATTRIBUTES = ["Comments", "Rating", "Genre", "Colour",
+                             "Grouping"]
+
+# TRACK attributes a chunk task needs to tag and render a track on its own
+CHUNK_TRACK_ATTRIBUTES = TRACK_FINGERPRINT_ATTRIBUTES
+
 # Master Blueprint Configuration
 MASTER_BLUEPRINT_CONFIG = {
     "level": "Detailed",
@@ -80,29 +244,332 @@ MASTER_BLUEPRINT_CONFIG = {
 }
 
 
+# --- METRICS ---
+
+# Prometheus metric definitions: name -> (type, help, histogram buckets)
+METRICS = {
+    "tag_genius_llm_request_seconds": (
+        "histogram", "Latency of AI chat-completion requests by mode.",
+        (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60)
+    ),
+    "tag_genius_llm_retries_total": (
+        "counter", "AI requests retried after a network or HTTP error.", None
+    ),
+    "tag_genius_llm_errors_total": (
+        "counter", "Failed AI request attempts by mode and error type.", None
+    ),
+    "tag_genius_llm_rate_limit_wait_seconds": (
+        "histogram", "Time AI requests waited for the shared rate limiter.",
+        (0.1, 0.5, 1, 2, 5, 10, 30, 60)
+    ),
+    "tag_genius_llm_calls_coalesced_total": (
+        "counter", "AI lookups saved by sharing an identical lookup, by "
+        "scope (job, process or cluster).", None
+    ),
+    "tag_genius_llm_batch_fallbacks_total": (
+        "counter", "Tracks re-sent singly after a batch response missed "
+        "them.", None
+    ),
+    "tag_genius_blueprint_cache_total": (
+        "counter", "Blueprint cache checks during tagging by result.", None
+    ),
+    "tag_genius_sqlite_seconds": (
+        "histogram", "Time spent in each outermost db_cursor block.",
+        (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+    ),
+    "tag_genius_tracks_processed_total": (
+        "counter", "Tracks processed by job type.", None
+    ),
+    "tag_genius_jobs_total": (
+        "counter", "Finished jobs by job type and status.", None
+    ),
+    "tag_genius_jobs_in_flight": (
+        "gauge", "Jobs currently In Progress by job type.", None
+    ),
+    "tag_genius_queue_depth": (
+        "gauge", "Tasks waiting in the Celery queue.", None
+    )
+}
+
+# Per-process metric values. 'pending' holds deltas not yet added to
+# Redis; 'totals' holds everything this process has recorded and is served
+# when Redis is unreachable. After a failed flush Redis is left alone
+# until 'redis_retry_at'.
+_metrics_state = {'pending': {}, 'totals': {}, 'pid': None,
+                  'last_flush': 0.0, 'redis': None, 'redis_ok': True,
+                  'redis_retry_at': 0.0, 'flushing': False}
+_metrics_lock = threading.Lock()
+
+
+def format_metric_labels(labels):
+    """Render a label dict as a Prometheus {key="value",...} suffix."""
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in sorted(labels.items()):
+        value = (str(value).replace('\\', '\\\\').replace('"', '\\"')
+                 .replace('\n', '\\n'))
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def metric_sort_key(field):
+    """Sort samples by labels, with histogram buckets in ascending order."""
+    le = re.search(r'le="([^"]+)"', field)
+    if not le:
+        return (field, 0.0)
+    return (field.replace(le.group(0), ''), float(le.group(1)))
+
+
+def record_metric_fields(fields):
+    """Add {sample line: delta} to this process's metrics.
+
+    Deltas are pushed to Redis at most every METRICS_FLUSH_SECONDS from a
+    background thread, so a slow Redis never stalls the caller, and again
+    by flush_metrics at the end of each job.
+    """
+    with _metrics_lock:
+        if _metrics_state['pid'] != os.getpid():
+            # A forked worker must not re-send its parent's values.
+            _metrics_state.update(pending={}, totals={}, pid=os.getpid(),
+                                  last_flush=time.monotonic(), redis=None,
+                                  redis_retry_at=0.0, flushing=False)
+        for field, delta in fields.items():
+            _metrics_state['pending'][field] = (
+                _metrics_state['pending'].get(field, 0) + delta
+            )
+            _metrics_state['totals'][field] = (
+                _metrics_state['totals'].get(field, 0) + delta
+            )
+        due = (not _metrics_state['flushing'] and
+               time.monotonic() - _metrics_state['last_flush'] >=
+               METRICS_FLUSH_SECONDS)
+        if due:
+            _metrics_state['flushing'] = True
+    if due:
+        threading.Thread(target=flush_metrics, daemon=True).start()
+
+
+def inc_metric(name, labels=None, amount=1):
+    """Increment a counter."""
+    record_metric_fields({f"{name}{format_metric_labels(labels)}": amount})
+
+
+def observe_metric(name, value, labels=None):
+    """Record one histogram observation."""
+    labels = labels or {}
+    fields = {
+        f"{name}_sum{format_metric_labels(labels)}": value,
+        f"{name}_count{format_metric_labels(labels)}": 1,
+        f"{name}_bucket{format_metric_labels({**labels, 'le': '+Inf'})}": 1
+    }
+    for bound in METRICS[name][2]:
+        if value <= bound:
+            fields[f"{name}_bucket"
+                   f"{format_metric_labels({**labels, 'le': bound})}"] = 1
+    record_metric_fields(fields)
+
+
+def get_metrics_redis():
+    """Return this process's Redis client for metrics."""
+    if _metrics_state['redis'] is None:
+        _metrics_state['redis'] = redis.Redis.from_url(
+            METRICS_REDIS_URL, socket_timeout=1, socket_connect_timeout=1
+        )
+    return _metrics_state['redis']
+
+
+def flush_metrics():
+    """Add this process's pending metric deltas to the shared Redis hash.
+
+    After a failed flush, further flushes are skipped for 30 seconds and
+    the deltas are kept until Redis is back.
+    """
+    try:
+        with _metrics_lock:
+            _metrics_state['last_flush'] = time.monotonic()
+            if time.monotonic() < _metrics_state['redis_retry_at']:
+                return
+            pending = _metrics_state['pending']
+            _metrics_state['pending'] = {}
+        if not pending:
+            return
+        pipe = get_metrics_redis().pipeline(transaction=False)
+        for field, delta in pending.items():
+            pipe.hincrbyfloat(METRICS_REDIS_KEY, field, delta)
+        pipe.execute()
+        _metrics_state['redis_ok'] = True
+    except redis.RedisError as e:
+        if _metrics_state['redis_ok']:
+            print(f"Metrics flush to Redis failed, keeping values "
+                  f"locally: {e}")
+        _metrics_state['redis_ok'] = False
+        with _metrics_lock:
+            _metrics_state['redis_retry_at'] = time.monotonic() + 30
+            for field, delta in pending.items():
+                _metrics_state['pending'][field] = (
+                    _metrics_state['pending'].get(field, 0) + delta
+                )
+    finally:
+        _metrics_state['flushing'] = False
+
+
+def read_metric_values():
+    """Return every recorded sample, aggregated across processes if possible.
+
+    Falls back to this process's own totals when Redis is unreachable.
+    """
+    flush_metrics()
+    if time.monotonic() >= _metrics_state['redis_retry_at']:
+        try:
+            raw = get_metrics_redis().hgetall(METRICS_REDIS_KEY)
+            return {field.decode('utf-8'): float(value)
+                    for field, value in raw.items()}
+        except redis.RedisError as e:
+            print(f"Could not read metrics from Redis: {e}")
+            _metrics_state['redis_retry_at'] = time.monotonic() + 30
+    with _metrics_lock:
+        return dict(_metrics_state['totals'])
+
+
+def read_metric_gauges():
+    """Measure jobs in flight and Celery queue depth at scrape time."""
+    samples = {}
+    try:
+        with db_cursor() as cursor:
+            cursor.execute(
+                "SELECT job_type, COUNT(*) AS jobs FROM processing_log "
+                "WHERE status = 'In Progress' GROUP BY job_type"
+            )
+            for row in cursor.fetchall():
+                labels = format_metric_labels({"job_type": row['job_type']})
+                samples[f"tag_genius_jobs_in_flight{labels}"] = row['jobs']
+    except sqlite3.Error as e:
+        print(f"Could not count jobs in flight: {e}")
+
+    queue = celery.conf.task_default_queue or "celery"
+    try:
+        broker = redis.Redis.from_url(app.config['CELERY_BROKER_URL'],
+                                      socket_timeout=1,
+                                      socket_connect_timeout=1)
+        depth = broker.llen(queue)
+        labels = format_metric_labels({"queue": queue})
+        samples[f"tag_genius_queue_depth{labels}"] = depth
+    except redis.RedisError as e:
+        print(f"Could not read Celery queue depth: {e}")
+    return samples
+
+
+def render_metrics(samples):
+    """Render samples in the Prometheus text exposition format."""
+    by_metric = {}
+    for field, value in samples.items():
+        base = field.split('{', 1)[0]
+        for suffix in ("_bucket", "_sum", "_count"):
+            if base.endswith(suffix) and base[:-len(suffix)] in METRICS:
+                base = base[:-len(suffix)]
+                break
+        by_metric.setdefault(base, []).append((field, value))
+
+    lines = []
+    for name, (metric_type, help_text, _) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for field, value in sorted(by_metric.get(name, []),
+                                   key=lambda item: metric_sort_key(item[0])):
+            number = int(value) if float(value).is_integer() else value
+            lines.append(f"{field} {number}")
+    return "\n".join(lines) + "\n"
+
+
 # --- DATABASE FUNCTIONS ---
 
-def get_db_connection():
-    """Establishes and returns a connection to the SQLite database."""
-    conn = sqlite3.connect('tag_genius.db')
+# Per-thread connection cache used by get_db_connection
+_db_local = threading.local()
+
+
+def connect_db():
+    """Open a new SQLite connection tuned for concurrent web and workers."""
+    conn = sqlite3.connect(DATABASE_PATH,
+                           timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {int(SQLITE_BUSY_TIMEOUT_MS)}")
+    conn.execute(f"PRAGMA cache_size = -{int(SQLITE_CACHE_SIZE_KB)}")
+    return conn
+
+
+def get_db_connection():
+    """Return this thread's SQLite connection, opening it on first use.
+
+    Connections are reused per thread and per process, so forked Celery
+    workers never share a connection with their parent.
+    """
+    conn = getattr(_db_local, 'conn', None)
+    if conn is None or getattr(_db_local, 'pid', None) != os.getpid():
+        conn = connect_db()
+        ensure_schema(conn)
+        _db_local.conn = conn
+        _db_local.pid = os.getpid()
+        _db_local.depth = 0
     return conn
 
 
 @contextmanager
 def db_cursor():
-    """A context manager for handling database connections and cursors."""
+    """A context manager for handling database connections and cursors.
+
+    Nested uses on the same thread share the outer transaction, which is
+    committed or rolled back only by the outermost block, and timed as
+    one tag_genius_sqlite_seconds observation.
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
+    _db_local.depth += 1
+    start = time.perf_counter()
     try:
         yield cursor
-        conn.commit()
+        if _db_local.depth == 1:
+            conn.commit()
     except sqlite3.Error as e:
-        conn.rollback()
+        if _db_local.depth == 1:
+            conn.rollback()
         print(f"Database transaction failed: {e}")
         raise e
+    except BaseException:
+        if _db_local.depth == 1:
+            conn.rollback()
+        raise
     finally:
+        _db_local.depth -= 1
+        cursor.close()
+        if _db_local.depth == 0:
+            observe_metric("tag_genius_sqlite_seconds",
+                           time.perf_counter() - start)
+
+
+def ensure_schema(conn):
+    """Migrate an existing database whose schema predates SCHEMA_VERSION.
+
+    Runs on every new connection, so web and worker processes never write
+    to a database missing the columns and indexes they rely on. A database
+    without a tracks table is left for init-db to create.
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    if not conn.execute(
+            "SELECT 1 FROM sqlite_master "
+            "WHERE type = 'table' AND name = 'tracks'").fetchone():
+        return
+    try:
+        with conn:
+            migrate_schema(conn.cursor())
+    except sqlite3.Error as e:
         conn.close()
+        print(f"Database migration failed: {e}")
+        raise
+    print(f"Database migrated to schema version {SCHEMA_VERSION}.")
 
 
 @app.cli.command('init-db')
@@ -122,7 +589,8 @@ def init_db():
                     label TEXT,
                     comments TEXT,
                     grouping TEXT,
-                    tags_json TEXT
+                    tags_json TEXT,
+                    lookup_key TEXT
                 );
             """)
             # Tags Table
@@ -167,11 +635,217 @@ def init_db():
                     action_description TEXT NOT NULL
                 );
             """)
+            migrate_schema(cursor)
         print('Database with all tables initialized successfully.')
     except sqlite3.Error as e:
         print(f"Database initialisation failed: {e}")
 
 
+def migrate_schema(cursor):
+    """Bring an existing database up to date with indexes and constraints.
+
+    Every step is idempotent, so this runs safely on new and old databases.
+    """
+    # Genre-to-bucket answers for split jobs, keyed by normalised genre.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS genre_buckets (
+            genre_key TEXT PRIMARY KEY,
+            genre TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    # Rendered attributes from tagging jobs, keyed by library and track
+    # fingerprint, for incremental re-tagging. Each render records the
+    # lookup key of the blueprint it came from.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS track_renders (
+            library_key TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            rendered_json TEXT NOT NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            lookup_key TEXT,
+            PRIMARY KEY (library_key, fingerprint)
+        );
+    """)
+    render_columns = {row['name'] for row in
+                      cursor.execute("PRAGMA table_info(track_renders)")}
+    if 'lookup_key' not in render_columns:
+        # Older renders were keyed by filename alone and cannot be tied
+        # to a blueprint, so they are dropped rather than trusted.
+        cursor.execute("DELETE FROM track_renders")
+        cursor.execute("ALTER TABLE track_renders ADD COLUMN lookup_key TEXT")
+
+    # Progress of running tagging jobs, so a crashed job can resume.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS job_checkpoints (
+            job_id INTEGER PRIMARY KEY,
+            run_id TEXT NOT NULL,
+            input_path TEXT NOT NULL,
+            output_path TEXT NOT NULL,
+            partial_path TEXT,
+            config_json TEXT NOT NULL,
+            track_index INTEGER NOT NULL DEFAULT 0,
+            output_offset INTEGER NOT NULL DEFAULT 0,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    # Blueprint lookups match on (name, artist). Remove any duplicate rows
+    # left by concurrent inserts (keeping the newest) before the unique
+    # index is created.
+    cursor.execute("""
+        DELETE FROM tracks
+        WHERE artist IS NOT NULL AND id NOT IN (
+            SELECT MAX(id) FROM tracks GROUP BY name, artist
+        )
+    """)
+    cursor.execute("""
+        DELETE FROM track_tags
+        WHERE track_id NOT IN (SELECT id FROM tracks)
+    """)
+    cursor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_tracks_name_artist "
+        "ON tracks (name, artist)"
+    )
+
+    # Blueprint cache reads match on the normalised lookup key, so
+    # spelling variants of one track share its blueprint. Backfill the key
+    # for rows saved before the column existed.
+    track_columns = {row['name'] for row in
+                     cursor.execute("PRAGMA table_info(tracks)")}
+    if 'lookup_key' not in track_columns:
+        cursor.execute("ALTER TABLE tracks ADD COLUMN lookup_key TEXT")
+    unkeyed = cursor.execute(
+        "SELECT id, name, artist FROM tracks WHERE lookup_key IS NULL"
+    ).fetchall()
+    cursor.executemany(
+        "UPDATE tracks SET lookup_key = ? WHERE id = ?",
+        [(track_lookup_key(row['name'], row['artist']), row['id'])
+         for row in unkeyed]
+    )
+    if unkeyed:
+        print(f"Backfilled lookup keys for {len(unkeyed)} track(s).")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_tracks_lookup_key "
+        "ON tracks (lookup_key)"
+    )
+
+    # A stored render is only valid for the blueprint it was made from, so
+    # saving a new or different blueprint drops renders under its key.
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_track_renders_lookup_key "
+        "ON track_renders (lookup_key)"
+    )
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS tracks_renders_insert
+        AFTER INSERT ON tracks WHEN new.tags_json IS NOT NULL BEGIN
+            DELETE FROM track_renders WHERE lookup_key = new.lookup_key;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS tracks_renders_update
+        AFTER UPDATE OF tags_json, lookup_key ON tracks
+        WHEN old.tags_json IS NOT new.tags_json
+            OR old.lookup_key IS NOT new.lookup_key
+        BEGIN
+            DELETE FROM track_renders
+            WHERE lookup_key IN (old.lookup_key, new.lookup_key);
+        END
+    """)
+
+    # Track search walks a tag's links in track order and filters by BPM.
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_track_tags_tag "
+        "ON track_tags (tag_id, track_id)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_tracks_bpm ON tracks (bpm)"
+    )
+
+    # Full-text index over track names, artists, labels and comments. It
+    # reads from tracks and is kept in step by triggers; an index created
+    # on a database that already has tracks is rebuilt from them.
+    has_search_index = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'track_search'"
+    ).fetchone()
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS track_search USING fts5(
+                name, artist, label, comments,
+                content='tracks', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"Full-text track search unavailable: {e}")
+    else:
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS tracks_search_insert
+            AFTER INSERT ON tracks BEGIN
+                INSERT INTO track_search (rowid, name, artist, label, comments)
+                VALUES (new.id, new.name, new.artist, new.label,
+                        new.comments);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS tracks_search_delete
+            AFTER DELETE ON tracks BEGIN
+                INSERT INTO track_search
+                    (track_search, rowid, name, artist, label, comments)
+                VALUES ('delete', old.id, old.name, old.artist, old.label,
+                        old.comments);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS tracks_search_update
+            AFTER UPDATE OF name, artist, label, comments ON tracks
+            WHEN old.name IS NOT new.name OR old.artist IS NOT new.artist
+                OR old.label IS NOT new.label
+                OR old.comments IS NOT new.comments
+            BEGIN
+                INSERT INTO track_search
+                    (track_search, rowid, name, artist, label, comments)
+                VALUES ('delete', old.id, old.name, old.artist, old.label,
+                        old.comments);
+                INSERT INTO track_search (rowid, name, artist, label, comments)
+                VALUES (new.id, new.name, new.artist, new.label,
+                        new.comments);
+            END
+        """)
+        if not has_search_index:
+            cursor.execute(
+                "INSERT INTO track_search (track_search) VALUES ('rebuild')"
+            )
+
+    # Job history is paged by id and filtered by status and job type.
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_processing_log_status "
+        "ON processing_log (status, id)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_processing_log_job_type_status "
+        "ON processing_log (job_type, status, id)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_processing_log_timestamp "
+        "ON processing_log (timestamp)"
+    )
+    cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+@app.cli.command('migrate-db')
+def migrate_db():
+    """Apply schema migrations to an existing database."""
+    try:
+        with db_cursor() as cursor:
+            migrate_schema(cursor)
+        print('Database migrated successfully.')
+    except sqlite3.Error as e:
+        print(f"Database migration failed: {e}")
+
+
 @app.cli.command('drop-tables')
 def drop_tables():
     """Drop all application tables from the database."""
@@ -180,21 +854,71 @@ def drop_tables():
             print("Dropping all application tables...")
             cursor.execute("DROP TABLE IF EXISTS track_tags")
             cursor.execute("DROP TABLE IF EXISTS tags")
+            cursor.execute("DROP TABLE IF EXISTS track_search")
             cursor.execute("DROP TABLE IF EXISTS tracks")
             cursor.execute("DROP TABLE IF EXISTS processing_log")
             cursor.execute("DROP TABLE IF EXISTS user_actions")
+            cursor.execute("DROP TABLE IF EXISTS genre_buckets")
+            cursor.execute("DROP TABLE IF EXISTS track_renders")
+            cursor.execute("DROP TABLE IF EXISTS job_checkpoints")
             print("All application tables dropped successfully.")
     except sqlite3.Error as e:
         print(f"Failed to drop tables: {e}")
 
 
+# Featured-artist credits, bracketed ('(feat. X)') or trailing
+# ('A ft. X'), as they appear once text is casefolded.
+FEATURING_IN_BRACKETS = re.compile(r'\((?:featuring|feat|ft)\b\.?\s*([^()]*)\)')
+FEATURING_TRAILING = re.compile(r'\s(?:featuring|feat|ft)\b\.?\s*([^()]*)')
+FEATURED_ARTIST_SEPARATOR = re.compile(r'\s*(?:,|&|\band\b)\s*')
+
+
+def track_lookup_key(name, artist):
+    """Return the canonical key under which a track's blueprint is cached.
+
+    Case, accents, Unicode forms, whitespace and bracket style are
+    ignored. Featured artists are collected from both the title and the
+    artist, so 'Song (feat. B)' by 'A' and 'Song' by 'A ft. B' share a
+    key. Remix, edit and other version tags are kept.
+    """
+    featured = set()
+
+    def clean(text):
+        text = unicodedata.normalize('NFKD', text or '')
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+        text = text.casefold().replace('[', '(').replace(']', ')')
+        for pattern in (FEATURING_IN_BRACKETS, FEATURING_TRAILING):
+            for match in pattern.finditer(text):
+                featured.update(
+                    n for n in FEATURED_ARTIST_SEPARATOR.split(match.group(1))
+                    if n
+                )
+            text = pattern.sub(' ', text)
+        text = ' '.join(text.split())
+        return text.replace('( ', '(').replace(' )', ')')
+
+    title = clean(name)
+    main_artist = clean(artist)
+    if featured:
+        main_artist += ' feat ' + ', '.join(
+            sorted(' '.join(n.split()) for n in featured)
+        )
+    return f"{main_artist}\t{title}"
+
+
 def get_track_blueprint(name, artist):
-    """Check database for existing track and return its blueprint."""
+    """Check database for existing track and return its blueprint.
+
+    An exact (name, artist) match wins; otherwise the newest blueprint
+    saved under the same lookup key is used.
+    """
     try:
         with db_cursor() as cursor:
             cursor.execute(
-                "SELECT tags_json FROM tracks WHERE name = ? AND artist = ?",
-                (name, artist)
+                "SELECT tags_json FROM tracks "
+                "WHERE lookup_key = ? AND tags_json IS NOT NULL "
+                "ORDER BY (name = ? AND artist = ?) DESC, id DESC LIMIT 1",
+                (track_lookup_key(name, artist), name, artist)
             )
             result = cursor.fetchone()
 
@@ -205,6 +929,192 @@ def get_track_blueprint(name, artist):
     return None
 
 
+def fetch_tracks_by_keys(cursor, columns, keys, batch_size=400):
+    """Select rows from tracks matching many (name, artist) keys.
+
+    Runs one indexed VALUES-join per batch of keys and returns all rows,
+    each including name and artist alongside the requested columns.
+    """
+    keys = list(keys)
+    rows = []
+    for i in range(0, len(keys), batch_size):
+        batch = keys[i:i + batch_size]
+        placeholders = ", ".join(["(?, ?)"] * len(batch))
+        params = [value for key in batch for value in key]
+        cursor.execute(
+            f"SELECT t.name, t.artist, {columns} "
+            f"FROM (VALUES {placeholders}) AS k "
+            f"JOIN tracks t "
+            f"ON t.name = k.column1 AND t.artist = k.column2",
+            params
+        )
+        rows.extend(cursor.fetchall())
+    return rows
+
+
+def get_track_blueprints(keys):
+    """Fetch blueprints for many (name, artist) keys in batched queries.
+
+    Returns a dict mapping each key found in the cache to its blueprint.
+    As in get_track_blueprint, an exact match wins over the newest
+    blueprint saved under the same lookup key.
+    """
+    lookup_keys = {key: track_lookup_key(*key) for key in keys}
+    exact = {}
+    shared = {}
+    try:
+        with db_cursor() as cursor:
+            unique_keys = list(set(lookup_keys.values()))
+            for i in range(0, len(unique_keys), 500):
+                chunk = unique_keys[i:i + 500]
+                cursor.execute(
+                    f"SELECT name, artist, lookup_key, tags_json FROM tracks "
+                    f"WHERE tags_json IS NOT NULL AND lookup_key IN "
+                    f"({', '.join(['?'] * len(chunk))}) ORDER BY id",
+                    chunk
+                )
+                for row in cursor:
+                    if not row['tags_json']:
+                        continue
+                    try:
+                        blueprint = json.loads(row['tags_json'])
+                    except json.JSONDecodeError as e:
+                        print(f"Error retrieving blueprint for "
+                              f"{row['artist']} - {row['name']}: {e}")
+                        continue
+                    exact[(row['name'], row['artist'])] = blueprint
+                    shared[row['lookup_key']] = blueprint
+    except sqlite3.Error as e:
+        print(f"Error prefetching blueprints: {e}")
+
+    blueprints = {}
+    for key, lookup_key in lookup_keys.items():
+        blueprint = exact.get(key) or shared.get(lookup_key)
+        if blueprint:
+            blueprints[key] = blueprint
+    return blueprints
+
+
+def fts_match_query(text):
+    """Turn free text into an FTS5 query matching each word as a prefix."""
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+
+
+def escape_like(text):
+    """Escape LIKE wildcards so text matches literally with ESCAPE '\\'."""
+    return (text.replace('\\', '\\\\').replace('%', '\\%')
+            .replace('_', '\\_'))
+
+
+def search_tracks(cursor, tag_names=(), match_all=True, genre=None,
+                  bpm_range=None, text=None, limit=TRACK_SEARCH_PAGE_SIZE,
+                  before_id=None):
+    """Return one page of saved tracks matching tags and filters.
+
+    Tags match case-insensitively, all of them when match_all is set and
+    any of them otherwise. genre matches one entry of the comma-separated
+    genre column, bpm_range is an inclusive (low, high) pair and text is
+    matched word by word against name, artist, label and comments.
+    Tracks come newest first and before_id continues from a previous
+    page. Returns (tracks, next_cursor).
+    """
+    tag_groups = []
+    for name in tag_names:
+        ids = [row['id'] for row in cursor.execute(
+            "SELECT id FROM tags WHERE name = ? COLLATE NOCASE", (name,)
+        )]
+        if ids:
+            tag_groups.append(ids)
+        elif match_all:
+            return [], None
+    if tag_names and not tag_groups:
+        return [], None
+
+    # Tag searches walk the (tag_id, track_id) index of the rarest tag, or
+    # of every tag for an OR search, newest track first. Remaining tags are
+    # checked per track against the track_tags primary key.
+    if tag_groups and match_all:
+        def link_count(ids):
+            return cursor.execute(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM track_tags "
+                f"WHERE tag_id IN ({', '.join(['?'] * len(ids))}) "
+                f"LIMIT {TRACK_SEARCH_COUNT_CAP})", ids
+            ).fetchone()[0]
+        tag_groups.sort(key=link_count)
+        driving_ids, other_groups = tag_groups[0], tag_groups[1:]
+    else:
+        driving_ids = [tag_id for ids in tag_groups for tag_id in ids]
+        other_groups = []
+
+    id_column = "l.track_id" if driving_ids else "t.id"
+    filters, params = [], []
+    if before_id is not None:
+        filters.append(f"{id_column} < ?")
+        params.append(before_id)
+    for ids in other_groups:
+        filters.append(
+            f"EXISTS (SELECT 1 FROM track_tags o WHERE o.track_id = t.id "
+            f"AND o.tag_id IN ({', '.join(['?'] * len(ids))}))"
+        )
+        params.extend(ids)
+    if bpm_range:
+        filters.append("t.bpm BETWEEN ? AND ?")
+        params.extend(bpm_range)
+    if genre:
+        filters.append("(', ' || t.genre || ',') LIKE ? ESCAPE '\\'")
+        params.append(f"%, {escape_like(genre.strip())},%")
+    words = re.findall(r'\w+', text or '')
+    if words:
+        has_search_index = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'track_search'"
+        ).fetchone()
+        if has_search_index:
+            filters.append("t.id IN (SELECT rowid FROM track_search "
+                           "WHERE track_search MATCH ?)")
+            params.append(fts_match_query(text))
+        else:
+            for word in words:
+                filters.append(
+                    "(t.name || ' ' || IFNULL(t.artist, '') || ' ' || "
+                    "IFNULL(t.label, '') || ' ' || IFNULL(t.comments, '')) "
+                    "LIKE ? ESCAPE '\\'"
+                )
+                params.append(f"%{escape_like(word)}%")
+    where_clause = ''.join(f" AND {f}" for f in filters)
+
+    if driving_ids:
+        arms = [f"SELECT l.track_id AS id FROM track_tags l "
+                f"JOIN tracks t ON t.id = l.track_id "
+                f"WHERE l.tag_id = ?{where_clause}"
+                for _ in driving_ids]
+        query = " UNION ".join(arms)
+        query_params = [value for tag_id in driving_ids
+                        for value in [tag_id] + params]
+    else:
+        query = f"SELECT t.id AS id FROM tracks t WHERE 1{where_clause}"
+        query_params = params
+    track_ids = [row[0] for row in cursor.execute(
+        f"{query} ORDER BY 1 DESC LIMIT ?", query_params + [limit + 1]
+    )]
+    next_cursor = track_ids[limit - 1] if len(track_ids) > limit else None
+    track_ids = track_ids[:limit]
+    if not track_ids:
+        return [], None
+
+    placeholders = ', '.join(['?'] * len(track_ids))
+    tracks = {row['id']: dict(row, tags=[]) for row in cursor.execute(
+        f"SELECT {', '.join(TRACK_SEARCH_FIELDS)} FROM tracks "
+        f"WHERE id IN ({placeholders})", track_ids
+    )}
+    for row in cursor.execute(
+            f"SELECT l.track_id, g.name FROM track_tags l "
+            f"JOIN tags g ON g.id = l.tag_id "
+            f"WHERE l.track_id IN ({placeholders}) ORDER BY g.name",
+            track_ids):
+        tracks[row['track_id']]['tags'].append(row['name'])
+    return [tracks[track_id] for track_id in track_ids], next_cursor
+
+
 def apply_user_config_to_tags(blueprint_tags, user_config):
     """Trim tag lists to match user's selected detail level."""
     rendered_tags = json.loads(json.dumps(blueprint_tags))
@@ -225,99 +1135,228 @@ def apply_user_config_to_tags(blueprint_tags, user_config):
 
 # --- EXTERNAL API FUNCTIONS ---
 
+def extract_tag_names(tags_dict):
+    """Collect the distinct tag names held in a blueprint's categories."""
+    all_tags = set()
+    if tags_dict:
+        for category_value in tags_dict.values():
+            if isinstance(category_value, list):
+                all_tags.update(
+                    t for t in category_value
+                    if isinstance(t, str) and t.strip()
+                )
+            elif (isinstance(category_value, str) and
+                  category_value.strip()):
+                all_tags.add(category_value.strip())
+    return all_tags
+
+
 def insert_track_data(name, artist, bpm, tonality, genre, label, comments,
                       grouping, tags_dict):
     """Insert or update track data and associated tags in database."""
-    try:
-        with db_cursor() as cursor:
-            cursor.execute(
-                "SELECT id FROM tracks WHERE name = ? AND artist = ?",
-                (name, artist)
-            )
-            existing_track = cursor.fetchone()
+    writer = TrackDataWriter()
+    writer.add(name, artist, bpm, tonality, genre, label, comments,
+               grouping, tags_dict)
+    writer.flush()
 
-            tags_json_string = (json.dumps(tags_dict)
-                                if tags_dict is not None else None)
 
-            if existing_track:
-                track_id = existing_track['id']
-                print(f"Updating existing track: {name} by {artist} "
-                      f"(ID: {track_id})")
+class TrackDataWriter:
+    """Buffer track rows and tag links and save them in one transaction.
 
-                if tags_json_string is not None:
-                    cursor.execute(
-                        """UPDATE tracks
-                           SET bpm = ?, tonality = ?, genre = ?, label = ?,
-                               comments = ?, grouping = ?, tags_json = ?
-                           WHERE id = ?""",
-                        (bpm, tonality, genre, label, comments, grouping,
-                         tags_json_string, track_id)
-                    )
-                else:
-                    cursor.execute(
-                        """UPDATE tracks
-                           SET bpm = ?, tonality = ?, genre = ?, label = ?,
-                               comments = ?, grouping = ?
-                           WHERE id = ?""",
-                        (bpm, tonality, genre, label, comments, grouping,
-                         track_id)
-                    )
-            else:
-                print(f"Inserting new track: {name} by {artist}")
-                cursor.execute(
-                    """INSERT INTO tracks
-                       (name, artist, bpm, tonality, genre, label, comments,
-                        grouping, tags_json)
-                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                    (name, artist, bpm, tonality, genre, label, comments,
-                     grouping, tags_json_string)
+    Rows are upserted on (name, artist) and carry their lookup key; an
+    existing blueprint is kept when a row carries no tags, and replaced
+    along with its tag links when a row carries a different one. Tag ids
+    are cached across flushes. Call flush() at the end of a job to save
+    anything still buffered.
+    """
+
+    TRACK_UPSERT_SQL = """
+        INSERT INTO tracks
+            (name, artist, bpm, tonality, genre, label, comments,
+             grouping, tags_json, lookup_key)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (name, artist) DO UPDATE SET
+            bpm = excluded.bpm, tonality = excluded.tonality,
+            genre = excluded.genre, label = excluded.label,
+            comments = excluded.comments, grouping = excluded.grouping,
+            tags_json = COALESCE(excluded.tags_json, tracks.tags_json),
+            lookup_key = excluded.lookup_key
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or TRACK_WRITE_BATCH_SIZE
+        self.pending = []
+        self.tag_ids = {}
+
+    def add(self, name, artist, bpm, tonality, genre, label, comments,
+            grouping, tags_dict):
+        """Queue one track, flushing once the batch is full."""
+        tags_json_string = (json.dumps(tags_dict)
+                            if tags_dict is not None else None)
+        row = (name, artist, bpm, tonality, genre, label, comments,
+               grouping, tags_json_string, track_lookup_key(name, artist))
+        self.pending.append((row, extract_tag_names(tags_dict)))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write all queued tracks and their tag links.
+
+        A batch that breaks a constraint is retried row by row, so only
+        the offending rows are dropped.
+        """
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+
+        try:
+            try:
+                link_count = self.save_batch(batch)
+            except sqlite3.IntegrityError as e:
+                # Cached ids may belong to the rolled-back transaction.
+                self.tag_ids = {}
+                print(f"Saving {len(batch)} track(s) one by one after: {e}")
+                saved, link_count = [], 0
+                for entry in batch:
+                    try:
+                        link_count += self.save_batch([entry])
+                        saved.append(entry)
+                    except sqlite3.IntegrityError as row_error:
+                        self.tag_ids = {}
+                        print(f"Skipped track {entry[0][1]} - "
+                              f"{entry[0][0]}: {row_error}")
+                batch = saved
+            print(f"Saved {len(batch)} track(s) and {link_count} tag "
+                  f"link(s) to the database.")
+        except sqlite3.Error as e:
+            # Cached ids may belong to the rolled-back transaction.
+            self.tag_ids = {}
+            print(f"Database error while saving {len(batch)} track(s): {e}")
+
+    def save_batch(self, batch):
+        """Upsert queued rows and their tag links in one transaction.
+
+        Returns the number of tag links written.
+        """
+        with db_cursor() as cursor:
+            # Rows without an artist never match an existing track,
+            # so they are inserted one by one to capture their ids.
+            keyed_rows = [row for row, _ in batch if row[1] is not None]
+            previous_tags = {
+                (r['name'], r['artist']): r['tags_json']
+                for r in fetch_tracks_by_keys(
+                    cursor, "t.tags_json",
+                    [row[:2] for row in keyed_rows if row[8] is not None]
                 )
-                track_id = cursor.lastrowid
-                print(f"Successfully inserted track ID: {track_id}")
-
-            # Process and link tags
-            all_tags = set()
-            if tags_dict:
-                for category_value in tags_dict.values():
-                    if isinstance(category_value, list):
-                        all_tags.update(
-                            t for t in category_value
-                            if isinstance(t, str) and t.strip()
-                        )
-                    elif (isinstance(category_value, str) and
-                          category_value.strip()):
-                        all_tags.add(category_value.strip())
+            }
+            cursor.executemany(self.TRACK_UPSERT_SQL, keyed_rows)
+            track_ids = {
+                (r['name'], r['artist']): r['id']
+                for r in fetch_tracks_by_keys(
+                    cursor, "t.id", [row[:2] for row in keyed_rows]
+                )
+            }
 
-            # Insert tags and links
-            tag_ids = []
-            for tag_name in all_tags:
-                cursor.execute(
-                    "SELECT id FROM tags WHERE name = ?",
-                    (tag_name,)
+            links = []
+            retagged = []
+            for row, tag_names in batch:
+                if row[1] is None:
+                    cursor.execute(self.TRACK_UPSERT_SQL, row)
+                    track_id = cursor.lastrowid
+                else:
+                    track_id = track_ids[row[:2]]
+                    if row[8] is not None and previous_tags.get(
+                            row[:2]) not in (None, row[8]):
+                        retagged.append((track_id,))
+                links.extend((track_id, tag) for tag in tag_names)
+            # Links from a replaced blueprint would match old tags.
+            cursor.executemany(
+                "DELETE FROM track_tags WHERE track_id = ?", retagged
+            )
+
+            new_tags = {tag for _, tag in links
+                        if tag not in self.tag_ids}
+            if new_tags:
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO tags (name) VALUES (?)",
+                    [(tag,) for tag in new_tags]
                 )
-                tag_row = cursor.fetchone()
-                tag_id = tag_row['id'] if tag_row else None
-                if not tag_id:
+                new_tags = list(new_tags)
+                for i in range(0, len(new_tags), 500):
+                    chunk = new_tags[i:i + 500]
                     cursor.execute(
-                        "INSERT INTO tags (name) VALUES (?)",
-                        (tag_name,)
+                        f"SELECT id, name FROM tags WHERE name IN "
+                        f"({', '.join(['?'] * len(chunk))})",
+                        chunk
+                    )
+                    self.tag_ids.update(
+                        (r['name'], r['id']) for r in cursor.fetchall()
                     )
-                    tag_id = cursor.lastrowid
-                tag_ids.append(tag_id)
 
-            if tag_ids:
-                values_to_insert = [(track_id, tag_id) for tag_id in tag_ids]
-                cursor.executemany(
-                    "INSERT OR IGNORE INTO track_tags "
-                    "(track_id, tag_id) VALUES (?, ?)",
-                    values_to_insert
-                )
+            cursor.executemany(
+                "INSERT OR IGNORE INTO track_tags "
+                "(track_id, tag_id) VALUES (?, ?)",
+                [(track_id, self.tag_ids[tag])
+                 for track_id, tag in links]
+            )
+        return len(links)
 
-            print(f"Database record updated for track ID {track_id}.")
 
+def get_track_renders(library_key, fingerprints=None):
+    """Return {fingerprint: rendered attributes} stored for a library.
+
+    Only fingerprints in the given set are returned, or all of them when
+    fingerprints is None.
+    """
+    renders = {}
+    try:
+        with db_cursor() as cursor:
+            cursor.execute(
+                "SELECT fingerprint, rendered_json FROM track_renders "
+                "WHERE library_key = ?",
+                (library_key,)
+            )
+            for row in cursor:
+                if fingerprints is None or row['fingerprint'] in fingerprints:
+                    renders[row['fingerprint']] = json.loads(
+                        row['rendered_json']
+                    )
+    except sqlite3.Error as e:
+        print(f"Error reading stored renders for {library_key}: {e}")
+    return renders
+
+
+def save_track_renders(library_key, renders, keep=None):
+    """Store the rendered attributes of a job's newly tagged tracks.
+
+    renders maps each fingerprint to a (blueprint lookup key, rendered
+    attributes) pair. When keep is given, the library's other renders,
+    left by tracks since changed or removed, are pruned.
+    """
+    try:
+        with db_cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO track_renders "
+                "(library_key, fingerprint, rendered_json, lookup_key) "
+                "VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (library_key, fingerprint) DO UPDATE SET "
+                "rendered_json = excluded.rendered_json, "
+                "lookup_key = excluded.lookup_key, "
+                "updated_at = CURRENT_TIMESTAMP",
+                [(library_key, fingerprint, json.dumps(rendered), lookup_key)
+                 for fingerprint, (lookup_key, rendered) in renders.items()]
+            )
+            if keep is not None:
+                cursor.execute(
+                    "DELETE FROM track_renders WHERE library_key = ? AND "
+                    "fingerprint NOT IN (SELECT value FROM json_each(?))",
+                    (library_key, json.dumps(list(keep)))
+                )
+                if cursor.rowcount:
+                    print(f"Pruned {cursor.rowcount} superseded render(s) "
+                          f"for {library_key}.")
     except sqlite3.Error as e:
-        print(f"Database error in insert_track_data for "
-              f"{artist} - {name}: {e}")
+        print(f"Error saving renders for {library_key}: {e}")
 
 
 def log_job_start(filename, input_path, job_type, job_display_name):
@@ -366,15 +1405,204 @@ def update_job_progress(log_id, current_count, total_count):
         print(f"Failed to update progress for job {log_id}: {e}")
 
 
+def add_job_progress(log_id, run_id, count, total_count):
+    """Add count tracks to a job's progress and refresh run_id's heartbeat.
+
+    Chunk tasks of one job finish tracks concurrently, so the count is
+    incremented in SQL rather than overwritten. Raises JobSupersededError,
+    without adding anything, if another run has taken the job over.
+    """
+    try:
+        with db_cursor() as cursor:
+            save_job_checkpoint(log_id, run_id)
+            if not count:
+                return
+            cursor.execute(
+                "UPDATE processing_log SET result_data = json_object("
+                "'current', COALESCE(json_extract(result_data, '$.current'), "
+                "0) + ?, 'total', ?) WHERE id = ?",
+                (count, total_count, log_id)
+            )
+    except sqlite3.Error as e:
+        print(f"Failed to update progress for job {log_id}: {e}")
+
+
+def get_job_filename(job_id):
+    """Return the original filename a job was started for, or None."""
+    with db_cursor() as cursor:
+        row = cursor.execute(
+            "SELECT original_filename FROM processing_log WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+    return row['original_filename'] if row else None
+
+
+def get_job_status(job_id):
+    """Return one job's status and progress, or None if it doesn't exist."""
+    with db_cursor() as cursor:
+        row = cursor.execute(
+            "SELECT id, timestamp, job_display_name, job_type, status, "
+            "track_count, result_data FROM processing_log WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+    if not row:
+        return None
+
+    job = dict(row)
+    job['progress'] = None
+    if job['result_data'] and job['status'] == 'In Progress':
+        try:
+            progress = json.loads(job['result_data'])
+            if isinstance(progress, dict) and 'current' in progress:
+                job['progress'] = progress
+        except json.JSONDecodeError:
+            pass
+    return job
+
+
+class JobSupersededError(Exception):
+    """Raised in a job run whose checkpoint was claimed by a newer run."""
+
+
+def claim_job_checkpoint(job_id, input_path, output_path, config):
+    """Register a new run of a tagging job and return its checkpoint.
+
+    The returned dict holds this run's run_id plus the track_index,
+    output_offset and partial_path saved by any earlier run.
+    """
+    run_id = uuid.uuid4().hex
+    with db_cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO job_checkpoints "
+            "(job_id, run_id, input_path, output_path, config_json) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (job_id) DO UPDATE SET run_id = excluded.run_id, "
+            "updated_at = CURRENT_TIMESTAMP",
+            (job_id, run_id, input_path, output_path, json.dumps(config))
+        )
+        row = cursor.execute(
+            "SELECT * FROM job_checkpoints WHERE job_id = ?", (job_id,)
+        ).fetchone()
+    return dict(row)
+
+
+def save_job_checkpoint(job_id, run_id, track_index=None, output_offset=None,
+                        partial_path=None):
+    """Record a run's progress, or just refresh its heartbeat.
+
+    Raises JobSupersededError if another run has claimed the job.
+    """
+    with db_cursor() as cursor:
+        if track_index is None:
+            cursor.execute(
+                "UPDATE job_checkpoints SET updated_at = CURRENT_TIMESTAMP "
+                "WHERE job_id = ? AND run_id = ?",
+                (job_id, run_id)
+            )
+        else:
+            cursor.execute(
+                "UPDATE job_checkpoints SET track_index = ?, "
+                "output_offset = ?, partial_path = ?, "
+                "updated_at = CURRENT_TIMESTAMP "
+                "WHERE job_id = ? AND run_id = ?",
+                (track_index, output_offset, partial_path, job_id, run_id)
+            )
+        if cursor.rowcount == 0:
+            raise JobSupersededError(
+                f"Job {job_id} was resumed by another run."
+            )
+
+
+def prepare_resumed_output(checkpoint, partial_path):
+    """Start a run's partial output from the previous run's checkpoint.
+
+    Returns (track_index, output_offset) to resume from, or None when the
+    job has to start over.
+    """
+    previous_path = checkpoint['partial_path']
+    if (not checkpoint['track_index'] or not previous_path or
+            not os.path.exists(previous_path) or
+            os.path.getsize(previous_path) < checkpoint['output_offset']):
+        return None
+    # Copy rather than reuse the file, so a stalled earlier run that
+    # wakes up cannot write into this run's output.
+    shutil.copyfile(previous_path, partial_path)
+    os.remove(previous_path)
+    return checkpoint['track_index'], checkpoint['output_offset']
+
+
+def delete_job_checkpoint(job_id):
+    """Forget a job's checkpoint once it has completed."""
+    with db_cursor() as cursor:
+        cursor.execute("DELETE FROM job_checkpoints WHERE job_id = ?",
+                       (job_id,))
+
+
+def resume_job(job_id, require_stale=True):
+    """Re-dispatch a checkpointed tagging job.
+
+    The checkpoint is claimed atomically so only one caller resumes the
+    job. With require_stale, the claim only succeeds if the checkpoint
+    has not moved for JOB_STALE_MINUTES. Returns the checkpoint that was
+    resumed, or None if it could not be claimed.
+    """
+    with db_cursor() as cursor:
+        claim_sql = ("UPDATE job_checkpoints "
+                     "SET updated_at = CURRENT_TIMESTAMP WHERE job_id = ?")
+        params = [job_id]
+        if require_stale:
+            claim_sql += " AND updated_at < datetime('now', ?)"
+            params.append(f"-{JOB_STALE_MINUTES} minutes")
+        cursor.execute(claim_sql, params)
+        if cursor.rowcount == 0:
+            return None
+        checkpoint = dict(cursor.execute(
+            "SELECT * FROM job_checkpoints WHERE job_id = ?", (job_id,)
+        ).fetchone())
+        cursor.execute(
+            "UPDATE processing_log SET status = 'In Progress' WHERE id = ?",
+            (job_id,)
+        )
+
+    process_library_task.delay(job_id, checkpoint['input_path'],
+                               checkpoint['output_path'],
+                               json.loads(checkpoint['config_json']))
+    print(f"Resumed job {job_id} from track {checkpoint['track_index']}.")
+    return checkpoint
+
+
 def cleanup_stale_jobs():
     """
-    Mark jobs stuck 'In Progress' for more than 2 hours as 'Failed'.
+    Resume or fail jobs that are no longer making progress.
 
-    This prevents zombie jobs from auto-resuming after server restarts
-    while still allowing legitimate in-progress jobs to continue.
+    Tagging jobs with a checkpoint that has not moved for
+    JOB_STALE_MINUTES are resumed from it. Other jobs stuck 'In Progress'
+    for more than 2 hours are marked 'Failed', which prevents zombie jobs
+    from auto-resuming after server restarts while still allowing
+    legitimate in-progress jobs to continue. Checkpoints of failed jobs
+    not resumed within JOB_CHECKPOINT_RETENTION_DAYS are deleted along
+    with their partial output.
 
     Called automatically on app startup.
     """
+    try:
+        with db_cursor() as cursor:
+            cursor.execute(
+                "SELECT c.job_id FROM job_checkpoints c "
+                "JOIN processing_log p ON p.id = c.job_id "
+                "WHERE p.status = 'In Progress'"
+            )
+            checkpointed_jobs = [row['job_id'] for row in cursor.fetchall()]
+        for job_id in checkpointed_jobs:
+            try:
+                if resume_job(job_id):
+                    print(f"♻️  Resuming stalled job {job_id} "
+                          f"from its checkpoint")
+            except Exception as e:
+                print(f"⚠️  Could not resume job {job_id}: {e}")
+    except sqlite3.Error as e:
+        print(f"⚠️  Failed to check for resumable jobs: {e}\n")
+
     try:
         cutoff_time = datetime.now() - timedelta(hours=2)
 
@@ -382,7 +1610,8 @@ def cleanup_stale_jobs():
             # Find stale jobs first (for logging)
             cursor.execute(
                 "SELECT id, job_display_name FROM processing_log "
-                "WHERE status = 'In Progress' AND timestamp < ?",
+                "WHERE status = 'In Progress' AND timestamp < ? "
+                "AND id NOT IN (SELECT job_id FROM job_checkpoints)",
                 (cutoff_time,)
             )
             stale_jobs = cursor.fetchall()
@@ -395,7 +1624,8 @@ def cleanup_stale_jobs():
                 # Mark them as failed
                 cursor.execute(
                     "UPDATE processing_log SET status = 'Failed' "
-                    "WHERE status = 'In Progress' AND timestamp < ?",
+                    "WHERE status = 'In Progress' AND timestamp < ? "
+                    "AND id NOT IN (SELECT job_id FROM job_checkpoints)",
                     (cutoff_time,)
                 )
                 print(f"✅ Marked {len(stale_jobs)} stale job(s) as 'Failed'\n")
@@ -405,35 +1635,342 @@ def cleanup_stale_jobs():
     except sqlite3.Error as e:
         print(f"⚠️  Failed to clean up stale jobs: {e}\n")
 
+    try:
+        with db_cursor() as cursor:
+            expired = cursor.execute(
+                "SELECT c.job_id, c.run_id, c.output_path, c.partial_path "
+                "FROM job_checkpoints c "
+                "LEFT JOIN processing_log p ON p.id = c.job_id "
+                "WHERE (p.id IS NULL OR p.status != 'In Progress') "
+                "AND c.updated_at < datetime('now', ?)",
+                (f"-{JOB_CHECKPOINT_RETENTION_DAYS} days",)
+            ).fetchall()
+            cursor.executemany(
+                "DELETE FROM job_checkpoints WHERE job_id = ?",
+                [(row['job_id'],) for row in expired]
+            )
+        for row in expired:
+            run_partial = f"{row['output_path']}.{row['run_id']}.part"
+            for path in {row['partial_path'], run_partial}:
+                if path and os.path.exists(path):
+                    os.remove(path)
+        if expired:
+            print(f"🧹 Removed {len(expired)} expired job checkpoint(s)\n")
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️  Failed to remove expired checkpoints: {e}\n")
 
-def call_llm_for_tags(track_data, config, mode='full'):
-    """Call OpenAI API to generate tags in 'full' or 'genre_only' mode."""
-    api_key = os.environ.get("OPENAI_API_KEY")
-    if not api_key:
-        print("OPENAI_API_KEY not set. Returning default mock tags.")
-        return ({"primary_genre": ["Miscellaneous"], "sub_genre": []}
-                if mode == 'genre_only'
-                else {"primary_genre": ["mock techno"], "sub_genre": [],
-                      "energy_level": 7})
 
-    primary_genre_list = ", ".join(CONTROLLED_VOCABULARY["primary_genre"])
-    artist = track_data.get('ARTIST', '')
-    title = track_data.get('TITLE', '')
-    sanitized_artist = re.sub(r'[^\w\s\-\(\)\'\".:,/]', '', artist)
-    sanitized_title = re.sub(r'[^\w\s\-\(\)\'\".:,/]', '', title)
+# Shared HTTP session used by post_chat_completion
+_http_state = {'session': None, 'pid': None}
+_http_lock = threading.Lock()
 
-    prompt_parts = [
-        "You are an expert musicologist specializing in electronic dance "
-        "music. Provide structured tags for a DJ library.",
-        f"Track Data:\nTrack: '{sanitized_artist} - {sanitized_title}'",
-        f"Existing Genre: {track_data.get('GENRE')}\n"
-        f"Year: {track_data.get('YEAR')}\n",
-        "Provide a JSON object with these keys:",
-        f"1. 'primary_genre': Choose EXACTLY ONE from: "
-        f"[{primary_genre_list}]",
-        f"2. 'sub_genre': Provide up to {config.get('sub_genre', 2)} "
-        f"specific, widely-recognized sub-genres (e.g., 'French House')."
-    ]
+
+def get_http_session():
+    """Return the process-wide pooled HTTP session for AI requests.
+
+    Connections are kept alive and shared by every thread in the process;
+    forked Celery workers build their own session on first use.
+    """
+    with _http_lock:
+        if _http_state['session'] is None or \
+                _http_state['pid'] != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=HTTP_POOL_SIZE
+            )
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {os.environ.get('OPENAI_API_KEY')}"
+            })
+            _http_state['session'] = session
+            _http_state['pid'] = os.getpid()
+        return _http_state['session']
+
+
+# Shared AI rate limiter. The bucket is a Redis hash holding the learned
+# per-minute limits ('rpm', 'tpm'), the capacity left ('requests',
+# 'tokens'), when it was last refilled ('updated') and until when every
+# worker must pause after a 429 ('blocked_until'). 'local' is this
+# process's own bucket, used while Redis is unreachable.
+_rate_limit_state = {'redis': None, 'redis_retry_at': 0.0, 'local': {}}
+_rate_limit_lock = threading.Lock()
+
+RATE_LIMIT_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def get_rate_limit_redis():
+    """Return this process's Redis client for the AI rate limiter."""
+    if _rate_limit_state['redis'] is None:
+        _rate_limit_state['redis'] = redis.Redis.from_url(
+            LLM_RATE_LIMIT_REDIS_URL, socket_timeout=1,
+            socket_connect_timeout=1
+        )
+    return _rate_limit_state['redis']
+
+
+def refill_rate_bucket(bucket, now):
+    """Top up a bucket for the time elapsed since its last refill."""
+    bucket.setdefault('rpm', LLM_REQUESTS_PER_MINUTE * LLM_RATE_LIMIT_HEADROOM)
+    bucket.setdefault('tpm', LLM_TOKENS_PER_MINUTE * LLM_RATE_LIMIT_HEADROOM)
+    elapsed = max(0.0, now - bucket.get('updated', now))
+    for level, rate in (('requests', 'rpm'), ('tokens', 'tpm')):
+        limit = bucket[rate]
+        bucket[level] = min(limit,
+                            bucket.get(level, limit) + elapsed * limit / 60)
+    bucket['updated'] = now
+
+
+def take_rate_capacity(bucket, now, tokens):
+    """Take one request and its tokens from a bucket.
+
+    Returns 0 once taken, or the seconds to wait before trying again.
+    Unknown (zero) limits are not enforced.
+    """
+    refill_rate_bucket(bucket, now)
+    blocked = bucket.get('blocked_until', 0.0) - now
+    if blocked > 0:
+        return blocked
+
+    needs = [(level, bucket[rate], min(need, bucket[rate]))
+             for level, rate, need in (('requests', 'rpm', 1),
+                                       ('tokens', 'tpm', tokens))
+             if bucket[rate] > 0]
+    wait = max([(need - bucket[level]) * 60 / limit
+                for level, limit, need in needs], default=0.0)
+    if wait > 0:
+        return wait
+    for level, _, need in needs:
+        bucket[level] -= need
+    return 0.0
+
+
+def settle_rate_bucket(bucket, now, limits, remaining, token_correction,
+                       block_seconds):
+    """Fold what one AI response told us back into a bucket."""
+    refill_rate_bucket(bucket, now)
+    for level, rate in (('requests', 'rpm'), ('tokens', 'tpm')):
+        if rate in limits:
+            if not bucket[rate]:
+                # A newly learned limit starts with a full bucket.
+                bucket[level] = limits[rate]
+            bucket[rate] = limits[rate]
+            bucket[level] = min(bucket[level], bucket[rate])
+    for level, value in remaining.items():
+        bucket[level] = min(bucket[level], value)
+    if bucket['tpm'] > 0:
+        bucket['tokens'] -= token_correction
+    if block_seconds:
+        bucket['blocked_until'] = max(bucket.get('blocked_until', 0.0),
+                                      now + block_seconds)
+
+
+def update_rate_bucket(change):
+    """Apply change(bucket, now) to the shared bucket and return its result.
+
+    The Redis hash is updated under WATCH so concurrent workers never lose
+    each other's updates. While Redis is unreachable each process limits
+    itself with a local bucket and retries Redis every 30 seconds.
+    """
+    if time.monotonic() >= _rate_limit_state['redis_retry_at']:
+        def apply(pipe):
+            bucket = {key.decode(): float(value) for key, value in
+                      pipe.hgetall(LLM_RATE_LIMIT_REDIS_KEY).items()}
+            result = change(bucket, time.time())
+            pipe.multi()
+            pipe.hset(LLM_RATE_LIMIT_REDIS_KEY, mapping=bucket)
+            pipe.expire(LLM_RATE_LIMIT_REDIS_KEY, 3600)
+            return result
+
+        try:
+            return get_rate_limit_redis().transaction(
+                apply, LLM_RATE_LIMIT_REDIS_KEY, value_from_callable=True
+            )
+        except redis.RedisError as e:
+            print(f"AI rate limiter cannot reach Redis, limiting this "
+                  f"process locally: {e}")
+            _rate_limit_state['redis_retry_at'] = time.monotonic() + 30
+
+    with _rate_limit_lock:
+        return change(_rate_limit_state['local'], time.time())
+
+
+def estimate_request_tokens(payload):
+    """Roughly estimate the tokens a chat-completions request will use."""
+    prompt_chars = sum(len(message.get('content', ''))
+                       for message in payload.get('messages', []))
+    return prompt_chars // 4 + LLM_COMPLETION_TOKENS_ESTIMATE
+
+
+def wait_for_llm_capacity(estimated_tokens):
+    """Block until the shared rate limiter admits one AI request."""
+    waited = 0.0
+    while True:
+        wait = update_rate_bucket(
+            lambda bucket, now: take_rate_capacity(bucket, now,
+                                                   estimated_tokens)
+        )
+        if wait <= 0:
+            break
+        # Re-check at least every 5 seconds in case the limits were raised;
+        # the jitter keeps waiting workers from retrying in lockstep.
+        pause = min(wait, 5.0) + random.uniform(0, 0.05)
+        time.sleep(pause)
+        waited += pause
+    if waited:
+        observe_metric("tag_genius_llm_rate_limit_wait_seconds", waited)
+
+
+def parse_rate_limit_duration(value):
+    """Parse a reset header like '1s', '20ms' or '6m0s' into seconds."""
+    if not value:
+        return None
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|s|m|h)', value)
+    if parts:
+        return sum(float(number) * RATE_LIMIT_DURATION_UNITS[unit]
+                   for number, unit in parts)
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def header_float(headers, name):
+    """Return a numeric response header, or None if missing or invalid."""
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_seconds(headers):
+    """Return how long the provider asked us to wait, or None.
+
+    Reads retry-after-ms and Retry-After (seconds or an HTTP date), then
+    falls back to the reset time of whichever rate limit is exhausted.
+    """
+    retry_after_ms = header_float(headers, 'retry-after-ms')
+    if retry_after_ms is not None:
+        return max(0.0, retry_after_ms / 1000)
+    retry_after = headers.get('Retry-After')
+    if retry_after:
+        seconds = header_float(headers, 'Retry-After')
+        if seconds is not None:
+            return max(0.0, seconds)
+        try:
+            retry_at = parsedate_to_datetime(retry_after)
+            return max(0.0, (retry_at - datetime.now(timezone.utc))
+                       .total_seconds())
+        except (TypeError, ValueError):
+            pass
+    resets = [parse_rate_limit_duration(
+                  headers.get(f'x-ratelimit-reset-{kind}'))
+              for kind in ('requests', 'tokens')
+              if header_float(headers, f'x-ratelimit-remaining-{kind}') == 0]
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
+
+
+def llm_retry_delay(error, attempt, initial_delay):
+    """Seconds to wait before retrying a failed AI request.
+
+    Honours the provider's Retry-After or rate-limit reset headers when
+    the error carries a response, otherwise backs off exponentially.
+    """
+    response = getattr(error, 'response', None)
+    if response is not None:
+        delay = retry_after_seconds(response.headers)
+        if delay is not None:
+            return min(delay, 60.0)
+    return initial_delay * (2 ** attempt)
+
+
+def record_rate_limit_headers(response, estimated_tokens):
+    """Adapt the shared rate limiter to one AI response.
+
+    Limits and remaining capacity come from the x-ratelimit-* headers,
+    the token estimate is corrected from the reported usage, and a 429
+    pauses every worker until the provider's retry time.
+    """
+    headers = response.headers
+    limits = {}
+    remaining = {}
+    for kind, rate in (('requests', 'rpm'), ('tokens', 'tpm')):
+        limit = header_float(headers, f'x-ratelimit-limit-{kind}')
+        if not limit:
+            continue
+        limits[rate] = limit * LLM_RATE_LIMIT_HEADROOM
+        left = header_float(headers, f'x-ratelimit-remaining-{kind}')
+        if left is not None:
+            reserve = limit * (1 - LLM_RATE_LIMIT_HEADROOM)
+            remaining[kind] = max(0.0, left - reserve)
+
+    token_correction = 0
+    if response.status_code == 200:
+        try:
+            used = response.json().get('usage', {}).get('total_tokens')
+            if used:
+                token_correction = used - estimated_tokens
+        except (ValueError, AttributeError):
+            pass
+
+    block_seconds = (retry_after_seconds(headers)
+                     if response.status_code == 429 else None)
+
+    if limits or remaining or token_correction or block_seconds:
+        update_rate_bucket(
+            lambda bucket, now: settle_rate_bucket(
+                bucket, now, limits, remaining, token_correction,
+                block_seconds
+            )
+        )
+
+
+def post_chat_completion(payload, read_timeout, mode):
+    """POST a chat-completions payload through the shared HTTP session.
+
+    Each request first waits for the shared rate limiter, and its response
+    headers adjust the limiter. The request's latency is recorded under
+    the given mode label.
+    """
+    estimated_tokens = estimate_request_tokens(payload)
+    wait_for_llm_capacity(estimated_tokens)
+    start = time.perf_counter()
+    try:
+        response = get_http_session().post(
+            OPENAI_CHAT_URL,
+            data=json.dumps(payload),
+            timeout=(HTTP_CONNECT_TIMEOUT, read_timeout)
+        )
+    finally:
+        observe_metric("tag_genius_llm_request_seconds",
+                       time.perf_counter() - start, {"mode": mode})
+    record_rate_limit_headers(response, estimated_tokens)
+    return response
+
+
+def record_llm_error(mode, error, retrying=False):
+    """Count a failed AI request attempt, and its retry if one follows."""
+    inc_metric("tag_genius_llm_errors_total", {"mode": mode, "error": error})
+    if retrying:
+        inc_metric("tag_genius_llm_retries_total", {"mode": mode})
+
+
+def sanitize_for_prompt(text):
+    """Strip characters that could break or inject into an AI prompt."""
+    return re.sub(r'[^\w\s\-\(\)\'\".:,/]', '', text or '')
+
+
+def build_tag_instructions(config, mode='full'):
+    """Build the numbered list of JSON keys the AI must provide."""
+    primary_genre_list = ", ".join(CONTROLLED_VOCABULARY["primary_genre"])
+    instructions = [
+        f"1. 'primary_genre': Choose EXACTLY ONE from: "
+        f"[{primary_genre_list}]",
+        f"2. 'sub_genre': Provide up to {config.get('sub_genre', 2)} "
+        f"specific, widely-recognized sub-genres (e.g., 'French House')."
+    ]
 
     if mode == 'full':
         components_list = ", ".join(CONTROLLED_VOCABULARY["components"])
@@ -443,7 +1980,7 @@ def call_llm_for_tags(track_data, config, mode='full'):
         )
         time_period_list = ", ".join(CONTROLLED_VOCABULARY["time_period"])
 
-        full_mode_instructions = [
+        instructions.extend([
             "3. 'energy_level': Integer 1-10, calibrated for electronic "
             "dance music DJs.",
             "   - Use 1-3 for low energy (ambient/chill). "
@@ -462,20 +1999,56 @@ def call_llm_for_tags(track_data, config, mode='full'):
             f"[{situation_environment_list}]",
             f"7. 'time_period': Provide up to "
             f"{config.get('time_period', 1)} from: [{time_period_list}]"
-        ]
+        ])
+
+    return instructions
+
+
+def normalize_tag_response(json_response, mode='full'):
+    """Coerce primary_genre and sub_genre of an AI response into lists."""
+    if isinstance(json_response.get('primary_genre'), str):
+        json_response['primary_genre'] = [json_response['primary_genre']]
+    elif not isinstance(json_response.get('primary_genre'), list):
+        json_response['primary_genre'] = ["Miscellaneous"]
+
+    if mode == 'genre_only' and 'sub_genre' not in json_response:
+        json_response['sub_genre'] = []
+    elif ('sub_genre' in json_response and
+          not isinstance(json_response['sub_genre'], list)):
+        json_response['sub_genre'] = []
+
+    return json_response
+
+
+def call_llm_for_tags(track_data, config, mode='full'):
+    """Call OpenAI API to generate tags in 'full' or 'genre_only' mode."""
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        print("OPENAI_API_KEY not set. Returning default mock tags.")
+        return ({"primary_genre": ["Miscellaneous"], "sub_genre": []}
+                if mode == 'genre_only'
+                else {"primary_genre": ["mock techno"], "sub_genre": [],
+                      "energy_level": 7})
 
-        prompt_parts.extend(full_mode_instructions)
+    artist = track_data.get('ARTIST', '')
+    title = track_data.get('TITLE', '')
+    sanitized_artist = sanitize_for_prompt(artist)
+    sanitized_title = sanitize_for_prompt(title)
 
+    prompt_parts = [
+        "You are an expert musicologist specializing in electronic dance "
+        "music. Provide structured tags for a DJ library.",
+        f"Track Data:\nTrack: '{sanitized_artist} - {sanitized_title}'",
+        f"Existing Genre: {track_data.get('GENRE')}\n"
+        f"Year: {track_data.get('YEAR')}\n",
+        "Provide a JSON object with these keys:"
+    ]
+    prompt_parts.extend(build_tag_instructions(config, mode))
     prompt_parts.append("\nResponse MUST be a single, valid JSON object.")
     prompt_text = "\n\n".join(prompt_parts)
 
-    api_url = "https://api.openai.com/v1/chat/completions"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
     payload = {
-        "model": "gpt-4o-mini",
+        "model": OPENAI_MODEL,
         "messages": [{"role": "user", "content": prompt_text}],
         "response_format": {"type": "json_object"},
         "temperature": 0
@@ -486,12 +2059,7 @@ def call_llm_for_tags(track_data, config, mode='full'):
     for attempt in range(max_retries):
         try:
             timeout_seconds = 15 if mode == 'genre_only' else 30
-            response = requests.post(
-                api_url,
-                headers=headers,
-                data=json.dumps(payload),
-                timeout=timeout_seconds
-            )
+            response = post_chat_completion(payload, timeout_seconds, mode)
             response.raise_for_status()
 
             text_part = (response.json()
@@ -499,14 +2067,9 @@ def call_llm_for_tags(track_data, config, mode='full'):
                          .get("message", {})
                          .get("content"))
             if text_part:
-                json_response = json.loads(text_part)
-
-                if isinstance(json_response.get('primary_genre'), str):
-                    json_response['primary_genre'] = [
-                        json_response['primary_genre']
-                    ]
-                elif not isinstance(json_response.get('primary_genre'), list):
-                    json_response['primary_genre'] = ["Miscellaneous"]
+                json_response = normalize_tag_response(
+                    json.loads(text_part), mode
+                )
 
                 primary_genre_for_log = (
                     json_response['primary_genre'][0]
@@ -521,21 +2084,18 @@ def call_llm_for_tags(track_data, config, mode='full'):
                           f"'{primary_genre_for_log}' for (mode: {mode}): "
                           f"{artist} - {title}")
 
-                if mode == 'genre_only' and 'sub_genre' not in json_response:
-                    json_response['sub_genre'] = []
-                elif ('sub_genre' in json_response and
-                      not isinstance(json_response['sub_genre'], list)):
-                    json_response['sub_genre'] = []
-
                 return json_response
 
         except requests.exceptions.RequestException as e:
-            delay = initial_delay * (2 ** attempt)
+            record_llm_error(mode, type(e).__name__,
+                             retrying=attempt + 1 < max_retries)
+            delay = llm_retry_delay(e, attempt, initial_delay)
             print(f"AI call failed for {artist} - {title} "
                   f"(mode: {mode}, error: {type(e).__name__}). "
                   f"Retrying in {delay} seconds...")
             time.sleep(delay)
         except json.JSONDecodeError as e:
+            record_llm_error(mode, type(e).__name__)
             print(f"Error decoding JSON for {artist} - {title} "
                   f"(mode: {mode}): {e}")
             return ({"primary_genre": ["Miscellaneous"], "sub_genre": []}
@@ -543,6 +2103,7 @@ def call_llm_for_tags(track_data, config, mode='full'):
                     else {"primary_genre": ["Miscellaneous"],
                           "sub_genre": [], "energy_level": None})
 
+    record_llm_error(mode, "MaxRetriesExceeded")
     print(f"Max retries exceeded for track: {artist} - {title} "
           f"(mode: {mode})")
     return ({"primary_genre": ["Miscellaneous"], "sub_genre": []}
@@ -551,6 +2112,98 @@ def call_llm_for_tags(track_data, config, mode='full'):
                   "energy_level": None})
 
 
+def call_llm_for_tags_batch(track_data_list, config, mode='full'):
+    """Tag several tracks in one AI request, keyed by position.
+
+    Returns a list of tag dicts aligned with track_data_list. Tracks that
+    are missing or invalid in the batch response fall back to individual
+    call_llm_for_tags requests.
+    """
+    if len(track_data_list) <= 1 or not os.environ.get("OPENAI_API_KEY"):
+        return [call_llm_for_tags(track_data, config, mode)
+                for track_data in track_data_list]
+
+    tracks_for_prompt = [
+        json.dumps({
+            "id": str(i),
+            "track": (f"{sanitize_for_prompt(t.get('ARTIST'))} - "
+                      f"{sanitize_for_prompt(t.get('TITLE'))}"),
+            "existing_genre": t.get('GENRE'),
+            "year": t.get('YEAR')
+        }, ensure_ascii=False)
+        for i, t in enumerate(track_data_list)
+    ]
+
+    prompt_parts = [
+        "You are an expert musicologist specializing in electronic dance "
+        "music. Provide structured tags for a DJ library.",
+        "Tracks:\n" + "\n".join(tracks_for_prompt),
+        "Respond with a JSON object that maps each track 'id' to an "
+        "object with these keys:"
+    ]
+    prompt_parts.extend(build_tag_instructions(config, mode))
+    prompt_parts.append("\nResponse MUST be a single, valid JSON object "
+                        "containing every track id.")
+    prompt_text = "\n\n".join(prompt_parts)
+
+    payload = {
+        "model": OPENAI_MODEL,
+        "messages": [{"role": "user", "content": prompt_text}],
+        "response_format": {"type": "json_object"},
+        "temperature": 0
+    }
+
+    batch_response = {}
+    max_retries = 5
+    initial_delay = 2
+    for attempt in range(max_retries):
+        try:
+            response = post_chat_completion(payload, 60, f"{mode}_batch")
+            response.raise_for_status()
+
+            text_part = (response.json()
+                         .get("choices", [{}])[0]
+                         .get("message", {})
+                         .get("content"))
+            if text_part:
+                parsed = json.loads(text_part)
+                if isinstance(parsed, dict):
+                    batch_response = parsed
+                break
+        except requests.exceptions.RequestException as e:
+            record_llm_error(f"{mode}_batch", type(e).__name__,
+                             retrying=attempt + 1 < max_retries)
+            delay = llm_retry_delay(e, attempt, initial_delay)
+            print(f"Batch AI call failed for {len(track_data_list)} tracks "
+                  f"(mode: {mode}, error: {type(e).__name__}). "
+                  f"Retrying in {delay} seconds...")
+            time.sleep(delay)
+        except json.JSONDecodeError as e:
+            record_llm_error(f"{mode}_batch", type(e).__name__)
+            print(f"Error decoding batch JSON (mode: {mode}): {e}")
+            break
+
+    results = []
+    fallback_count = 0
+    for i, track_data in enumerate(track_data_list):
+        track_tags = batch_response.get(str(i))
+        if (isinstance(track_tags, dict) and
+                isinstance(track_tags.get('primary_genre'), (str, list)) and
+                track_tags['primary_genre']):
+            results.append(normalize_tag_response(track_tags, mode))
+        else:
+            fallback_count += 1
+            results.append(call_llm_for_tags(track_data, config, mode))
+
+    if fallback_count:
+        inc_metric("tag_genius_llm_batch_fallbacks_total", {"mode": mode},
+                   fallback_count)
+    print(f"Batch tagged {len(track_data_list) - fallback_count}/"
+          f"{len(track_data_list)} tracks (mode: {mode}); "
+          f"{fallback_count} fell back to single-track calls.")
+    return results
+
+
 def convert_energy_to_rating(energy_level):
     """Convert 1-10 energy level to Rekordbox 1-5 star rating (0-255)."""
     if not isinstance(energy_level, (int, float)):
@@ -567,110 +2220,798 @@ def convert_energy_to_rating(energy_level):
         return 51
 
 
+def normalize_genre_key(genre):
+    """Build the case-insensitive key used by the genre bucket cache."""
+    return re.sub(r'\s+', ' ', genre or '').strip().casefold()
+
+
+def get_cached_genre_buckets(genre_list):
+    """Return the cached main bucket for each genre that has been mapped."""
+    keys = {}
+    for g in genre_list:
+        keys.setdefault(normalize_genre_key(g), []).append(g)
+    cached = {}
+    try:
+        with db_cursor() as cursor:
+            key_list = list(keys)
+            for i in range(0, len(key_list), 500):
+                chunk = key_list[i:i + 500]
+                cursor.execute(
+                    f"SELECT genre_key, bucket FROM genre_buckets "
+                    f"WHERE genre_key IN ({', '.join(['?'] * len(chunk))})",
+                    chunk
+                )
+                for row in cursor.fetchall():
+                    for g in keys[row['genre_key']]:
+                        cached[g] = row['bucket']
+    except sqlite3.Error as e:
+        print(f"Error reading genre bucket cache: {e}")
+    return cached
+
+
+def save_genre_buckets(genre_map):
+    """Store AI genre-to-bucket answers for future split jobs."""
+    if not genre_map:
+        return
+    try:
+        with db_cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO genre_buckets (genre_key, genre, bucket) "
+                "VALUES (?, ?, ?) "
+                "ON CONFLICT (genre_key) DO UPDATE SET "
+                "bucket = excluded.bucket, updated_at = CURRENT_TIMESTAMP",
+                [(normalize_genre_key(g), g, bucket)
+                 for g, bucket in genre_map.items()]
+            )
+    except sqlite3.Error as e:
+        print(f"Error saving genre bucket cache: {e}")
+
+
+def map_genre_batch_with_ai(batch, api_key):
+    """Ask the AI to map one batch of genres to main buckets.
+
+    Returns only the genres the AI answered for; the caller decides how to
+    default the rest.
+    """
+    main_buckets_str = ", ".join(MAIN_GENRE_BUCKETS)
+    sanitized = {g: re.sub(r'[^\w\s\-/]', '', g) for g in batch}
+    genres_to_map_str = ", ".join(f"'{sanitized[g]}'" for g in batch)
+
+    prompt_text = (
+        f"You are a master music librarian. Categorize specific music "
+        f"genres into main departments. "
+        f"Main departments: [{main_buckets_str}].\n\n"
+        f"Genres to categorize: [{genres_to_map_str}].\n\n"
+        f"Respond with a single JSON object mapping each original genre "
+        f"to its department. "
+        f"Map unknown genres to 'Miscellaneous'. "
+        f"Example: {{ \"Industrial Techno\": \"Electronic\", "
+        f"\"Indie Folk\": \"Rock\" }}"
+    )
+
+    payload = {
+        "model": OPENAI_MODEL,
+        "messages": [{"role": "user", "content": prompt_text}],
+        "response_format": {"type": "json_object"}
+    }
+
+    max_retries = 5
+    initial_delay = 3
+    for attempt in range(max_retries):
+        try:
+            response = post_chat_completion(payload, 20, "genre_map")
+            response.raise_for_status()
+            data = response.json()
+            raw_content = (data.get("choices", [{}])[0]
+                           .get("message", {})
+                           .get("content"))
+            if raw_content:
+                genre_map_batch = json.loads(raw_content)
+                print(f"AI successfully processed batch. "
+                      f"Result: {genre_map_batch}")
+
+                ai_map_lower = {
+                    k.lower(): v for k, v in genre_map_batch.items()
+                }
+                answered = {}
+                for g in batch:
+                    bucket = ai_map_lower.get(
+                        g.lower(), ai_map_lower.get(sanitized[g].lower())
+                    )
+                    if isinstance(bucket, str) and bucket:
+                        answered[g] = bucket
+                return answered
+        except requests.exceptions.RequestException as e:
+            record_llm_error("genre_map", type(e).__name__,
+                             retrying=attempt + 1 < max_retries)
+            delay = llm_retry_delay(e, attempt, initial_delay)
+            print(f"AI Grouper call failed for batch "
+                  f"('{type(e).__name__}'). "
+                  f"Retrying in {delay} seconds...")
+            time.sleep(delay)
+        except json.JSONDecodeError as e:
+            record_llm_error("genre_map", type(e).__name__)
+            print(f"AI Grouper call failed due to JSON error: {e}")
+            break
+    return {}
+
+
 def get_genre_map_from_ai(genre_list):
-    """Map specific genres to main genre buckets using AI."""
-    api_key = os.environ.get("OPENAI_API_KEY")
-    if not api_key:
-        print("OPENAI_API_KEY not set. Cannot group genres.")
-        return {genre: "Miscellaneous" for genre in genre_list}
+    """Map specific genres to main genre buckets using AI.
 
+    Genres already in the genre_buckets cache are answered locally; only
+    unseen genres are sent to the AI, in concurrent batches, and valid
+    answers are written back to the cache.
+    """
     if not genre_list:
         return {}
 
-    main_buckets_str = ", ".join(MAIN_GENRE_BUCKETS)
-    final_genre_map = {}
-    batch_size = 10
+    final_genre_map = get_cached_genre_buckets(genre_list)
+    unseen_genres = [g for g in genre_list if g not in final_genre_map]
+    print(f"Genre bucket cache answered {len(final_genre_map)}/"
+          f"{len(genre_list)} genres.")
 
-    for i in range(0, len(genre_list), batch_size):
-        batch = genre_list[i:i + batch_size]
-        print(f"Processing genre batch {i // batch_size + 1}: {batch}")
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if unseen_genres and not api_key:
+        print("OPENAI_API_KEY not set. Cannot group genres.")
+    elif unseen_genres:
+        batch_size = 10
+        batches = [unseen_genres[i:i + batch_size]
+                   for i in range(0, len(unseen_genres), batch_size)]
+        print(f"Sending {len(batches)} genre batch(es) to the AI...")
+        with ThreadPoolExecutor(
+                max_workers=max(1, LLM_MAX_CONCURRENCY)) as pool:
+            answers = {}
+            for batch_answers in pool.map(
+                    lambda batch: map_genre_batch_with_ai(batch, api_key),
+                    batches):
+                answers.update(batch_answers)
+
+        save_genre_buckets({g: bucket for g, bucket in answers.items()
+                            if bucket in MAIN_GENRE_BUCKETS})
+        final_genre_map.update(answers)
+
+    for genre in genre_list:
+        if genre not in final_genre_map:
+            final_genre_map[genre] = "Miscellaneous"
+
+    print("Finished processing all genre batches.")
+    return final_genre_map
+
+
+# --- XML STREAMING ---
+
+# Declaration written by ElementTree.write(encoding='UTF-8')
+XML_DECLARATION = "<?xml version='1.0' encoding='UTF-8'?>\n"
 
-        genres_to_map_str = ", ".join(
-            f"'{re.sub(r'[^\w\s\-/]', '', g)}'" for g in batch
-        )
 
-        prompt_text = (
-            f"You are a master music librarian. Categorize specific music "
-            f"genres into main departments. "
-            f"Main departments: [{main_buckets_str}].\n\n"
-            f"Genres to categorize: [{genres_to_map_str}].\n\n"
-            f"Respond with a single JSON object mapping each original genre "
-            f"to its department. "
-            f"Map unknown genres to 'Miscellaneous'. "
-            f"Example: {{ \"Industrial Techno\": \"Electronic\", "
-            f"\"Indie Folk\": \"Rock\" }}"
+def select_xml_backend():
+    """Return 'lxml' or 'stdlib' according to XML_BACKEND."""
+    if XML_BACKEND == 'stdlib':
+        return 'stdlib'
+    if lxml_etree is None:
+        if XML_BACKEND == 'lxml':
+            print("XML_BACKEND is 'lxml' but lxml is not installed. "
+                  "Falling back to the standard library.")
+        return 'stdlib'
+    return 'lxml'
+
+
+XML_BACKEND_NAME = select_xml_backend()
+
+
+def xml_iterparse(source, events):
+    """Iterate (event, element) pairs from source with the XML backend.
+
+    lxml drops comments and processing instructions like ElementTree
+    does, accepts very large documents and never resolves entities. Its
+    syntax errors are raised as ET.ParseError so callers only handle one
+    exception type.
+    """
+    if XML_BACKEND_NAME != 'lxml':
+        yield from ET.iterparse(source, events=events)
+        return
+    try:
+        yield from lxml_etree.iterparse(
+            source, events=events, huge_tree=True, remove_comments=True,
+            remove_pis=True, resolve_entities=False
         )
+    except lxml_etree.XMLSyntaxError as e:
+        raise ET.ParseError(str(e)) from e
 
-        api_url = "https://api.openai.com/v1/chat/completions"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}"
-        }
-        payload = {
-            "model": "gpt-4o-mini",
-            "messages": [{"role": "user", "content": prompt_text}],
-            "response_format": {"type": "json_object"}
-        }
 
-        max_retries = 5
-        initial_delay = 3
-        for attempt in range(max_retries):
-            try:
-                response = requests.post(
-                    api_url,
-                    headers=headers,
-                    data=json.dumps(payload),
-                    timeout=20
-                )
-                response.raise_for_status()
-                data = response.json()
-                raw_content = (data.get("choices", [{}])[0]
-                               .get("message", {})
-                               .get("content"))
-                if raw_content:
-                    genre_map_batch = json.loads(raw_content)
-                    print(f"AI successfully processed batch. "
-                          f"Result: {genre_map_batch}")
-
-                    ai_map_lower = {
-                        k.lower(): v for k, v in genre_map_batch.items()
-                    }
-                    validated_batch = {
-                        g: ai_map_lower.get(g.lower(), "Miscellaneous")
-                        for g in batch
-                    }
-
-                    final_genre_map.update(validated_batch)
-                    break
-            except requests.exceptions.RequestException as e:
-                delay = initial_delay * (2 ** attempt)
-                print(f"AI Grouper call failed for batch "
-                      f"('{type(e).__name__}'). "
-                      f"Retrying in {delay} seconds...")
-                time.sleep(delay)
-            except json.JSONDecodeError as e:
-                print(f"AI Grouper call failed due to JSON error: {e}")
-                break
+def xml_tostring(elem):
+    """Serialise elem exactly as ET.tostring(elem, encoding='unicode').
 
-        for genre in batch:
-            if genre not in final_genre_map:
-                final_genre_map[genre] = "Miscellaneous"
+    lxml elements use lxml's serialiser. It differs from ElementTree only
+    in writing tabs as &#9; and empty tags as <X/>, which are rewritten
+    here. lxml also escapes carriage returns in text, so output with one
+    goes through ElementTree instead.
+    """
+    if lxml_etree is not None and lxml_etree.iselement(elem):
+        serialized = lxml_etree.tostring(elem, encoding='unicode')
+        if '&#13;' not in serialized:
+            return serialized.replace('&#9;', '&#09;').replace('/>', ' />')
+    return ET.tostring(elem, encoding='unicode')
+
+
+def timed_iter(iterable, timings, key):
+    """Yield from iterable, adding the time spent in it to timings[key]."""
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            timings[key] += time.perf_counter() - started
+            return
+        timings[key] += time.perf_counter() - started
+        yield item
 
-    print("Finished processing all genre batches.")
-    return final_genre_map
+
+def report_xml_timings(log_id, timings):
+    """Print the XML backend and time spent parsing and writing for a job."""
+    print(f"Job {log_id} XML backend: {XML_BACKEND_NAME} "
+          f"(parse {timings['parse']:.2f}s, write {timings['write']:.2f}s)")
+
+
+def xml_start_tag(elem, self_closing=False):
+    """Serialise an element's opening tag exactly as ElementTree does."""
+    probe = ET.Element(elem.tag, dict(elem.attrib))
+    if self_closing:
+        return ET.tostring(probe, encoding='unicode')
+    probe.text = 'x'
+    serialized = ET.tostring(probe, encoding='unicode')
+    return serialized[:serialized.index('>') + 1]
+
+
+def iter_collection_tracks(source):
+    """Stream TRACK elements from the COLLECTION of a Rekordbox XML file.
+
+    Each track is yielded once its tail text is known and is cleared
+    straight afterwards, so memory stays flat as the library grows.
+    Raises ValueError if the document has no COLLECTION element.
+    """
+    depth = 0
+    collection = None
+    in_collection = False
+    finished_track = None
+    stack = []
+
+    for event, elem in xml_iterparse(source, events=('start', 'end')):
+        if finished_track is not None:
+            yield finished_track
+            finished_track.clear()
+            collection.remove(finished_track)
+            finished_track = None
+
+        if event == 'start':
+            depth += 1
+            if (depth == 2 and collection is None and
+                    elem.tag == 'COLLECTION'):
+                collection = elem
+                in_collection = True
+            stack.append(elem)
+            continue
+
+        depth -= 1
+        stack.pop()
+        if elem is collection:
+            in_collection = False
+        if in_collection and depth >= 2:
+            if depth == 2 and elem.tag == 'TRACK':
+                finished_track = elem
+        elif stack:
+            # Free everything outside the COLLECTION (e.g. PLAYLISTS).
+            elem.clear()
+            stack[-1].remove(elem)
+
+    if collection is None:
+        raise ValueError("COLLECTION element not found.")
+
+
+def scan_collection_tracks(data, chunk_size=1024 * 1024):
+    """Find the byte range and attributes of every COLLECTION track.
+
+    data is the whole library as bytes or an mmap. Yields (start, end,
+    attributes) per TRACK directly inside the COLLECTION, where
+    data[start:end] is the element exactly as written in the file plus
+    the text up to the next COLLECTION child, ready to be copied
+    verbatim. expat is fed chunk_size bytes at a time, so only one
+    chunk's worth of results is held at once. Raises ValueError if the
+    document has no COLLECTION element.
+    """
+    parser = expat.ParserCreate()
+    state = {'depth': 0, 'in_collection': False, 'seen': False,
+             'open_track': None}
+    found = []
+
+    def close_track(index):
+        if state['open_track'] is not None:
+            start, attributes = state['open_track']
+            found.append((start, index, attributes))
+            state['open_track'] = None
+
+    def start_element(name, attributes):
+        state['depth'] += 1
+        if (state['depth'] == 2 and name == 'COLLECTION' and
+                not state['seen']):
+            state['in_collection'] = True
+        elif state['depth'] == 3 and state['in_collection']:
+            close_track(parser.CurrentByteIndex)
+            if name == 'TRACK':
+                state['open_track'] = (parser.CurrentByteIndex, attributes)
+
+    def end_element(name):
+        state['depth'] -= 1
+        if state['depth'] == 1 and state['in_collection']:
+            close_track(parser.CurrentByteIndex)
+            state['in_collection'] = False
+            state['seen'] = True
+
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    try:
+        for offset in range(0, len(data), chunk_size):
+            parser.Parse(data[offset:offset + chunk_size], False)
+            yield from found
+            found.clear()
+        parser.Parse(b'', True)
+    except expat.ExpatError as e:
+        raise ET.ParseError(str(e)) from e
+    yield from found
+
+    if not state['seen']:
+        raise ValueError("COLLECTION element not found.")
+
+
+def source_encoding(data):
+    """Return the encoding named in an XML declaration, or 'utf-8'."""
+    match = re.match(rb'<\?xml[^>]*encoding=["\']([A-Za-z0-9._-]+)["\']',
+                     data[:200].lstrip(b'\xef\xbb\xbf'))
+    return match.group(1).decode('ascii').lower() if match else 'utf-8'
+
+
+def stream_rewrite_collection(input_path, output_path, transform_track,
+                              entries=None, resume=None, checkpoint=None,
+                              checkpoint_every=None, timings=None):
+    """Copy a Rekordbox XML file, transforming each COLLECTION track.
+
+    transform_track(track, index) is called for every TRACK directly
+    inside the COLLECTION before it is written. Everything is streamed
+    through iterparse and freed once written, and the output matches
+    ElementTree.write byte for byte. If entries is given, it replaces
+    the COLLECTION's Entries attribute.
+
+    resume=(track_index, offset) continues an earlier run whose
+    output_path already holds its first offset bytes: tracks before
+    track_index are parsed but not transformed or written again. If
+    checkpoint is given, checkpoint(track_index, offset) is called every
+    checkpoint_every tracks once the output so far is safely on disk. If
+    timings is given, seconds spent serialising tracks are added to
+    timings['write'] and the rest of the pass, minus transform_track, to
+    timings['parse'].
+    """
+    stack = []
+    collection = None
+    current_track = None
+    written = None
+    track_index = 0
+    resume_index, resume_offset = resume or (0, 0)
+    suppressed = resume_index > 0
+    started = time.perf_counter()
+    transform_seconds = write_seconds = 0.0
+
+    def emit(text):
+        if not suppressed:
+            out.write(text)
+
+    def open_element(entry):
+        elem = entry[0]
+        if elem is collection and entries is not None:
+            elem.set('Entries', str(entries))
+        emit(xml_start_tag(elem))
+        if elem.text:
+            emit(escape_xml_text(elem.text))
+        entry[1] = True
+
+    if suppressed:
+        with open(output_path, 'r+b') as partial:
+            partial.truncate(resume_offset)
+
+    with open(output_path, 'a' if suppressed else 'w', encoding='utf-8',
+              errors='xmlcharrefreplace', newline='\n') as out:
+        emit(XML_DECLARATION)
+        for event, elem in xml_iterparse(input_path,
+                                         events=('start', 'end')):
+            if current_track is not None and elem is not current_track:
+                # Nested elements are serialised with their TRACK.
+                continue
+
+            if written is not None:
+                done, parent, is_track = written
+                if done.tail:
+                    emit(escape_xml_text(done.tail))
+                done.clear()
+                if parent is not None:
+                    parent.remove(done)
+                written = None
+                if is_track and suppressed:
+                    # Output resumes after the last checkpointed track.
+                    suppressed = track_index < resume_index
+                elif (is_track and checkpoint and
+                      track_index % checkpoint_every == 0):
+                    out.flush()
+                    os.fsync(out.fileno())
+                    checkpoint(track_index, out.tell())
+
+            if event == 'start':
+                if stack and not stack[-1][1]:
+                    open_element(stack[-1])
+                if (len(stack) == 1 and collection is None and
+                        elem.tag == 'COLLECTION'):
+                    collection = elem
+                if stack and stack[-1][0] is collection and \
+                        elem.tag == 'TRACK':
+                    current_track = elem
+                    continue
+                stack.append([elem, False])
+                continue
+
+            if elem is current_track:
+                if not suppressed:
+                    clock = time.perf_counter()
+                    transform_track(elem, track_index)
+                    tail, elem.tail = elem.tail, None
+                    written_at = time.perf_counter()
+                    out.write(xml_tostring(elem))
+                    elem.tail = tail
+                    transform_seconds += written_at - clock
+                    write_seconds += time.perf_counter() - written_at
+                track_index += 1
+                written = (elem, collection, True)
+                current_track = None
+                continue
+
+            entry = stack.pop()
+            if entry[1]:
+                emit(f"</{elem.tag}>")
+            elif elem.text:
+                open_element(entry)
+                emit(f"</{elem.tag}>")
+            else:
+                if elem is collection and entries is not None:
+                    elem.set('Entries', str(entries))
+                emit(xml_start_tag(elem, self_closing=True))
+            written = (elem, stack[-1][0] if stack else None, False)
+
+        if written is not None and written[0].tail:
+            emit(escape_xml_text(written[0].tail))
+
+    if collection is None:
+        raise ValueError("COLLECTION element not found.")
+    if timings is not None:
+        timings['write'] += write_seconds
+        timings['parse'] += (time.perf_counter() - started -
+                             transform_seconds - write_seconds)
+    return track_index
 
 
 # --- CORE LOGIC ---
 
-def get_primary_genre(track_element):
-    """Parse genre tag or use AI fallback to determine primary genre."""
-    genre_str = track_element.get('Genre', '').strip()
-    primary_genre = None
+def save_blueprints(blueprints):
+    """Store new AI blueprints as soon as they arrive.
+
+    Only tags_json is written here; the rest of each track row is filled
+    in when the track itself is saved. Existing blueprints are kept.
+    """
+    rows = [(name, artist, json.dumps(blueprint),
+             track_lookup_key(name, artist))
+            for (name, artist), blueprint in blueprints.items()
+            if name is not None and artist is not None and
+            blueprint and blueprint.get('primary_genre')]
+    if not rows:
+        return
+    try:
+        with db_cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO tracks (name, artist, tags_json, lookup_key) "
+                "VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (name, artist) DO UPDATE SET "
+                "tags_json = COALESCE(tracks.tags_json, excluded.tags_json)",
+                rows
+            )
+    except sqlite3.Error as e:
+        print(f"Error saving {len(rows)} new blueprint(s): {e}")
+
+
+# In-flight AI lookups of this process by normalised key. Each flight's
+# 'event' is set once its 'blueprint' is known (None if the lookup failed).
+_lookup_flights = {}
+_lookup_flights_lock = threading.Lock()
+_lookup_redis_state = {'redis': None, 'redis_retry_at': 0.0}
+
+
+def lookup_redis_key(norm_key):
+    """Return the Redis key coordinating lookups of one normalised key."""
+    digest = hashlib.sha1(norm_key.encode('utf-8')).hexdigest()
+    return f"{LLM_COALESCE_REDIS_PREFIX}{digest}"
+
+
+def get_lookup_redis():
+    """Return the Redis client coordinating lookups across workers.
+
+    Returns None while Redis is unreachable; it is retried every 30
+    seconds and lookups are only coalesced within this process meanwhile.
+    """
+    if time.monotonic() < _lookup_redis_state['redis_retry_at']:
+        return None
+    if _lookup_redis_state['redis'] is None:
+        _lookup_redis_state['redis'] = redis.Redis.from_url(
+            app.config['CELERY_BROKER_URL'], socket_timeout=1,
+            socket_connect_timeout=1
+        )
+    return _lookup_redis_state['redis']
+
+
+def lookup_redis_failed(error):
+    """Stop using Redis for lookup coalescing for the next 30 seconds."""
+    print(f"Lookup coalescing cannot reach Redis, coalescing within this "
+          f"process only: {error}")
+    _lookup_redis_state['redis_retry_at'] = time.monotonic() + 30
+
+
+def claim_track_lookups(norm_keys):
+    """Claim the AI lookup of each normalised key.
+
+    Returns (claimed, local_waits, cluster_waits). claimed lists the keys
+    this caller looks up itself and must pass to release_track_lookups;
+    cluster_waits is the subset another worker already holds, which the
+    caller waits for before releasing. local_waits maps keys another
+    thread of this process is looking up to their flight.
+    """
+    claimed = []
+    local_waits = {}
+    with _lookup_flights_lock:
+        for norm_key in norm_keys:
+            if norm_key in _lookup_flights:
+                local_waits[norm_key] = _lookup_flights[norm_key]
+            else:
+                _lookup_flights[norm_key] = {'event': threading.Event(),
+                                             'blueprint': None}
+                claimed.append(norm_key)
+
+    cluster_waits = []
+    client = get_lookup_redis() if claimed else None
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=False)
+            for norm_key in claimed:
+                pipe.set(f"{lookup_redis_key(norm_key)}:lock", os.getpid(),
+                         nx=True, ex=int(LLM_COALESCE_WAIT_SECONDS))
+            cluster_waits = [norm_key for norm_key, acquired
+                             in zip(claimed, pipe.execute()) if not acquired]
+        except redis.RedisError as e:
+            lookup_redis_failed(e)
+    return claimed, local_waits, cluster_waits
+
+
+def release_track_lookups(results, cluster_keys):
+    """Publish the blueprints of claimed lookups and end their flights.
+
+    results maps normalised keys to their blueprint, or None if the lookup
+    failed. Keys in cluster_keys had their Redis lock taken by this caller;
+    their result is published there for waiting workers.
+    """
+    if not results:
+        return
+    published = [(norm_key, blueprint) for norm_key, blueprint
+                 in results.items() if norm_key in cluster_keys]
+    client = get_lookup_redis() if published else None
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=False)
+            for norm_key, blueprint in published:
+                redis_key = lookup_redis_key(norm_key)
+                if blueprint:
+                    pipe.set(f"{redis_key}:result", json.dumps(blueprint),
+                             ex=int(LLM_COALESCE_WAIT_SECONDS))
+                pipe.delete(f"{redis_key}:lock")
+            pipe.execute()
+        except redis.RedisError as e:
+            lookup_redis_failed(e)
+
+    with _lookup_flights_lock:
+        for norm_key, blueprint in results.items():
+            flight = _lookup_flights.pop(norm_key, None)
+            if flight:
+                flight['blueprint'] = blueprint
+                flight['event'].set()
+
+
+def wait_for_track_lookups(local_waits, cluster_waits):
+    """Wait for lookups made elsewhere and return their blueprints.
+
+    Returns {normalised key: blueprint or None}. None means the other
+    lookup failed or did not finish within LLM_COALESCE_WAIT_SECONDS.
+    """
+    deadline = time.monotonic() + LLM_COALESCE_WAIT_SECONDS
+    results = {}
+    for norm_key, flight in local_waits.items():
+        flight['event'].wait(max(0.0, deadline - time.monotonic()))
+        results[norm_key] = flight['blueprint']
+
+    waiting = list(cluster_waits)
+    while waiting and time.monotonic() < deadline:
+        client = get_lookup_redis()
+        if client is None:
+            break
+        try:
+            pipe = client.pipeline(transaction=False)
+            for norm_key in waiting:
+                pipe.get(f"{lookup_redis_key(norm_key)}:result")
+                pipe.exists(f"{lookup_redis_key(norm_key)}:lock")
+            replies = pipe.execute()
+        except redis.RedisError as e:
+            lookup_redis_failed(e)
+            break
+
+        still_waiting = []
+        for i, norm_key in enumerate(waiting):
+            result, locked = replies[2 * i], replies[2 * i + 1]
+            if result is not None:
+                results[norm_key] = json.loads(result)
+            elif locked:
+                still_waiting.append(norm_key)
+        waiting = still_waiting
+        if waiting:
+            time.sleep(LLM_COALESCE_POLL_SECONDS)
+    return results
+
+
+def resolve_blueprints(track_lookups, on_saved=None):
+    """Look up cached blueprints and tag cache misses concurrently.
+
+    track_lookups maps each unique (name, artist) key to the track data
+    sent to the AI. Returns a dict with the same keys holding
+    (blueprint, cache_hit). Misses are grouped into requests of
+    LLM_BATCH_SIZE tracks, with at most LLM_MAX_CONCURRENCY requests in
+    flight at any time. New blueprints are saved as they arrive, so a
+    crashed job does not pay for them again; on_saved() is called after
+    each save.
+
+    Misses with the same track_lookup_key share one lookup, and so do
+    misses another job is already looking up, in this process or in
+    another worker.
+    """
+    cached_blueprints = get_track_blueprints(track_lookups.keys())
+    print(f"Prefetched {len(cached_blueprints)}/{len(track_lookups)} "
+          f"blueprints from the cache.")
+
+    blueprints = {}
+    groups = {}
+    for key, track_data in track_lookups.items():
+        cached = cached_blueprints.get(key)
+        blueprints[key] = (cached, bool(cached))
+        if not cached:
+            groups.setdefault(track_lookup_key(*key), []).append(
+                (key, track_data)
+            )
+
+    if not groups:
+        return blueprints
+
+    duplicates = sum(len(group) - 1 for group in groups.values())
+    if duplicates:
+        inc_metric("tag_genius_llm_calls_coalesced_total", {"scope": "job"},
+                   duplicates)
+    claimed, local_waits, cluster_waits = claim_track_lookups(groups.keys())
+    cluster_keys = set(claimed) - set(cluster_waits)
+    open_claims = set(claimed)
+    unsaved = {}
+    unreleased = {}
+    last_save = time.monotonic()
+
+    def store(norm_key, blueprint, cache_hit):
+        for key, _ in groups[norm_key]:
+            blueprints[key] = (blueprint, cache_hit)
+            unsaved[key] = blueprint
+        if norm_key in open_claims:
+            unreleased[norm_key] = blueprint
+
+    def save(force=False):
+        nonlocal unsaved, unreleased, last_save
+        if not force and len(unsaved) < 50 and \
+                time.monotonic() - last_save < 15:
+            return
+        # Save before releasing so waiting jobs never miss the cache.
+        save_blueprints(unsaved)
+        release_track_lookups(unreleased, cluster_keys)
+        open_claims.difference_update(unreleased)
+        unsaved = {}
+        unreleased = {}
+        last_save = time.monotonic()
+        if on_saved:
+            on_saved()
+
+    def tag_with_ai(norm_keys):
+        if not norm_keys:
+            return
+        batch_size = max(1, LLM_BATCH_SIZE)
+        batches = [norm_keys[i:i + batch_size]
+                   for i in range(0, len(norm_keys), batch_size)]
+        print(f"{len(norm_keys)} cache misses. Calling AI in {len(batches)} "
+              f"request(s) with up to {LLM_MAX_CONCURRENCY} in flight...")
+        with ThreadPoolExecutor(
+                max_workers=max(1, LLM_MAX_CONCURRENCY)) as pool:
+            results = pool.map(
+                lambda batch: call_llm_for_tags_batch(
+                    [groups[norm_key][0][1] for norm_key in batch],
+                    MASTER_BLUEPRINT_CONFIG, mode='full'
+                ),
+                batches
+            )
+            for batch, batch_results in zip(batches, results):
+                for norm_key, blueprint in zip(batch, batch_results):
+                    store(norm_key, blueprint, False)
+                save()
+
+    try:
+        tag_with_ai([norm_key for norm_key in claimed
+                     if norm_key not in cluster_waits])
+        save(force=True)
+
+        # Keys another job is looking up: use its answer, or look them up
+        # here if it failed or took too long.
+        if local_waits or cluster_waits:
+            print(f"Waiting for {len(local_waits) + len(cluster_waits)} "
+                  f"lookup(s) already in flight in other jobs...")
+        shared = wait_for_track_lookups(local_waits, cluster_waits)
+        retry = []
+        for norm_key in list(local_waits) + cluster_waits:
+            blueprint = shared.get(norm_key)
+            if blueprint and blueprint.get('primary_genre'):
+                store(norm_key, blueprint, True)
+                inc_metric("tag_genius_llm_calls_coalesced_total",
+                           {"scope": "process" if norm_key in local_waits
+                            else "cluster"})
+            else:
+                retry.append(norm_key)
+        tag_with_ai(retry)
+        save(force=True)
+    finally:
+        # Never leave other jobs waiting on a lookup this one abandoned.
+        release_track_lookups({norm_key: None for norm_key in open_claims},
+                              cluster_keys)
+    return blueprints
 
+
+def parse_local_genre(track_element):
+    """Return the first genre in a track's Genre tag, or None if empty."""
+    genre_str = track_element.get('Genre', '').strip()
     if genre_str:
         parsed_genre = re.split(r'[,/]', genre_str)[0].strip()
         if parsed_genre:
-            primary_genre = parsed_genre
+            return parsed_genre
+    return None
+
+
+def genre_from_ai_response(ai_response, artist, title):
+    """Pick the primary genre out of a genre_only AI response."""
+    if (ai_response and isinstance(ai_response, dict) and
+            isinstance(ai_response.get('primary_genre'), list) and
+            ai_response['primary_genre']):
+        primary_genre_from_ai = ai_response['primary_genre'][0]
+        return (primary_genre_from_ai
+                if primary_genre_from_ai else "Miscellaneous")
+    print(f"AI failed to provide valid primary genre for "
+          f"'{artist} - {title}'. Defaulting to Miscellaneous.")
+    return "Miscellaneous"
+
+
+def get_primary_genre(track_element):
+    """Parse genre tag or use AI fallback to determine primary genre."""
+    primary_genre = parse_local_genre(track_element)
 
     if not primary_genre:
         print(f"No valid genre found locally for "
@@ -684,110 +3025,209 @@ def get_primary_genre(track_element):
             'YEAR': track_element.get('Year')
         }
         ai_response = call_llm_for_tags(track_data, {}, mode='genre_only')
+        return genre_from_ai_response(ai_response,
+                                      track_element.get('Artist'),
+                                      track_element.get('Name'))
 
-        if (ai_response and isinstance(ai_response, dict) and
-                isinstance(ai_response.get('primary_genre'), list) and
-                ai_response['primary_genre']):
-            primary_genre_from_ai = ai_response['primary_genre'][0]
-            return (primary_genre_from_ai
-                    if primary_genre_from_ai else "Miscellaneous")
-        else:
-            print(f"AI failed to provide valid primary genre for "
-                  f"'{track_element.get('Artist')} - "
-                  f"{track_element.get('Name')}'. "
-                  f"Defaulting to Miscellaneous.")
-            return "Miscellaneous"
+    return primary_genre
+
+
+def resolve_missing_genres(track_lookups):
+    """Find a primary genre for tracks whose Genre tag is empty.
+
+    track_lookups maps each unique (name, artist) key to its track data.
+    Stored blueprints answer first; the rest go to the AI in genre_only
+    mode, batched by LLM_BATCH_SIZE with up to LLM_MAX_CONCURRENCY
+    requests in flight. Returns a dict of key -> genre.
+    """
+    genres = {}
+    cached_blueprints = get_track_blueprints(track_lookups.keys())
+    for key, blueprint in cached_blueprints.items():
+        primary_genre = ensure_list(blueprint.get('primary_genre'))
+        if primary_genre and primary_genre[0]:
+            genres[key] = primary_genre[0]
+
+    pending = [key for key in track_lookups if key not in genres]
+    print(f"Blueprint cache answered {len(genres)}/{len(track_lookups)} "
+          f"untagged tracks; asking AI for {len(pending)}.")
+    if not pending:
+        return genres
+
+    batch_size = max(1, LLM_BATCH_SIZE)
+    batches = [pending[i:i + batch_size]
+               for i in range(0, len(pending), batch_size)]
+    with ThreadPoolExecutor(max_workers=max(1, LLM_MAX_CONCURRENCY)) as pool:
+        results = pool.map(
+            lambda batch: call_llm_for_tags_batch(
+                [track_lookups[key] for key in batch], {},
+                mode='genre_only'
+            ),
+            batches
+        )
+        for batch, batch_results in zip(batches, results):
+            for key, ai_response in zip(batch, batch_results):
+                genres[key] = genre_from_ai_response(ai_response,
+                                                     key[1], key[0])
+
+    return genres
+
+
+def split_xml_by_genre(input_path, job_folder_path):
+    """Parse Rekordbox XML, group tracks by genre, and save split files.
+
+    The library is memory-mapped and scanned once for each track's byte
+    range; the bucket files are then written together in a second pass
+    that copies every TRACK exactly as it appears in the source. Only a
+    few integers per track are held in memory.
+    """
+    print(f"Starting split process for file: {input_path} "
+          f"into folder: {job_folder_path}")
+    try:
+        with open(input_path, 'rb') as source, ExitStack() as stack:
+            if os.fstat(source.fileno()).st_size == 0:
+                raise ET.ParseError("no element found: line 1, column 0")
+            data = stack.enter_context(
+                mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+            )
+
+            # STAGE 1: RAW SORT
+            # Tracks with a Genre tag are sorted locally; untagged tracks
+            # are de-duplicated and resolved together afterwards. Each
+            # track keeps its byte range and the id of its label (a genre,
+            # or the key of an untagged track).
+            print("Starting Stage 1: Determining primary genre for each "
+                  "track...")
+            track_starts = array('q')
+            track_ends = array('q')
+            track_labels = array('l')
+            labels = []
+            label_ids = {}
+            untagged_lookups = {}
+            for start, end, attributes in scan_collection_tracks(data):
+                label = parse_local_genre(attributes)
+                if not label:
+                    label = (attributes.get('Name'), attributes.get('Artist'))
+                    if label not in untagged_lookups:
+                        untagged_lookups[label] = {
+                            'ARTIST': label[1],
+                            'TITLE': label[0],
+                            'GENRE': attributes.get('Genre'),
+                            'YEAR': attributes.get('Year')
+                        }
+                if label not in label_ids:
+                    label_ids[label] = len(labels)
+                    labels.append(label)
+                track_starts.append(start)
+                track_ends.append(end)
+                track_labels.append(label_ids[label])
+            del label_ids
+            track_count = len(track_labels)
+            inc_metric("tag_genius_tracks_processed_total",
+                       {"job_type": "split"}, track_count)
+            print(f"Scanned {track_count} tracks; {len(untagged_lookups)} "
+                  f"unique untagged tracks need a genre.")
+
+            missing_genres = resolve_missing_genres(untagged_lookups)
+            label_genres = [label if isinstance(label, str)
+                            else missing_genres[label] for label in labels]
+
+            genre_groups = {}
+            for genre in label_genres:
+                genre_groups.setdefault(genre, 0)
+            for label_id in track_labels:
+                genre_groups[label_genres[label_id]] += 1
+
+            if not track_count:
+                print("No tracks found in the input file's COLLECTION.")
+                return []
+
+            print(f"Finished Stage 1. Found raw genres: "
+                  f"{list(genre_groups.keys())}")
+
+            # STAGE 2: DYNAMIC AI-POWERED GROUPING
+            unique_genres = list(genre_groups.keys())
+            if not unique_genres:
+                print("No genres determined after Stage 1.")
+                return []
 
-    return primary_genre
+            print("Starting Stage 2: Calling AI to group genres "
+                  "into main buckets...")
+            genre_map = get_genre_map_from_ai(unique_genres)
 
+            if "R&B" in genre_map:
+                genre_map["R&B"] = "Hip Hop"
 
-def split_xml_by_genre(input_path, job_folder_path):
-    """Parse Rekordbox XML, group tracks by genre, and save split files."""
-    print(f"Starting split process for file: {input_path} "
-          f"into folder: {job_folder_path}")
-    try:
-        original_tree = ET.parse(input_path)
-        root = original_tree.getroot()
-        collection = root.find('COLLECTION')
-        if collection is None:
-            raise ValueError("Could not find COLLECTION element in XML.")
-        tracks = collection.findall('TRACK')
-        if not tracks:
-            print("No tracks found in the input file's COLLECTION.")
-            return []
-
-        # STAGE 1: RAW SORT
-        genre_groups = {}
-        print("Starting Stage 1: Determining primary genre for each track...")
-        for i, track in enumerate(tracks):
-            primary_genre = get_primary_genre(track)
-            if primary_genre not in genre_groups:
-                genre_groups[primary_genre] = []
-            genre_groups[primary_genre].append(track)
-            if (i + 1) % 50 == 0:
-                print(f"Processed {i + 1}/{len(tracks)} tracks "
-                      f"for initial genre sorting...")
-
-        print(f"Finished Stage 1. Found raw genres: "
-              f"{list(genre_groups.keys())}")
-
-        # STAGE 2: DYNAMIC AI-POWERED GROUPING
-        unique_genres = list(genre_groups.keys())
-        if not unique_genres:
-            print("No genres determined after Stage 1.")
-            return []
-
-        print("Starting Stage 2: Calling AI to group genres "
-              "into main buckets...")
-        genre_map = get_genre_map_from_ai(unique_genres)
-
-        if "R&B" in genre_map:
-            genre_map["R&B"] = "Hip Hop"
-
-        print(f"AI Genre Map received: {genre_map}")
-
-        main_genre_buckets = {}
-        for genre, track_list in genre_groups.items():
-            main_bucket_name = genre_map.get(genre, "Miscellaneous")
-            if main_bucket_name not in main_genre_buckets:
-                main_genre_buckets[main_bucket_name] = []
-            main_genre_buckets[main_bucket_name].extend(track_list)
-
-        print(f"Finished Stage 2. Grouped into main buckets: "
-              f"{list(main_genre_buckets.keys())}")
-
-        # FILE CREATION
-        created_files = []
-        print("Starting file creation...")
-        for bucket_name, track_list in main_genre_buckets.items():
-            if not track_list:
-                continue
+            print(f"AI Genre Map received: {genre_map}")
 
-            new_root = ET.Element('DJ_PLAYLISTS',
-                                  attrib={'Version': '1.0.0'})
-            ET.SubElement(new_root, 'PRODUCT',
-                          attrib={'Name': 'Tag Genius', 'Version': '1.0',
-                                  'Company': ''})
-            new_collection = ET.SubElement(
-                new_root, 'COLLECTION',
-                attrib={'Entries': str(len(track_list))}
-            )
-            for track_element in track_list:
-                new_collection.append(track_element)
+            main_genre_buckets = {}
+            for genre, count in genre_groups.items():
+                main_bucket_name = genre_map.get(genre, "Miscellaneous")
+                main_genre_buckets[main_bucket_name] = (
+                    main_genre_buckets.get(main_bucket_name, 0) + count
+                )
+            bucket_names = list(main_genre_buckets)
+            label_buckets = [
+                bucket_names.index(genre_map.get(genre, "Miscellaneous"))
+                for genre in label_genres
+            ]
+
+            print(f"Finished Stage 2. Grouped into main buckets: "
+                  f"{bucket_names}")
+
+            # FILE CREATION
+            # Open every bucket file, then copy each track's bytes to its
+            # bucket in one pass over the source.
+            print("Starting file creation...")
+            encoding = source_encoding(data)
+            bucket_files = []
+            for bucket_name in bucket_names:
+                new_root = ET.Element('DJ_PLAYLISTS',
+                                      attrib={'Version': '1.0.0'})
+                ET.SubElement(new_root, 'PRODUCT',
+                              attrib={'Name': 'Tag Genius', 'Version': '1.0',
+                                      'Company': ''})
+                new_collection = ET.SubElement(
+                    new_root, 'COLLECTION',
+                    attrib={'Entries': str(main_genre_buckets[bucket_name])}
+                )
+                new_collection.text = '\0'
+                header, footer = (
+                    ET.tostring(new_root, encoding='unicode').split('\0')
+                )
 
-            new_tree = ET.ElementTree(new_root)
-            safe_bucket_name = re.sub(r'[ /&]', '_', bucket_name)
-            filename = f"{safe_bucket_name}.xml"
-            output_path = os.path.join(job_folder_path, filename)
+                safe_bucket_name = re.sub(r'[ /&]', '_', bucket_name)
+                filename = f"{safe_bucket_name}.xml"
+                output_path = os.path.join(job_folder_path, filename)
+                try:
+                    out = stack.enter_context(open(output_path, 'wb'))
+                    out.write(XML_DECLARATION.encode('utf-8'))
+                    out.write(header.encode('utf-8'))
+                    bucket_files.append((out, output_path, footer))
+                except IOError as e:
+                    print(f"Error writing file {filename}: {e}")
+                    bucket_files.append(None)
+
+            for start, end, label_id in zip(track_starts, track_ends,
+                                            track_labels):
+                bucket_file = bucket_files[label_buckets[label_id]]
+                if bucket_file is None:
+                    continue
+                if encoding in ('utf-8', 'utf8'):
+                    bucket_file[0].write(data[start:end])
+                else:
+                    bucket_file[0].write(
+                        data[start:end].decode(encoding).encode('utf-8')
+                    )
 
-            try:
-                new_tree.write(output_path, encoding='UTF-8',
-                               xml_declaration=True)
+            created_files = []
+            for bucket_name, bucket_file in zip(bucket_names, bucket_files):
+                if bucket_file is None:
+                    continue
+                out, output_path, footer = bucket_file
+                out.write(footer.encode('utf-8'))
                 created_files.append(output_path)
-                print(f"Successfully created {filename} "
-                      f"with {len(track_list)} tracks.")
-            except IOError as e:
-                print(f"Error writing file {filename}: {e}")
+                print(f"Successfully created {os.path.basename(output_path)} "
+                      f"with {main_genre_buckets[bucket_name]} tracks.")
 
         print(f"Finished file creation. {len(created_files)} files created.")
         return created_files
@@ -814,6 +3254,205 @@ def clear_ai_tags(track_element):
     return track_element
 
 
+def ensure_list(value):
+    """Wrap a single tag string in a list and discard non-list values."""
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list):
+        return value
+    return []
+
+
+def render_tag_attributes(tags_for_xml):
+    """Work out the attributes a set of rendered tags writes to a TRACK.
+
+    Returns Genre, Comments, Colour, Grouping and Rating as
+    apply_rendered_attributes expects them, except that Genre is empty
+    when the tags name no genre and Comments holds only the /* ... */
+    block. merge_track_render combines both with the track's own values.
+    """
+    primary_genre = ensure_list(tags_for_xml.get('primary_genre'))
+    sub_genre = ensure_list(tags_for_xml.get('sub_genre'))
+    genre_string = ", ".join(g for g in primary_genre + sub_genre if g)
+
+    # Format comments
+    tag_order_and_prefixes = {
+        'situation_environment': 'Sit',
+        'energy_vibe': 'Vibe',
+        'components': 'Comp',
+        'time_period': 'Time'
+    }
+    formatted_parts = []
+    energy_level = tags_for_xml.get('energy_level')
+    if isinstance(energy_level, int):
+        formatted_parts.append(f"E: {str(energy_level).zfill(2)}")
+    for key, prefix in tag_order_and_prefixes.items():
+        tags = ensure_list(tags_for_xml.get(key))
+        if tags:
+            tag_string = ", ".join(
+                [t.strip().capitalize() for t in tags if t]
+            )
+            if tag_string:
+                formatted_parts.append(f"{prefix}: {tag_string}")
+    final_comments_content = ' / '.join(formatted_parts)
+
+    # Colour by energy
+    track_colour_hex, track_colour_name = None, None
+    if isinstance(energy_level, int):
+        if energy_level >= 9:
+            track_colour_hex = '0xFF007F'
+            track_colour_name = "Pink"
+        elif energy_level == 8:
+            track_colour_hex = '0xFFA500'
+            track_colour_name = "Orange"
+        elif energy_level >= 6:
+            track_colour_hex = '0xFFFF00'
+            track_colour_name = "Yellow"
+        elif energy_level >= 4:
+            track_colour_hex = '0x00FF00'
+            track_colour_name = "Green"
+        else:
+            track_colour_hex = '0x25FDE9'
+            track_colour_name = "Aqua"
+
+    # Star rating
+    rating_value = (convert_energy_to_rating(energy_level)
+                    if energy_level is not None else 0)
+
+    return {
+        'Genre': genre_string,
+        'Comments': (f"/* {final_comments_content} */"
+                     if final_comments_content else ""),
+        'Colour': track_colour_hex,
+        'Grouping': track_colour_name,
+        'Rating': str(rating_value)
+    }
+
+
+def merge_track_render(track, rendered):
+    """Combine render_tag_attributes output with a TRACK's own values.
+
+    Existing AI comment blocks are replaced and the track's Genre is
+    kept when the render has none.
+    """
+    existing_comments = re.sub(r'/\*.*?\*/', '',
+                               track.get('Comments', '')).strip()
+    return {
+        **rendered,
+        'Genre': rendered['Genre'] or track.get('Genre', ''),
+        'Comments': f"{existing_comments} {rendered['Comments']}".strip()
+    }
+
+
+def render_tags_to_track(track, tags_for_xml):
+    """Write rendered tags into a TRACK's Genre, Comments, Colour and Rating.
+
+    Returns the new genre string.
+    """
+    rendered = merge_track_render(track, render_tag_attributes(tags_for_xml))
+    apply_rendered_attributes(track, rendered)
+
+    energy_level = tags_for_xml.get('energy_level')
+    if rendered['Colour'] and track.get('Colour') != '0xFF0000':
+        print(f"Colour-coded track as {rendered['Grouping']} "
+              f"based on energy: {energy_level}/10")
+    print(f"Assigned star rating based on energy level: "
+          f"{energy_level}/10 -> {rendered['Rating']}")
+
+    return rendered['Genre']
+
+
+def track_fingerprint(track, config):
+    """Hash the attributes and config that determine a track's render."""
+    render_config = {k: v for k, v in config.items()
+                     if k not in ('incremental', 'chunked')}
+    payload = json.dumps(
+        [render_config,
+         [track.get(name) for name in TRACK_FINGERPRINT_ATTRIBUTES]],
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def library_render_key(filename, location_root):
+    """Return the key a library's stored renders are saved under.
+
+    location_root is the folder shared by every track Location in the
+    library, so two users uploading a "rekordbox.xml" keep separate
+    renders while one library keeps its key from job to job.
+    """
+    return f"{filename}|{location_root}"
+
+
+def apply_rendered_attributes(track, rendered):
+    """Re-apply a stored render exactly as render_tags_to_track wrote it."""
+    track.set('Comments', rendered['Comments'])
+    track.set('Rating', rendered['Rating'])
+    track.set('Genre', rendered['Genre'])
+    if track.get('Colour') != '0xFF0000':
+        for name in ('Colour', 'Grouping'):
+            if name in track.attrib:
+                del track.attrib[name]
+        for name in ('Colour', 'Grouping'):
+            if rendered.get(name) is not None:
+                track.set(name, rendered[name])
+
+
+def tag_track_with_blueprint(track, blueprint_entry, config, writer):
+    """Render a TRACK from its blueprint and queue its database row.
+
+    blueprint_entry is the (blueprint, cache_hit) pair returned by
+    resolve_blueprints. Returns True if tags were rendered into the track.
+    """
+    track_name = track.get('Name')
+    artist = track.get('Artist')
+    full_blueprint_tags, cache_hit = blueprint_entry
+
+    inc_metric("tag_genius_blueprint_cache_total",
+               {"result": "hit" if cache_hit else "miss"})
+    if cache_hit:
+        print(f"CACHE HIT for: {track_name}. "
+              f"Using stored blueprint.")
+    else:
+        print(f"CACHE MISS for: {track_name}. "
+              f"Using blueprint created by AI.")
+
+    # Validate blueprint
+    if not full_blueprint_tags or not full_blueprint_tags.get(
+            'primary_genre'):
+        print("Skipping tag update due to empty or invalid blueprint.")
+        writer.add(
+            track_name, artist, track.get('AverageBpm'),
+            track.get('Tonality'), track.get('Genre'),
+            track.get('Label'), track.get('Comments'),
+            track.get('Grouping'), None
+        )
+        return False
+
+    # DYNAMIC RENDERING
+    tags_for_xml = apply_user_config_to_tags(
+        full_blueprint_tags, config
+    )
+    new_genre_string = render_tags_to_track(track, tags_for_xml)
+    print(f"Updated XML for: {track_name}")
+
+    # Count tags written to XML
+    rendered_tags_set = extract_tag_names(tags_for_xml)
+    print(f"Wrote {len(rendered_tags_set)} tags to XML "
+          f"for this track.")
+
+    # SAVE BLUEPRINT
+    writer.add(
+        track_name, artist, track.get('AverageBpm'),
+        track.get('Tonality'),
+        new_genre_string if new_genre_string
+        else track.get('Genre', ''),
+        track.get('Label'), track.get('Comments'),
+        track.get('Grouping'), full_blueprint_tags
+    )
+    return True
+
+
 @celery.task
 def split_library_task(log_id, input_path, job_folder_path):
     """Celery task to orchestrate library splitting in background."""
@@ -835,6 +3474,8 @@ def split_library_task(log_id, input_path, job_folder_path):
                 ('Completed', result_json, len(created_files), log_id)
             )
         print(f"Split job {log_id} completed successfully.")
+        inc_metric("tag_genius_jobs_total",
+                   {"job_type": "split", "status": "Completed"})
         return {"message": "Split successful", "files": relative_paths}
 
     except Exception as e:
@@ -844,7 +3485,11 @@ def split_library_task(log_id, input_path, job_folder_path):
                 "UPDATE processing_log SET status = ? WHERE id = ?",
                 ('Failed', log_id)
             )
+        inc_metric("tag_genius_jobs_total",
+                   {"job_type": "split", "status": "Failed"})
         return {"error": str(e)}
+    finally:
+        flush_metrics()
 
 
 @celery.task
@@ -854,171 +3499,156 @@ def process_library_task(log_id, input_path, output_path, config):
         return {"error": "Failed to initialize logging for the job."}
 
     try:
-        tree = ET.parse(input_path)
-        root = tree.getroot()
-        collection = root.find('COLLECTION')
-        if collection is None:
-            raise ValueError("COLLECTION element not found.")
-        tracks = collection.findall('TRACK')
-        total_tracks = len(tracks)
+        # Each run writes to its own partial file. A resumed run starts
+        # from the previous run's checkpoint instead of track 0.
+        checkpoint = claim_job_checkpoint(log_id, input_path, output_path,
+                                          config)
+        run_id = checkpoint['run_id']
+        partial_path = f"{output_path}.{run_id}.part"
+
+        # Incremental jobs reuse the stored render of every track whose
+        # fingerprint matches one from an earlier job for the same
+        # library, so only new or changed tracks are tagged again.
+        incremental = (config.get('level') != 'Clear' and
+                       config.get('incremental', True))
+
+        # PASS 1: count tracks, fingerprint them and collect unique lookups
+        xml_timings = {'parse': 0.0, 'write': 0.0}
+        total_tracks = 0
+        fingerprints = []
+        key_fingerprints = {}
+        track_lookups = {}
+        location_root = None
+        for track in timed_iter(iter_collection_tracks(input_path),
+                                xml_timings, 'parse'):
+            total_tracks += 1
+            key = (track.get('Name'), track.get('Artist'))
+            if config.get('level') != 'Clear' and key not in track_lookups:
+                track_lookups[key] = {
+                    'ARTIST': key[1],
+                    'TITLE': key[0],
+                    'GENRE': track.get('Genre'),
+                    'YEAR': track.get('Year')
+                }
+            if incremental:
+                fingerprint = track_fingerprint(track, config)
+                fingerprints.append(fingerprint)
+                key_fingerprints.setdefault(key, set()).add(fingerprint)
+                location = track.get('Location')
+                if location is not None:
+                    if location_root is None:
+                        location_root = location[:location.rfind('/') + 1]
+                    elif not location.startswith(location_root):
+                        location_root = os.path.commonprefix(
+                            [location_root, location]
+                        )
+                        location_root = location_root[
+                            :location_root.rfind('/') + 1]
+
+        library_key = (library_render_key(get_job_filename(log_id),
+                                          location_root or '')
+                       if incremental else None)
+
+        # Only keys with at least one new or changed track need a blueprint.
+        # Every track of such a key is tagged again, so the key's tracks row
+        # ends up as a full re-tag would leave it.
+        stored_renders = (get_track_renders(library_key, set(fingerprints))
+                          if library_key else {})
+        if stored_renders:
+            track_lookups = {
+                key: track_data for key, track_data in track_lookups.items()
+                if not key_fingerprints[key] <= stored_renders.keys()
+            }
+            for key in track_lookups:
+                for fingerprint in key_fingerprints[key]:
+                    stored_renders.pop(fingerprint, None)
+        del key_fingerprints
         print(f"Found {total_tracks} tracks. Starting tagging process...")
+        if incremental:
+            reused_count = sum(1 for fp in fingerprints
+                               if fp in stored_renders)
+            print(f"Incremental mode: {reused_count}/{total_tracks} tracks "
+                  f"unchanged since the last job for {library_key}.")
+
+        if config.get('level') != 'Clear' and (
+                config.get('chunked') or
+                (TAG_CHUNKED_MIN_TRACKS and
+                 total_tracks >= TAG_CHUNKED_MIN_TRACKS)):
+            return dispatch_tag_chunks(
+                log_id, run_id, input_path, output_path, config,
+                total_tracks, fingerprints, stored_renders, library_key,
+                xml_timings
+            )
+
+        resume = prepare_resumed_output(checkpoint, partial_path)
+        if resume:
+            print(f"Resuming job {log_id} from checkpoint at track "
+                  f"{resume[0]}.")
+
+        # Resolve every blueprint up front so AI calls run concurrently;
+        # pass 2 still applies results in track order.
+        blueprints = resolve_blueprints(
+            track_lookups,
+            on_saved=lambda: save_job_checkpoint(log_id, run_id)
+        )
+
+        processed_count = resume[0] if resume else 0
+        writer = TrackDataWriter()
+        new_renders = {}
+
+        def save_checkpoint(track_index, output_offset):
+            writer.flush()
+            # Renders are saved with each checkpoint so a resumed run,
+            # which starts after them, does not lose them.
+            if library_key and new_renders:
+                save_track_renders(library_key, new_renders)
+                new_renders.clear()
+            save_job_checkpoint(log_id, run_id, track_index, output_offset,
+                                partial_path)
+
+        def tag_track(track, index):
+            nonlocal processed_count
+            if stored_renders and fingerprints[index] in stored_renders:
+                # Unchanged since the last job: no lookup, render or write.
+                apply_rendered_attributes(track,
+                                          stored_renders[fingerprints[index]])
+                processed_count += 1
+                inc_metric("tag_genius_tracks_processed_total",
+                           {"job_type": "tagging"})
+                if (index + 1) % 100 == 0 or (index + 1) == total_tracks:
+                    update_job_progress(log_id, index + 1, total_tracks)
+                return
 
-        processed_count = 0
-        for index, track in enumerate(tracks):
             track_name = track.get('Name')
             artist = track.get('Artist')
             print(f"\nProcessing track {index + 1}/{total_tracks}: "
                   f"{artist} - {track_name}")
+            inc_metric("tag_genius_tracks_processed_total",
+                       {"job_type": "tagging"})
 
             # Handle "Clear Tags" Mode
             if config.get('level') == 'Clear':
                 clear_ai_tags(track)
                 print(f"Cleared existing AI tags for: {track_name}")
-                insert_track_data(
+                writer.add(
                     track_name, artist, track.get('AverageBpm'),
                     track.get('Tonality'), track.get('Genre'),
                     track.get('Label'), track.get('Comments'),
                     track.get('Grouping'), None
                 )
                 processed_count += 1
-                continue
-
-            # Caching and Tagging Logic
-            full_blueprint_tags = None
-
-            # CACHE CHECK
-            full_blueprint_tags = get_track_blueprint(track_name, artist)
-
-            if full_blueprint_tags:
-                print(f"CACHE HIT for: {track_name}. "
-                      f"Using stored blueprint.")
-            else:
-                print(f"CACHE MISS for: {track_name}. "
-                      f"Calling AI to create blueprint...")
-                track_data = {
-                    'ARTIST': artist,
-                    'TITLE': track_name,
-                    'GENRE': track.get('Genre'),
-                    'YEAR': track.get('Year')
-                }
-                full_blueprint_tags = call_llm_for_tags(
-                    track_data, MASTER_BLUEPRINT_CONFIG, mode='full'
-                )
-
-            # Validate blueprint
-            if not full_blueprint_tags or not full_blueprint_tags.get(
-                    'primary_genre'):
-                print("Skipping tag update due to empty or invalid blueprint.")
-                insert_track_data(
-                    track_name, artist, track.get('AverageBpm'),
-                    track.get('Tonality'), track.get('Genre'),
-                    track.get('Label'), track.get('Comments'),
-                    track.get('Grouping'), None
+                return
+
+            # CACHE CHECK (resolved ahead of pass 2)
+            if not tag_track_with_blueprint(
+                    track, blueprints[(track_name, artist)], config, writer):
+                return
+            if incremental:
+                new_renders[fingerprints[index]] = (
+                    track_lookup_key(track_name, artist),
+                    {name: track.get(name)
+                     for name in TRACK_RENDERED_ATTRIBUTES}
                 )
-                continue
-
-            # DYNAMIC RENDERING
-            tags_for_xml = apply_user_config_to_tags(
-                full_blueprint_tags, config
-            )
-
-            clear_ai_tags(track)
-
-            def ensure_list(value):
-                if isinstance(value, str):
-                    return [value]
-                if isinstance(value, list):
-                    return value
-                return []
-
-            # Update XML Element
-            primary_genre = ensure_list(tags_for_xml.get('primary_genre'))
-            sub_genre = ensure_list(tags_for_xml.get('sub_genre'))
-            new_genre_string = ", ".join(
-                g for g in primary_genre + sub_genre if g
-            )
-            track.set('Genre', new_genre_string if new_genre_string
-                      else track.get('Genre', ''))
-
-            # Format comments
-            tag_order_and_prefixes = {
-                'situation_environment': 'Sit',
-                'energy_vibe': 'Vibe',
-                'components': 'Comp',
-                'time_period': 'Time'
-            }
-            formatted_parts = []
-            energy_level = tags_for_xml.get('energy_level')
-            if isinstance(energy_level, int):
-                formatted_parts.append(f"E: {str(energy_level).zfill(2)}")
-            for key, prefix in tag_order_and_prefixes.items():
-                tags = ensure_list(tags_for_xml.get(key))
-                if tags:
-                    tag_string = ", ".join(
-                        [t.strip().capitalize() for t in tags if t]
-                    )
-                    if tag_string:
-                        formatted_parts.append(f"{prefix}: {tag_string}")
-            final_comments_content = ' / '.join(formatted_parts)
-            existing_comments = track.get('Comments', '').strip()
-            new_comments = (f"/* {final_comments_content} */"
-                            if final_comments_content else "")
-            track.set('Comments',
-                      f"{existing_comments} {new_comments}".strip())
-
-            # Set Colour
-            if track.get('Colour') != '0xFF0000':
-                energy_level = tags_for_xml.get('energy_level')
-                track_colour_hex, track_colour_name = None, None
-                if isinstance(energy_level, int):
-                    if energy_level >= 9:
-                        track_colour_hex = '0xFF007F'
-                        track_colour_name = "Pink"
-                    elif energy_level == 8:
-                        track_colour_hex = '0xFFA500'
-                        track_colour_name = "Orange"
-                    elif energy_level >= 6:
-                        track_colour_hex = '0xFFFF00'
-                        track_colour_name = "Yellow"
-                    elif energy_level >= 4:
-                        track_colour_hex = '0x00FF00'
-                        track_colour_name = "Green"
-                    else:
-                        track_colour_hex = '0x25FDE9'
-                        track_colour_name = "Aqua"
-                if track_colour_hex:
-                    track.set('Colour', track_colour_hex)
-                    track.set('Grouping', track_colour_name)
-                    print(f"Colour-coded track as {track_colour_name} "
-                          f"based on energy: {energy_level}/10")
-                else:
-                    if 'Colour' in track.attrib:
-                        del track.attrib['Colour']
-                    if 'Grouping' in track.attrib:
-                        del track.attrib['Grouping']
-
-            # Set Star Rating
-            energy_level = tags_for_xml.get('energy_level')
-            rating_value = (convert_energy_to_rating(energy_level)
-                            if energy_level is not None else 0)
-            track.set('Rating', str(rating_value))
-            print(f"Assigned star rating based on energy level: "
-                  f"{energy_level}/10 -> {rating_value}")
-
-            print(f"Updated XML for: {track_name}")
-
-            # Count tags written to XML
-            rendered_tags_set = set()
-            for category_value in tags_for_xml.values():
-                if isinstance(category_value, list):
-                    rendered_tags_set.update(
-                        t for t in category_value
-                        if isinstance(t, str) and t.strip()
-                    )
-                elif isinstance(category_value, str) and category_value.strip():
-                    rendered_tags_set.add(category_value.strip())
-            print(f"Wrote {len(rendered_tags_set)} tags to XML "
-                  f"for this track.")
 
             processed_count += 1
 
@@ -1028,21 +3658,26 @@ def process_library_task(log_id, input_path, output_path, config):
                 update_job_progress(log_id, index + 1, total_tracks)
             # -----------------------
 
-            # SAVE BLUEPRINT
-            insert_track_data(
-                track_name, artist, track.get('AverageBpm'),
-                track.get('Tonality'),
-                new_genre_string if new_genre_string
-                else track.get('Genre', ''),
-                track.get('Label'), track.get('Comments'),
-                track.get('Grouping'), full_blueprint_tags
+        # PASS 2: stream tracks through tag_track into the output file,
+        # updating the COLLECTION entries count and checkpointing on the way.
+        try:
+            stream_rewrite_collection(
+                input_path, partial_path, tag_track, entries=total_tracks,
+                resume=resume, checkpoint=save_checkpoint,
+                checkpoint_every=JOB_CHECKPOINT_INTERVAL, timings=xml_timings
             )
-
-        # Update COLLECTION entries count
-        collection.set('Entries', str(len(collection.findall('TRACK'))))
-
-        tree.write(output_path, encoding='UTF-8', xml_declaration=True)
+        finally:
+            writer.flush()
+
+        os.replace(partial_path, output_path)
+        report_xml_timings(log_id, xml_timings)
+        if library_key:
+            save_track_renders(library_key, new_renders,
+                               keep=set(fingerprints))
+        delete_job_checkpoint(log_id)
         log_job_end(log_id, 'Completed', total_tracks, output_path)
+        inc_metric("tag_genius_jobs_total",
+                   {"job_type": "tagging", "status": "Completed"})
         print(f"\nTagging process complete! {processed_count}/"
               f"{total_tracks} tracks processed. "
               f"New file saved at: {output_path}")
@@ -1051,10 +3686,584 @@ def process_library_task(log_id, input_path, output_path, config):
             "filePath": output_path
         }
 
+    except JobSupersededError as e:
+        # The newer run owns the job now; leave its status alone.
+        print(f"Stopping job {log_id}: {e}")
+        return {"error": str(e)}
     except Exception as e:
         log_job_end(log_id, 'Failed', 0, output_path)
+        inc_metric("tag_genius_jobs_total",
+                   {"job_type": "tagging", "status": "Failed"})
         print(f"FATAL error during tagging job {log_id}: {e}")
         return {"error": f"Failed to process XML: {str(e)}"}
+    finally:
+        flush_metrics()
+
+
+def dispatch_tag_chunks(log_id, run_id, input_path, output_path, config,
+                        total_tracks, fingerprints, stored_renders,
+                        library_key, xml_timings):
+    """Split a tagging job into chunk tasks and merge them when all finish.
+
+    Tracks that share a Name and Artist always land in the same chunk, so
+    no two chunks ask the AI about the same song. Tracks with a stored
+    render are left for the merge to apply.
+    """
+    chunks = []
+    key_chunks = {}
+    tracks = timed_iter(iter_collection_tracks(input_path), xml_timings,
+                        'parse')
+    for index, track in enumerate(tracks):
+        if stored_renders and fingerprints[index] in stored_renders:
+            continue
+        key = (track.get('Name'), track.get('Artist'))
+        if key not in key_chunks:
+            if not chunks or len(chunks[-1]) >= TAG_CHUNK_SIZE:
+                chunks.append([])
+            key_chunks[key] = len(chunks) - 1
+        attributes = {name: track.get(name)
+                      for name in CHUNK_TRACK_ATTRIBUTES
+                      if track.get(name) is not None}
+        chunks[key_chunks[key]].append([index, attributes])
+    del key_chunks
+
+    chunked_count = sum(len(chunk) for chunk in chunks)
+    update_job_progress(log_id, total_tracks - chunked_count, total_tracks)
+    merge = merge_tag_chunks_task.s(log_id, run_id, input_path, output_path,
+                                    config, total_tracks, library_key)
+    if chunks:
+        chord(group(
+            tag_chunk_task.s(log_id, run_id, chunk, config, total_tracks)
+            for chunk in chunks
+        ))(merge)
+    else:
+        merge.delay([])
+    report_xml_timings(log_id, xml_timings)
+    print(f"Dispatched {chunked_count}/{total_tracks} tracks of job {log_id} "
+          f"as {len(chunks)} chunk(s).")
+    return {
+        "message": f"Tagging dispatched in {len(chunks)} chunk(s).",
+        "chunks": len(chunks)
+    }
+
+
+@celery.task
+def tag_chunk_task(log_id, run_id, chunk, config, total_tracks):
+    """Celery task to tag one chunk of a chunked tagging job.
+
+    chunk is a list of [track index, TRACK attributes]. Returns the
+    rendered attributes of each track (None if it was left untouched) for
+    merge_tag_chunks_task to write into the output file. The run's
+    heartbeat is refreshed when the chunk starts and with every progress
+    report, and the chunk stops once another run has taken the job over.
+    """
+    try:
+        # A queued chunk may start long after dispatch; stop here if the
+        # job was resumed meanwhile, and show the job is alive otherwise.
+        save_job_checkpoint(log_id, run_id)
+        track_lookups = {}
+        for _, attributes in chunk:
+            key = (attributes.get('Name'), attributes.get('Artist'))
+            if key not in track_lookups:
+                track_lookups[key] = {
+                    'ARTIST': key[1],
+                    'TITLE': key[0],
+                    'GENRE': attributes.get('Genre'),
+                    'YEAR': attributes.get('Year')
+                }
+        blueprints = resolve_blueprints(
+            track_lookups,
+            on_saved=lambda: save_job_checkpoint(log_id, run_id)
+        )
+
+        renders = []
+        unreported = 0
+        writer = TrackDataWriter()
+        try:
+            for index, attributes in chunk:
+                track = ET.Element('TRACK', attributes)
+                track_name = track.get('Name')
+                artist = track.get('Artist')
+                print(f"\nProcessing track {index + 1}/{total_tracks}: "
+                      f"{artist} - {track_name}")
+                inc_metric("tag_genius_tracks_processed_total",
+                           {"job_type": "tagging"})
+                rendered = None
+                if tag_track_with_blueprint(
+                        track, blueprints[(track_name, artist)], config,
+                        writer):
+                    rendered = {name: track.get(name)
+                                for name in TRACK_RENDERED_ATTRIBUTES}
+                renders.append([index, rendered])
+
+                unreported += 1
+                if unreported >= 50:
+                    add_job_progress(log_id, run_id, unreported,
+                                     total_tracks)
+                    unreported = 0
+        finally:
+            writer.flush()
+        add_job_progress(log_id, run_id, unreported, total_tracks)
+        return {"renders": renders}
+
+    except JobSupersededError as e:
+        print(f"Stopping chunk of job {log_id}: {e}")
+        return {"error": str(e), "superseded": True}
+    except Exception as e:
+        print(f"FATAL error in a chunk of tagging job {log_id}: {e}")
+        return {"error": str(e)}
+    finally:
+        flush_metrics()
+
+
+@celery.task
+def merge_tag_chunks_task(chunk_results, log_id, run_id, input_path,
+                          output_path, config, total_tracks, library_key):
+    """Celery task to write a chunked tagging job's output file.
+
+    Streams the input library once, applying each chunk's renders by track
+    index and stored renders to the tracks no chunk was given.
+    """
+    try:
+        # Raises JobSupersededError if a newer run has taken the job over.
+        save_job_checkpoint(log_id, run_id)
+        if any(result.get('superseded') for result in chunk_results):
+            raise JobSupersededError(f"job {log_id} was taken over")
+        errors = [result['error'] for result in chunk_results
+                  if 'error' in result]
+        if errors:
+            raise RuntimeError(f"{len(errors)} chunk(s) failed: {errors[0]}")
+
+        rendered = {index: attributes for result in chunk_results
+                    for index, attributes in result['renders']}
+        del chunk_results
+        stored_renders = get_track_renders(library_key) if library_key else {}
+        new_renders = {}
+        fingerprints = set()
+
+        def apply_track(track, index):
+            fingerprint = (track_fingerprint(track, config)
+                           if library_key else None)
+            fingerprints.add(fingerprint)
+            if index in rendered:
+                if rendered[index]:
+                    if library_key:
+                        new_renders[fingerprint] = (
+                            track_lookup_key(track.get('Name'),
+                                             track.get('Artist')),
+                            rendered[index]
+                        )
+                    apply_rendered_attributes(track, rendered[index])
+            elif stored_renders:
+                stored = stored_renders.get(fingerprint)
+                if stored:
+                    apply_rendered_attributes(track, stored)
+
+        partial_path = f"{output_path}.{run_id}.part"
+        xml_timings = {'parse': 0.0, 'write': 0.0}
+        stream_rewrite_collection(input_path, partial_path, apply_track,
+                                  entries=total_tracks, timings=xml_timings)
+        os.replace(partial_path, output_path)
+        report_xml_timings(log_id, xml_timings)
+        if library_key:
+            save_track_renders(library_key, new_renders, keep=fingerprints)
+        delete_job_checkpoint(log_id)
+        log_job_end(log_id, 'Completed', total_tracks, output_path)
+        inc_metric("tag_genius_jobs_total",
+                   {"job_type": "tagging", "status": "Completed"})
+        print(f"\nChunked tagging job {log_id} complete! {total_tracks} "
+              f"tracks processed. New file saved at: {output_path}")
+        return {
+            "message": "Success! Your new library file is ready.",
+            "filePath": output_path
+        }
+
+    except JobSupersededError as e:
+        print(f"Stopping job {log_id}: {e}")
+        return {"error": str(e)}
+    except Exception as e:
+        log_job_end(log_id, 'Failed', 0, output_path)
+        inc_metric("tag_genius_jobs_total",
+                   {"job_type": "tagging", "status": "Failed"})
+        print(f"FATAL error merging tagging job {log_id}: {e}")
+        return {"error": f"Failed to process XML: {str(e)}"}
+    finally:
+        flush_metrics()
+
+
+@celery.task
+def rerender_library_task(log_id, input_path, output_path, config):
+    """Celery task to restyle a library from cached blueprints alone.
+
+    Never calls the AI and writes nothing to the database per track. The
+    blueprints of every unique track are fetched in bulk and rendered once
+    at the job's detail level, then applied as the library streams
+    through. Tracks without a cached blueprint are copied unchanged.
+    """
+    if not log_id:
+        return {"error": "Failed to initialize logging for the job."}
+
+    try:
+        # PASS 1: count tracks and collect the unique lookups
+        xml_timings = {'parse': 0.0, 'write': 0.0}
+        total_tracks = 0
+        keys = set()
+        for track in timed_iter(iter_collection_tracks(input_path),
+                                xml_timings, 'parse'):
+            total_tracks += 1
+            keys.add((track.get('Name'), track.get('Artist')))
+
+        renders = {}
+        for key, blueprint in get_track_blueprints(keys).items():
+            if blueprint.get('primary_genre'):
+                renders[key] = render_tag_attributes(
+                    apply_user_config_to_tags(blueprint, config)
+                )
+        print(f"Re-rendering {total_tracks} tracks: {len(renders)}/"
+              f"{len(keys)} unique tracks have a cached blueprint.")
+        del keys
+
+        rendered_count = 0
+
+        def rerender_track(track, index):
+            nonlocal rendered_count
+            rendered = renders.get((track.get('Name'), track.get('Artist')))
+            if rendered:
+                apply_rendered_attributes(track,
+                                          merge_track_render(track, rendered))
+                rendered_count += 1
+            if (index + 1) % 1000 == 0:
+                update_job_progress(log_id, index + 1, total_tracks)
+
+        # PASS 2: stream every track through rerender_track
+        partial_path = f"{output_path}.part"
+        stream_rewrite_collection(input_path, partial_path, rerender_track,
+                                  entries=total_tracks, timings=xml_timings)
+        os.replace(partial_path, output_path)
+        report_xml_timings(log_id, xml_timings)
+
+        update_job_progress(log_id, total_tracks, total_tracks)
+        log_job_end(log_id, 'Completed', total_tracks, output_path)
+        inc_metric("tag_genius_tracks_processed_total",
+                   {"job_type": "tagging"}, rendered_count)
+        inc_metric("tag_genius_jobs_total",
+                   {"job_type": "tagging", "status": "Completed"})
+        print(f"\nRe-render complete! {rendered_count}/{total_tracks} "
+              f"tracks restyled, {total_tracks - rendered_count} without a "
+              f"cached blueprint left as they were. "
+              f"New file saved at: {output_path}")
+        return {
+            "message": "Success! Your new library file is ready.",
+            "filePath": output_path
+        }
+
+    except Exception as e:
+        log_job_end(log_id, 'Failed', 0, output_path)
+        inc_metric("tag_genius_jobs_total",
+                   {"job_type": "tagging", "status": "Failed"})
+        print(f"FATAL error during re-render job {log_id}: {e}")
+        return {"error": f"Failed to process XML: {str(e)}"}
+    finally:
+        flush_metrics()
+
+
+def is_rerender_job(config):
+    """True if a tagging config asks to restyle from cached blueprints."""
+    return bool(config.get('rerender')) and config.get('level') != 'Clear'
+
+
+def tagging_task_for(config):
+    """Return the Celery task that runs a tagging job with this config."""
+    if is_rerender_job(config):
+        return rerender_library_task
+    return process_library_task
+
+
+# --- UPLOAD STREAMING ---
+
+class UploadStream(io.RawIOBase):
+    """Read an uploaded library straight from the request stream.
+
+    multipart/form-data bodies are decoded chunk by chunk and only the
+    'file' part is returned by read(); any other body is read as the XML
+    itself, named by the 'filename' query argument. Nothing is buffered
+    whole or spooled by Werkzeug. Form fields are collected in fields;
+    call finish() after reading the file to pick up fields sent after it.
+    Raises RequestEntityTooLarge once more than MAX_UPLOAD_MB is read.
+    """
+
+    def __init__(self, req):
+        super().__init__()
+        self.source = req.stream
+        self.received = 0
+        self.fields = {}
+        self.filename = None
+        self.part = None
+        self.field_chunks = []
+        self.file_done = False
+        self.source_done = False
+        self.ended = False
+        self.pending = memoryview(b'')
+        if req.mimetype == 'multipart/form-data':
+            boundary = req.mimetype_params.get('boundary')
+            if not boundary:
+                raise ValueError("Multipart upload has no boundary")
+            self.decoder = MultipartDecoder(
+                boundary.encode('latin-1'),
+                max_form_memory_size=UPLOAD_MAX_FIELD_BYTES
+            )
+        else:
+            self.decoder = None
+            self.filename = req.args.get('filename', 'library.xml')
+
+    def readable(self):
+        return True
+
+    def read_source(self):
+        """Read the next chunk of the request body."""
+        chunk = self.source.read(UPLOAD_CHUNK_BYTES)
+        self.received += len(chunk)
+        if self.received > MAX_UPLOAD_MB * 1024 * 1024:
+            raise RequestEntityTooLarge()
+        return chunk
+
+    def pump(self):
+        """Handle one multipart event and return any file data it held."""
+        event = self.decoder.next_event()
+        if isinstance(event, NeedData):
+            if self.source_done:
+                raise ValueError("Upload ended before the multipart body "
+                                 "was complete")
+            chunk = self.read_source()
+            self.decoder.receive_data(chunk or None)
+            self.source_done = not chunk
+        elif isinstance(event, File) and event.name == 'file' and \
+                self.filename is None:
+            self.part = 'file'
+            self.filename = event.filename
+        elif isinstance(event, (Field, File)):
+            self.part = event.name if isinstance(event, Field) else None
+            self.field_chunks = []
+        elif isinstance(event, Data):
+            if self.part == 'file':
+                self.file_done = not event.more_data
+                return event.data
+            if self.part is not None:
+                self.field_chunks.append(event.data)
+                if not event.more_data:
+                    self.fields[self.part] = b''.join(
+                        self.field_chunks).decode('utf-8', 'replace')
+        elif isinstance(event, Epilogue):
+            self.ended = True
+        return None
+
+    def find_file(self):
+        """Read up to the start of the file part and return its filename.
+
+        Returns None if the upload has no 'file' part.
+        """
+        while self.decoder is not None and self.filename is None and \
+                not self.ended:
+            self.pump()
+        return self.filename
+
+    def next_chunk(self):
+        """Return the next chunk of file data, or b'' at its end."""
+        if self.decoder is None:
+            return self.read_source()
+        self.find_file()
+        while self.filename is not None and not self.file_done and \
+                not self.ended:
+            data = self.pump()
+            if data:
+                return data
+        return b''
+
+    def readinto(self, buffer):
+        if not self.pending:
+            self.pending = memoryview(self.next_chunk())
+        count = min(len(buffer), len(self.pending))
+        buffer[:count] = self.pending[:count]
+        self.pending = self.pending[count:]
+        return count
+
+    def finish(self):
+        """Read the rest of the body so fields after the file are known."""
+        while self.decoder is not None and not self.ended:
+            self.pump()
+
+
+def count_cached_lookup_keys(lookup_keys):
+    """Return how many of the given lookup keys have a cached blueprint."""
+    if not lookup_keys:
+        return 0
+    try:
+        with db_cursor() as cursor:
+            return cursor.execute(
+                f"SELECT COUNT(DISTINCT lookup_key) FROM tracks "
+                f"WHERE tags_json IS NOT NULL AND lookup_key IN "
+                f"({', '.join(['?'] * len(lookup_keys))})",
+                lookup_keys
+            ).fetchone()[0]
+    except sqlite3.Error as e:
+        print(f"Error counting cached blueprints: {e}")
+        return 0
+
+
+def analyze_library_stream(source):
+    """Count a library's tracks in one streaming pass.
+
+    Returns total, untagged, duplicate and unique track counts, and
+    estimates how many unique tracks the blueprint cache already answers
+    and how many would need an AI call. The parse tree stays flat; only
+    an 8-byte digest per distinct track is kept to spot duplicates.
+    """
+    total_tracks = 0
+    untagged_count = 0
+    duplicate_count = 0
+    cached_count = 0
+    seen = set()
+    unchecked = []
+    for track in iter_collection_tracks(source):
+        total_tracks += 1
+        if not track.get('Genre', '').strip():
+            untagged_count += 1
+        lookup_key = track_lookup_key(track.get('Name'), track.get('Artist'))
+        digest = hashlib.blake2b(lookup_key.encode('utf-8'),
+                                 digest_size=8).digest()
+        if digest in seen:
+            duplicate_count += 1
+            continue
+        seen.add(digest)
+        unchecked.append(lookup_key)
+        if len(unchecked) >= 500:
+            cached_count += count_cached_lookup_keys(unchecked)
+            unchecked = []
+    cached_count += count_cached_lookup_keys(unchecked)
+
+    unique_tracks = total_tracks - duplicate_count
+    return {
+        "total_tracks": total_tracks,
+        "untagged_count": untagged_count,
+        "duplicate_count": duplicate_count,
+        "unique_tracks": unique_tracks,
+        "estimated_cache_hits": cached_count,
+        "estimated_ai_calls": unique_tracks - cached_count
+    }
+
+
+# --- JOB ARCHIVES ---
+
+class ArchiveBuffer:
+    """Write-only file that ZipFile streams into.
+
+    Every write goes to the open cache file and is held in pending until the
+    response generator drains it, so at most one chunk's worth of compressed
+    output is in memory at a time.
+    """
+
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self.pending = []
+
+    def write(self, data):
+        data = bytes(data)
+        self.cache_file.write(data)
+        self.pending.append(data)
+        return len(data)
+
+    def flush(self):
+        self.cache_file.flush()
+
+    def drain(self):
+        data = b''.join(self.pending)
+        self.pending.clear()
+        return data
+
+
+def archive_cache_path(job_id, members):
+    """Returns where the archive of members is cached as the files are now.
+
+    The name hashes each file's path, size and modification time with the
+    compression level, so changing either file or the level misses the cache.
+    """
+    digest = hashlib.sha1(str(ARCHIVE_COMPRESSION_LEVEL).encode('utf-8'))
+    for path, arcname in members:
+        stat = os.stat(path)
+        digest.update(f"\0{path}\0{arcname}\0{stat.st_size}\0"
+                      f"{stat.st_mtime_ns}".encode('utf-8'))
+    return os.path.abspath(os.path.join(
+        ARCHIVE_CACHE_DIR, f"job_{job_id}_{digest.hexdigest()[:16]}.zip"))
+
+
+def remove_stale_archives(job_id, keep_path):
+    """Deletes cached archives of a job other than keep_path."""
+    prefix = f"job_{job_id}_"
+    for name in os.listdir(ARCHIVE_CACHE_DIR):
+        path = os.path.abspath(os.path.join(ARCHIVE_CACHE_DIR, name))
+        if (name.startswith(prefix) and name.endswith(".zip") and
+                path != keep_path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"Could not remove stale archive {path}: {e}")
+
+
+def stream_job_archive(job_id, members, cache_path):
+    """Yields a zip of members chunk by chunk and caches the finished archive.
+
+    Each file is read and compressed ARCHIVE_CHUNK_BYTES at a time. The same
+    bytes go to a temporary file beside cache_path, which is renamed into
+    place only when the archive is complete and neither file changed while it
+    was written. A download abandoned part way leaves no cache entry.
+    """
+    os.makedirs(ARCHIVE_CACHE_DIR, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=ARCHIVE_CACHE_DIR, suffix=".part")
+    if ARCHIVE_COMPRESSION_LEVEL:
+        compression, level = zipfile.ZIP_DEFLATED, ARCHIVE_COMPRESSION_LEVEL
+    else:
+        compression, level = zipfile.ZIP_STORED, None
+    cached = False
+    try:
+        with os.fdopen(fd, 'wb') as cache_file:
+            buffer = ArchiveBuffer(cache_file)
+            with zipfile.ZipFile(buffer, 'w', compression,
+                                 compresslevel=level) as zf:
+                for path, arcname in members:
+                    force_zip64 = os.path.getsize(path) >= zipfile.ZIP64_LIMIT
+                    with open(path, 'rb') as source, \
+                            zf.open(arcname, 'w',
+                                    force_zip64=force_zip64) as member:
+                        while chunk := source.read(ARCHIVE_CHUNK_BYTES):
+                            member.write(chunk)
+                            if buffer.pending:
+                                yield buffer.drain()
+            yield buffer.drain()
+
+        try:
+            unchanged = archive_cache_path(job_id, members) == cache_path
+        except OSError:
+            unchanged = False
+        if unchanged:
+            os.replace(temp_path, cache_path)
+            cached = True
+            remove_stale_archives(job_id, cache_path)
+            print(f"Cached archive for job {job_id} at {cache_path}")
+        else:
+            print(f"Files for job {job_id} changed while zipping; "
+                  f"archive not cached.")
+    finally:
+        if not cached and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def attachment_disposition(filename):
+    """Builds a Content-Disposition header value for a download name."""
+    options = {'filename': unicodedata.normalize('NFKD', filename).encode(
+        'ascii', 'ignore').decode('ascii')}
+    if options['filename'] != filename:
+        options['filename*'] = f"UTF-8''{quote(filename, safe='')}"
+    return dump_options_header('attachment', options)
 
 
 # --- FLASK ROUTES ---
@@ -1067,14 +4276,39 @@ def hello_ai():
 
 @app.route('/upload_library', methods=['POST'])
 def upload_library():
-    """Handle XML upload and dispatch correct background task."""
-    if 'file' not in request.files:
+    """Handle XML upload and dispatch correct background task.
+
+    The upload is streamed to a temporary file in chunks, then moved into
+    place once the job's config is known.
+    """
+    os.makedirs("uploads", exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir="uploads", suffix=".part")
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            upload = UploadStream(request)
+            shutil.copyfileobj(upload, temp_file, UPLOAD_CHUNK_BYTES)
+            upload.finish()
+        return start_uploaded_job(upload, temp_path)
+    except RequestEntityTooLarge:
+        return jsonify({
+            "error": f"File is larger than the {MAX_UPLOAD_MB} MB limit."
+        }), 413
+    except ValueError as e:
+        print(f"Malformed upload: {e}")
+        return jsonify({"error": f"Malformed upload: {e}"}), 400
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def start_uploaded_job(upload, temp_path):
+    """Move a streamed upload into place and dispatch its job."""
+    if upload.filename is None:
         return jsonify({"error": "No file part"}), 400
-    file = request.files['file']
-    if not file or file.filename == '':
+    if upload.filename == '':
         return jsonify({"error": "No selected file"}), 400
 
-    config_str = request.form.get('config')
+    config_str = upload.fields.get('config')
     if not config_str:
         return jsonify({"error": "No config provided"}), 400
     try:
@@ -1085,9 +4319,9 @@ def upload_library():
         print(f"Invalid config received: {config_str}, Error: {e}")
         return jsonify({"error": f"Invalid config format: {e}"}), 400
 
-    if file:
+    if upload:
         try:
-            original_filename = file.filename
+            original_filename = upload.filename
             name, ext = os.path.splitext(original_filename)
 
             now = datetime.now()
@@ -1101,8 +4335,7 @@ def upload_library():
 
                 input_path = os.path.join(job_folder_path,
                                           "original_library.xml")
-                file.seek(0)
-                file.save(input_path)
+                shutil.move(temp_path, input_path)
 
                 human_readable_time = now.strftime("%b %d, %I:%M %p")
                 job_display_name = (f"{name} - Split Job "
@@ -1138,11 +4371,12 @@ def upload_library():
                 output_path = os.path.join(output_folder,
                                            unique_output_filename)
 
-                file.seek(0)
-                file.save(input_path)
+                shutil.move(temp_path, input_path)
 
                 human_readable_time = now.strftime("%b %d, %I:%M %p")
-                job_display_name = (f"{name} - Tagging Job "
+                job_kind = ("Re-render" if is_rerender_job(config)
+                            else "Tagging")
+                job_display_name = (f"{name} - {job_kind} Job "
                                     f"({selected_mode}) "
                                     f"({human_readable_time})")
 
@@ -1153,8 +4387,8 @@ def upload_library():
                         "error": "Failed to create a job log entry."
                     }), 500
 
-                process_library_task.delay(log_id, input_path,
-                                           output_path, config)
+                tagging_task_for(config).delay(log_id, input_path,
+                                               output_path, config)
 
                 print(f"Tagging job dispatched with ID {log_id} "
                       f"for {original_filename}.")
@@ -1167,7 +4401,7 @@ def upload_library():
 
         except Exception as e:
             print(f"Error during file save or task dispatch "
-                  f"for {file.filename}: {e}")
+                  f"for {upload.filename}: {e}")
             return jsonify({
                 "error": "Failed to save file or start processing task."
             }), 500
@@ -1177,49 +4411,54 @@ def upload_library():
 
 @app.route('/analyze_library', methods=['POST'])
 def analyze_library():
-    """Scan uploaded XML to count tracks missing genre tag."""
-    if 'file' not in request.files:
+    """Scan uploaded XML for untagged, duplicate and cached tracks.
+
+    The XML is parsed as it arrives from the request stream, so large
+    libraries are analysed in flat memory without being saved.
+    """
+    try:
+        upload = UploadStream(request)
+        filename = upload.find_file()
+    except RequestEntityTooLarge:
+        return jsonify({
+            "error": f"File is larger than the {MAX_UPLOAD_MB} MB limit."
+        }), 413
+    except ValueError as e:
+        print(f"Malformed upload in analyze_library: {e}")
+        return jsonify({"error": f"Malformed upload: {e}"}), 400
+    if filename is None:
         return jsonify({"error": "No file part"}), 400
-    file = request.files['file']
-    if not file or file.filename == '':
+    if filename == '':
         return jsonify({"error": "No selected file"}), 400
 
-    if file:
+    if upload:
         try:
-            file.seek(0)
-            tree = ET.parse(file)
-            root = tree.getroot()
-            collection = root.find('COLLECTION')
-            if collection is None:
-                raise ValueError("COLLECTION element not found.")
-            tracks = collection.findall('TRACK')
-
-            untagged_count = 0
-            for track in tracks:
-                genre_str = track.get('Genre', '').strip()
-                if not genre_str:
-                    untagged_count += 1
-
-            file.seek(0)
-            print(f"Analyzed {file.filename}: "
-                  f"Found {untagged_count} untagged tracks.")
-            return jsonify({"untagged_count": untagged_count}), 200
-
+            counts = analyze_library_stream(upload)
+            print(f"Analyzed {filename}: Found {counts['untagged_count']} "
+                  f"untagged tracks, {counts['duplicate_count']} duplicates "
+                  f"and {counts['estimated_cache_hits']} cached blueprints "
+                  f"in {counts['total_tracks']} tracks.")
+            return jsonify(counts), 200
+
+        except RequestEntityTooLarge:
+            return jsonify({
+                "error": f"File is larger than the {MAX_UPLOAD_MB} MB limit."
+            }), 413
         except ET.ParseError as e:
             print(f"XML Parse Error in analyze_library "
-                  f"for {file.filename}: {e}")
+                  f"for {filename}: {e}")
             return jsonify({
                 "error": "Failed to parse XML: Invalid format"
             }), 400
         except ValueError as e:
             print(f"XML Structure Error in analyze_library "
-                  f"for {file.filename}: {e}")
+                  f"for {filename}: {e}")
             return jsonify({
                 "error": f"Invalid XML Structure: {e}"
             }), 400
         except Exception as e:
             print(f"Unexpected error in analyze_library "
-                  f"for {file.filename}: {e}")
+                  f"for {filename}: {e}")
             return jsonify({
                 "error": "An unexpected error occurred during analysis."
             }), 500
@@ -1262,7 +4501,8 @@ def tag_split_file():
 
         human_readable_time = now.strftime("%b %d, %I:%M %p")
         detail_level = config.get('level', 'Unknown')
-        job_display_name = (f"{name} - Tagging Job ({detail_level}) "
+        job_kind = "Re-render" if is_rerender_job(config) else "Tagging"
+        job_display_name = (f"{name} - {job_kind} Job ({detail_level}) "
                             f"({human_readable_time})")
 
         log_id = log_job_start(original_filename, input_path,
@@ -1272,7 +4512,8 @@ def tag_split_file():
                 "error": "Failed to create a job log entry."
             }), 500
 
-        process_library_task.delay(log_id, input_path, output_path, config)
+        tagging_task_for(config).delay(log_id, input_path, output_path,
+                                       config)
 
         print(f"Tagging job for split file dispatched with ID {log_id}.")
 
@@ -1334,7 +4575,7 @@ def download_split_file():
 
 @app.route('/download_job/<int:job_id>', methods=['GET'])
 def download_job_package(job_id):
-    """Zip job files and send archive for download."""
+    """Stream a zip of the job files, or send its cached copy."""
     input_path, output_path = None, None
     original_filename = f"job_{job_id}_files"
     try:
@@ -1363,22 +4604,25 @@ def download_job_package(job_id):
                 "error": f"Tagged output file missing for job {job_id}."
             }), 404
 
-        memory_file = io.BytesIO()
-        with zipfile.ZipFile(memory_file, 'w',
-                             zipfile.ZIP_DEFLATED) as zf:
-            zf.write(input_path,
-                     arcname=f'original_{os.path.basename(input_path)}')
-            zf.write(output_path,
-                     arcname=f'tagged_{os.path.basename(output_path)}')
-        memory_file.seek(0)
-
-        print(f"Prepared archive for job {job_id}")
-        return send_file(
-            memory_file,
+        members = [
+            (input_path, f'original_{os.path.basename(input_path)}'),
+            (output_path, f'tagged_{os.path.basename(output_path)}')
+        ]
+        download_name = (f'tag_genius_job_{job_id}_'
+                         f'{original_filename}_archive.zip')
+        cache_path = archive_cache_path(job_id, members)
+
+        if os.path.isfile(cache_path):
+            print(f"Serving cached archive for job {job_id}")
+            return send_file(cache_path, mimetype='application/zip',
+                             as_attachment=True, download_name=download_name)
+
+        print(f"Streaming archive for job {job_id}")
+        return Response(
+            stream_job_archive(job_id, members, cache_path),
             mimetype='application/zip',
-            as_attachment=True,
-            download_name=(f'tag_genius_job_{job_id}_'
-                           f'{original_filename}_archive.zip')
+            headers={'Content-Disposition':
+                     attachment_disposition(download_name)}
         )
     except sqlite3.Error as e:
         print(f"Database error finding job {job_id}: {e}")
@@ -1437,19 +4681,113 @@ def export_xml():
 
 @app.route('/history', methods=['GET'])
 def get_history():
-    """Retrieve log of all past jobs."""
+    """Retrieve a page of past jobs, newest first.
+
+    Query parameters: limit (default HISTORY_PAGE_SIZE), cursor (the
+    next_cursor of the previous page), status, job_type and fields (a
+    comma-separated column list; result_data is only returned when
+    requested here). The resumable field tells whether /resume_job can
+    pick the job up from a checkpoint.
+    """
+    try:
+        limit = int(request.args.get('limit', HISTORY_PAGE_SIZE))
+        cursor_param = request.args.get('cursor')
+        cursor_id = int(cursor_param) if cursor_param else None
+        if not 1 <= limit <= HISTORY_MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and "
+                             f"{HISTORY_MAX_PAGE_SIZE}")
+    except ValueError as e:
+        return jsonify({"error": f"Invalid pagination parameters: {e}"}), 400
+
+    fields_param = request.args.get('fields')
+    if fields_param:
+        fields = [f.strip() for f in fields_param.split(',') if f.strip()]
+        unknown = set(fields) - set(HISTORY_FIELDS)
+        if unknown:
+            return jsonify({
+                "error": f"Unknown fields: {', '.join(sorted(unknown))}"
+            }), 400
+        if 'id' not in fields:
+            fields.insert(0, 'id')
+    else:
+        fields = [f for f in HISTORY_FIELDS if f != 'result_data']
+
+    conditions, params = [], []
+    for column in ('status', 'job_type'):
+        value = request.args.get(column)
+        if value:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    if cursor_id is not None:
+        conditions.append("id < ?")
+        params.append(cursor_id)
+    where_clause = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+
+    columns = ', '.join(HISTORY_COMPUTED_FIELDS.get(f, f) for f in fields)
+
     try:
         with db_cursor() as cursor:
             logs = cursor.execute(
-                "SELECT * FROM processing_log ORDER BY timestamp DESC"
+                f"SELECT {columns} FROM processing_log "
+                f"{where_clause}ORDER BY id DESC LIMIT ?",
+                params + [limit + 1]
             ).fetchall()
-        history_list = [dict(row) for row in logs]
-        return jsonify(history_list)
+        history_list = [dict(row) for row in logs[:limit]]
+        if 'resumable' in fields:
+            for job in history_list:
+                job['resumable'] = bool(job['resumable'])
+        next_cursor = (history_list[-1]['id']
+                       if len(logs) > limit else None)
+        return jsonify({"jobs": history_list, "next_cursor": next_cursor})
     except sqlite3.Error as e:
         print(f"Database error in get_history: {e}")
         return jsonify({"error": "Failed to retrieve job history"}), 500
 
 
+@app.route('/tracks/search', methods=['GET'])
+def search_tracks_route():
+    """Search saved tracks by tag, genre, BPM and text, newest first.
+
+    Query parameters: tags (comma-separated), match ("all", the default,
+    or "any"), genre, bpm (a range such as 120-126, or one value), q
+    (words matched against name, artist, label and comments), limit
+    (default TRACK_SEARCH_PAGE_SIZE) and cursor (the next_cursor of the
+    previous page).
+    """
+    try:
+        limit = int(request.args.get('limit', TRACK_SEARCH_PAGE_SIZE))
+        cursor_param = request.args.get('cursor')
+        cursor_id = int(cursor_param) if cursor_param else None
+        if not 1 <= limit <= TRACK_SEARCH_MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and "
+                             f"{TRACK_SEARCH_MAX_PAGE_SIZE}")
+        match = request.args.get('match', 'all').lower()
+        if match not in ('all', 'any'):
+            raise ValueError("match must be 'all' or 'any'")
+        bpm_param = request.args.get('bpm', '').strip()
+        bpm_range = None
+        if bpm_param:
+            low, _, high = bpm_param.partition('-')
+            bpm_range = (float(low), float(high or low))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid search parameters: {e}"}), 400
+
+    tag_names = [t.strip() for t in request.args.get('tags', '').split(',')
+                 if t.strip()]
+    try:
+        with db_cursor() as cursor:
+            tracks, next_cursor = search_tracks(
+                cursor, tag_names, match_all=match == 'all',
+                genre=request.args.get('genre'), bpm_range=bpm_range,
+                text=request.args.get('q'), limit=limit,
+                before_id=cursor_id
+            )
+        return jsonify({"tracks": tracks, "next_cursor": next_cursor})
+    except sqlite3.Error as e:
+        print(f"Database error in search_tracks: {e}")
+        return jsonify({"error": "Failed to search tracks"}), 500
+
+
 @app.route('/log_action', methods=['POST'])
 def log_action():
     """Receive and log action description from frontend."""
@@ -1500,6 +4838,109 @@ def get_actions():
             "error": "Failed to retrieve actions due to database error"
         }), 500
 
+@app.route('/job_status/<int:job_id>', methods=['GET'])
+def job_status(job_id):
+    """Return the status and progress of a single job."""
+    try:
+        job = get_job_status(job_id)
+    except sqlite3.Error as e:
+        print(f"Database error in job_status for job {job_id}: {e}")
+        return jsonify({"error": "Failed to retrieve job status"}), 500
+    if not job:
+        return jsonify({"error": f"Job ID {job_id} not found"}), 404
+    return jsonify(job)
+
+
+@app.route('/job_events/<int:job_id>', methods=['GET'])
+def job_events(job_id):
+    """Stream a job's status as server-sent events until it finishes.
+
+    The job's row is re-read by primary key every JOB_EVENTS_POLL_SECONDS
+    and an event is sent whenever the status or progress changes. A
+    stream lasts at most JOB_EVENTS_MAX_SECONDS, so it never holds a
+    worker for long; EventSource reconnects and gets the current status
+    straight away.
+    """
+    try:
+        if not get_job_status(job_id):
+            return jsonify({"error": f"Job ID {job_id} not found"}), 404
+    except sqlite3.Error as e:
+        print(f"Database error in job_events for job {job_id}: {e}")
+        return jsonify({"error": "Failed to retrieve job status"}), 500
+
+    def generate():
+        yield f"retry: {JOB_EVENTS_RETRY_MS}\n\n"
+        last_payload = None
+        last_sent = started = time.monotonic()
+        while time.monotonic() - started < JOB_EVENTS_MAX_SECONDS:
+            try:
+                job = get_job_status(job_id)
+            except sqlite3.Error as e:
+                print(f"Database error streaming job {job_id}: {e}")
+                job = None
+            if not job:
+                yield "event: error\ndata: {}\n\n"
+                return
+
+            payload = json.dumps(job)
+            if payload != last_payload:
+                yield f"data: {payload}\n\n"
+                last_payload = payload
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= JOB_EVENTS_HEARTBEAT_SECONDS:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+
+            if job['status'] in ('Completed', 'Failed'):
+                return
+            time.sleep(JOB_EVENTS_POLL_SECONDS)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/resume_job/<int:job_id>', methods=['POST'])
+def resume_job_route(job_id):
+    """Resume a failed or stalled tagging job from its last checkpoint."""
+    job = get_job_status(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if job['job_type'] != 'tagging' or job['status'] == 'Completed':
+        return jsonify({
+            "error": "Only unfinished tagging jobs can be resumed."
+        }), 400
+
+    try:
+        checkpoint = resume_job(
+            job_id, require_stale=(job['status'] == 'In Progress')
+        )
+    except Exception as e:
+        print(f"Error resuming job {job_id}: {e}")
+        return jsonify({"error": "Failed to resume job."}), 500
+    if not checkpoint:
+        return jsonify({
+            "error": "Job has no checkpoint or is still running."
+        }), 409
+
+    return jsonify({
+        "message": f"Job {job_id} resumed.",
+        "job_id": job_id,
+        "resume_from_track": checkpoint['track_index']
+    }), 202
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose metrics from every process in Prometheus text format."""
+    samples = read_metric_values()
+    samples.update(read_metric_gauges())
+    return Response(render_metrics(samples),
+                    mimetype='text/plain; version=0.0.4')
+
+
 # Serve HTML pages
 @app.route('/app')
 def serve_index():
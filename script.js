@@ -213,13 +213,8 @@ document.addEventListener('DOMContentLoaded', () => {
             console.error('Failed to cancel job:', error);
         }
 
-        // Clear polling intervals
-        if (window.pollingIntervalId) {
-            clearInterval(window.pollingIntervalId);
-        }
-        if (window.splitPollingIntervalId) {
-            clearInterval(window.splitPollingIntervalId);
-        }
+        // Stop job status updates
+        stopWatchingJob();
 
         // Reset state
         currentJobId = null;
@@ -350,174 +345,209 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
-    // --- 6. POLLING FUNCTIONS ---
+    // --- 6. JOB STATUS FUNCTIONS ---
+
+    function stopWatchingJob() {
+        if (window.jobEventSource) {
+            window.jobEventSource.close();
+            window.jobEventSource = null;
+        }
+        if (window.pollingIntervalId) {
+            clearInterval(window.pollingIntervalId);
+            window.pollingIntervalId = null;
+        }
+    }
+
+    // Follow one job via server-sent events, falling back to polling
+    // /job_status if the stream is unavailable.
+    function watchJob(jobId, onUpdate, onTimeout, onError) {
+        const POLL_INTERVAL_MS = 5000;
+        const MAX_POLLS = 120;
+        stopWatchingJob();
+
+        const isFinished = (job) => job.status === 'Completed' || job.status === 'Failed';
+
+        const startPolling = () => {
+            let pollAttempts = 0;
+            window.pollingIntervalId = setInterval(async () => {
+                if (pollAttempts++ > MAX_POLLS) {
+                    stopWatchingJob();
+                    onTimeout(MAX_POLLS);
+                    return;
+                }
+
+                try {
+                    const response = await fetch(`${API_BASE_URL}/job_status/${jobId}`);
+                    if (!response.ok) throw new Error('Failed to fetch job status');
+                    const job = await response.json();
+                    if (isFinished(job)) stopWatchingJob();
+                    onUpdate(job);
+                } catch (error) {
+                    stopWatchingJob();
+                    onError(error);
+                }
+            }, POLL_INTERVAL_MS);
+        };
+
+        if (!window.EventSource) {
+            startPolling();
+            return;
+        }
+
+        const source = new EventSource(`${API_BASE_URL}/job_events/${jobId}`);
+        window.jobEventSource = source;
+        // The server ends each stream after a short while and EventSource
+        // reconnects on its own; only repeated failures mean it is down.
+        let failedConnects = 0;
+        source.onopen = () => { failedConnects = 0; };
+        source.onmessage = (event) => {
+            const job = JSON.parse(event.data);
+            if (isFinished(job)) stopWatchingJob();
+            onUpdate(job);
+        };
+        source.onerror = () => {
+            if (window.jobEventSource !== source) return;
+            if (source.readyState === EventSource.CONNECTING && ++failedConnects < 3) return;
+            console.warn('Job event stream unavailable, falling back to polling.');
+            stopWatchingJob();
+            startPolling();
+        };
+    }
 
     function pollJobStatus(jobIdToTrack, options = {}) {
         const { isClearJob = false } = options;
-        let pollAttempts = 0;
-        const MAX_POLLS = 120;
 
-        if (window.pollingIntervalId) clearInterval(window.pollingIntervalId);
+        const handleUpdate = (currentJob) => {
+            const jobName = currentJob.job_display_name;
+            const trackCount = currentJob.track_count || 0;
 
-        window.pollingIntervalId = setInterval(async () => {
-            if (pollAttempts++ > MAX_POLLS) {
-                clearInterval(window.pollingIntervalId);
-                isProcessingJob = false;
-                hideStatus();
-                if (statusText) statusText.textContent = "Job timed out after 10 minutes. Please check server.";
-                if (statusPanel) statusPanel.classList.remove('hidden');
-                logAction(`Job ${jobIdToTrack} timed out after ${MAX_POLLS} polling attempts.`);
-                return;
+            // Update progress container text
+            if (statusTextProgress) {
+                statusTextProgress.textContent = `Processing ${jobName}...`;
+            }
+
+            // Update state indicator
+            if (statusState) {
+                statusState.textContent = currentJob.status;
             }
 
-            try {
-                const response = await fetch(`${API_BASE_URL}/history`);
-                if (!response.ok) throw new Error('Failed to fetch history');
-                const history = await response.json();
-                const currentJob = history.find(job => job.id === jobIdToTrack);
-
-                if (currentJob) {
-                    const jobName = currentJob.job_display_name;
-                    const trackCount = currentJob.track_count || 0;
-
-                    // Update progress container text
-                    if (statusTextProgress) {
-                        statusTextProgress.textContent = `Processing ${jobName}...`;
-                    }
-
-                    // Update state indicator
-                    if (statusState) {
-                        statusState.textContent = currentJob.status;
-                    }
-
-                    // --- NEW PROGRESS CALCULATION LOGIC ---
-                    let current = 0;
-                    let total = 0;
-                    let percent = 0;
-
-                    if (currentJob.result_data) {
-                        try {
-                            const progressData = JSON.parse(currentJob.result_data);
-                            if (progressData.current && progressData.total) {
-                                current = progressData.current;
-                                total = progressData.total;
-                                percent = Math.round((current / total) * 100);
-                            }
-                        } catch (e) {
-                            console.warn('Progress data parse error', e);
-                        }
-                    }
-
-                    // Update progress text
-                    if (progressCount) {
-                        if (total > 0) {
-                            progressCount.textContent = `Processing: ${current} / ${total} tracks (${percent}%)`;
-                        } else if (trackCount > 0) {
-                            progressCount.textContent = `${trackCount} tracks processed`;
-                        } else {
-                            progressCount.textContent = 'Initializing...';
-                        }
-                    }
-
-                    // Update progress bar width
-                    if (progressBar) {
-                        progressBar.style.width = total > 0 ? `${percent}%` : '5%';
-                        progressBar.style.transition = 'width 0.5s ease-in-out';
-                    }
-                    // --------------------------------------
-
-                    if (currentJob.status === 'Completed' || currentJob.status === 'Failed') {
-                        clearInterval(window.pollingIntervalId);
-                        isProcessingJob = false;
-
-                        if (currentJob.status === 'Completed') {
-                            logAction(`Job completed for ${jobName}`);
-                            hideStatus();
-                            displayMainTagResult(jobName, isClearJob);
-                            setDragAreaToFileSelected(uploadedFile.name);
-                        } else {
-                            logAction(`Job failed for ${jobName}`);
-                            hideStatus();
-                            if (statusText) statusText.textContent = `Job '${jobName}' failed. Check logs.`;
-                            if (statusPanel) statusPanel.classList.remove('hidden');
-                        }
-                    }
+            // --- PROGRESS CALCULATION ---
+            let current = 0;
+            let total = 0;
+            let percent = 0;
+
+            if (currentJob.progress && currentJob.progress.current && currentJob.progress.total) {
+                current = currentJob.progress.current;
+                total = currentJob.progress.total;
+                percent = Math.round((current / total) * 100);
+            }
+
+            // Update progress text
+            if (progressCount) {
+                if (total > 0) {
+                    progressCount.textContent = `Processing: ${current} / ${total} tracks (${percent}%)`;
+                } else if (trackCount > 0) {
+                    progressCount.textContent = `${trackCount} tracks processed`;
+                } else {
+                    progressCount.textContent = 'Initializing...';
                 }
-            } catch (error) {
-                console.error('Polling error:', error);
-                clearInterval(window.pollingIntervalId);
+            }
+
+            // Update progress bar width
+            if (progressBar) {
+                progressBar.style.width = total > 0 ? `${percent}%` : '5%';
+                progressBar.style.transition = 'width 0.5s ease-in-out';
+            }
+            // --------------------------------------
+
+            if (currentJob.status === 'Completed' || currentJob.status === 'Failed') {
                 isProcessingJob = false;
-                hideStatus();
-                if (statusText) statusText.textContent = `Polling failed: ${error.message}`;
-                if (statusPanel) statusPanel.classList.remove('hidden');
+
+                if (currentJob.status === 'Completed') {
+                    logAction(`Job completed for ${jobName}`);
+                    hideStatus();
+                    displayMainTagResult(jobName, isClearJob);
+                    setDragAreaToFileSelected(uploadedFile.name);
+                } else {
+                    logAction(`Job failed for ${jobName}`);
+                    hideStatus();
+                    if (statusText) statusText.textContent = `Job '${jobName}' failed. Check logs.`;
+                    if (statusPanel) statusPanel.classList.remove('hidden');
+                }
             }
-        }, 5000);
+        };
+
+        const handleTimeout = (maxPolls) => {
+            isProcessingJob = false;
+            hideStatus();
+            if (statusText) statusText.textContent = "Job timed out after 10 minutes. Please check server.";
+            if (statusPanel) statusPanel.classList.remove('hidden');
+            logAction(`Job ${jobIdToTrack} timed out after ${maxPolls} polling attempts.`);
+        };
+
+        const handleError = (error) => {
+            console.error('Polling error:', error);
+            isProcessingJob = false;
+            hideStatus();
+            if (statusText) statusText.textContent = `Polling failed: ${error.message}`;
+            if (statusPanel) statusPanel.classList.remove('hidden');
+        };
+
+        watchJob(jobIdToTrack, handleUpdate, handleTimeout, handleError);
     }
 
     function pollSplitJobStatus(jobIdToTrack) {
-        let pollAttempts = 0;
-        const MAX_POLLS = 120;
+        const handleUpdate = (currentJob) => {
+            showStatus(`Processing ${currentJob.job_display_name}... (Status: ${currentJob.status})`);
 
-        if (window.splitPollingIntervalId) clearInterval(window.splitPollingIntervalId);
-
-        window.splitPollingIntervalId = setInterval(async () => {
-            if (pollAttempts++ > MAX_POLLS) {
-                clearInterval(window.splitPollingIntervalId);
+            if (currentJob.status === 'Completed' || currentJob.status === 'Failed') {
                 isProcessingJob = false;
-                hideStatus();
-                if (statusText) statusText.textContent = "Split job timed out after 10 minutes. Please check server.";
-                if (statusPanel) statusPanel.classList.remove('hidden');
-                logAction(`Split job ${jobIdToTrack} timed out after ${MAX_POLLS} polling attempts.`);
-                return;
-            }
 
-            try {
-                const response = await fetch(`${API_BASE_URL}/history`);
-                if (!response.ok) throw new Error('Failed to fetch history');
-                const history = await response.json();
-                const currentJob = history.find(job => job.id === jobIdToTrack);
-
-                if (currentJob) {
-                    showStatus(`Processing ${currentJob.job_display_name}... (Status: ${currentJob.status})`);
-
-                    if (currentJob.status === 'Completed' || currentJob.status === 'Failed') {
-                        clearInterval(window.splitPollingIntervalId);
-                        isProcessingJob = false;
-
-                        if (currentJob.status === 'Completed' && currentJob.result_data) {
-                            // Save split results and redirect to workspace
-                            sessionStorage.setItem('lastSplitResults', currentJob.result_data);
-                            sessionStorage.setItem('taggedSplitFiles', JSON.stringify([]));
-                            logAction(`Split job ${jobIdToTrack} completed successfully. Redirecting to workspace.`);
-                            window.location.href = 'workspace.html';
-                        } else {
-                            hideStatus();
-                            if (statusText) statusText.textContent = `Job '${currentJob.job_display_name}' failed. Check logs.`;
-                            if (statusPanel) statusPanel.classList.remove('hidden');
-                            logAction(`Split job ${jobIdToTrack} failed.`);
-                        }
-                    }
+                if (currentJob.status === 'Completed' && currentJob.result_data) {
+                    // Save split results and redirect to workspace
+                    sessionStorage.setItem('lastSplitResults', currentJob.result_data);
+                    sessionStorage.setItem('taggedSplitFiles', JSON.stringify([]));
+                    logAction(`Split job ${jobIdToTrack} completed successfully. Redirecting to workspace.`);
+                    window.location.href = 'workspace.html';
+                } else {
+                    hideStatus();
+                    if (statusText) statusText.textContent = `Job '${currentJob.job_display_name}' failed. Check logs.`;
+                    if (statusPanel) statusPanel.classList.remove('hidden');
+                    logAction(`Split job ${jobIdToTrack} failed.`);
                 }
-            } catch (error) {
-                console.error('Split polling error:', error);
-                clearInterval(window.splitPollingIntervalId);
-                isProcessingJob = false;
-                hideStatus();
-                if (statusText) statusText.textContent = `Polling failed: ${error.message}`;
-                if (statusPanel) statusPanel.classList.remove('hidden');
             }
-        }, 5000);
+        };
+
+        const handleTimeout = (maxPolls) => {
+            isProcessingJob = false;
+            hideStatus();
+            if (statusText) statusText.textContent = "Split job timed out after 10 minutes. Please check server.";
+            if (statusPanel) statusPanel.classList.remove('hidden');
+            logAction(`Split job ${jobIdToTrack} timed out after ${maxPolls} polling attempts.`);
+        };
+
+        const handleError = (error) => {
+            console.error('Split polling error:', error);
+            isProcessingJob = false;
+            hideStatus();
+            if (statusText) statusText.textContent = `Polling failed: ${error.message}`;
+            if (statusPanel) statusPanel.classList.remove('hidden');
+        };
+
+        watchJob(jobIdToTrack, handleUpdate, handleTimeout, handleError);
     }
 
     // --- 7. CHECK FOR ACTIVE JOBS ON PAGE LOAD ---
 
     async function checkForActiveJobs() {
         try {
-            const response = await fetch(`${API_BASE_URL}/history`);
+            const response = await fetch(
+                `${API_BASE_URL}/history?status=In%20Progress&limit=1&fields=id,job_type,job_display_name`
+            );
             if (!response.ok) return;
 
-            const history = await response.json();
-            const activeJob = history.find(job => job.status === 'In Progress');
+            const page = await response.json();
+            const activeJob = page.jobs[0];
 
             if (activeJob) {
                 console.log("Found active job on page load:", activeJob);
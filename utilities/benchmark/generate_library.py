@@ -0,0 +1,154 @@
+# generate_library.py
+import sys
+import random
+from xml.sax.saxutils import quoteattr
+
+
+# Genre tags as they appear in real libraries: single genres, comma and
+# slash separated lists, and the odd messy spelling.
+SAMPLE_GENRES = [
+    "Deep House", "Tech House", "House", "Techno", "Minimal / Deep Tech",
+    "Melodic House & Techno", "Drum & Bass", "Breaks", "Trance",
+    "Disco/Funk", "Nu Disco", "Hip Hop", "Hip-Hop, Rap", "R&B", "Soul",
+    "Jazz, Soul", "Afro House", "Reggae", "Ambient", "Downtempo",
+    "Electronica", "Pop", "Indie Dance", "Rock", "Latin", "Amapiano",
+    "UK Garage", "Dubstep", "Progressive House", "Acid"
+]
+
+SAMPLE_WORDS = [
+    "Midnight", "Sunrise", "Groove", "Echo", "Velvet", "Signal", "Drift",
+    "Pulse", "Horizon", "Gravity", "Neon", "Shadow", "Mirage", "Ritual",
+    "Orbit", "Fever", "Motion", "Harbour", "Static", "Bloom", "Café",
+    "Señorita", "Über", "Lights", "Waves", "Dreams", "Machine", "Soul"
+]
+
+MIX_NAMES = ["Original Mix", "Extended Mix", "Dub", "Remix", "Edit",
+             "Radio Edit", "Instrumental", "VIP"]
+
+KEYS = ["1A", "2A", "3A", "4A", "5A", "6A", "7A", "8A", "9A", "10A", "11A",
+        "12A", "1B", "2B", "3B", "4B", "5B", "6B", "7B", "8B", "9B", "10B",
+        "11B", "12B"]
+
+COLOURS = ["0xFF007F", "0xFFA500", "0xFFFF00", "0x00FF00", "0x25FDE9",
+           "0x0000FF", "0x660099"]
+
+
+def random_title(rng):
+    """Builds a track title like 'Velvet Signal (Extended Mix)'."""
+    words = rng.sample(SAMPLE_WORDS, rng.randint(1, 3))
+    return f"{' '.join(words)} ({rng.choice(MIX_NAMES)})"
+
+
+def make_track(rng, track_id, name, artist, untagged):
+    """Returns the attributes of one COLLECTION TRACK element."""
+    bpm = rng.uniform(70, 175)
+    year = rng.randint(1975, 2025)
+    attrs = {
+        "TrackID": str(track_id),
+        "Name": name,
+        "Artist": artist,
+        "Composer": "",
+        "Album": f"{rng.choice(SAMPLE_WORDS)} EP",
+        "Grouping": "",
+        "Genre": "" if untagged else rng.choice(SAMPLE_GENRES),
+        "Kind": "MP3 File",
+        "Size": str(rng.randint(4_000_000, 25_000_000)),
+        "TotalTime": str(rng.randint(150, 540)),
+        "DiscNumber": "0",
+        "TrackNumber": str(rng.randint(1, 12)),
+        "Year": str(year),
+        "AverageBpm": f"{bpm:.2f}",
+        "DateAdded": f"{rng.randint(2015, 2025)}-0{rng.randint(1, 9)}-1"
+                     f"{rng.randint(0, 9)}",
+        "BitRate": "320",
+        "SampleRate": "44100",
+        "Comments": rng.choice(["", "", "", "Great opener", "Vinyl rip",
+                                "Played at sunset <3"]),
+        "PlayCount": str(rng.randint(0, 40)),
+        "Rating": "0",
+        "Location": f"file://localhost/Music/{artist}/{name}.mp3"
+                    .replace(" ", "%20"),
+        "Remixer": "",
+        "Tonality": rng.choice(KEYS),
+        "Label": f"{rng.choice(SAMPLE_WORDS)} Records",
+        "Mix": ""
+    }
+    if rng.random() < 0.1:
+        attrs["Colour"] = rng.choice(COLOURS)
+    return attrs, bpm
+
+
+def write_track(f, attrs, bpm, rng):
+    """Writes one TRACK with its TEMPO and cue POSITION_MARK children."""
+    f.write("    <TRACK " + " ".join(
+        f"{k}={quoteattr(v)}" for k, v in attrs.items()) + ">\n")
+    f.write(f'      <TEMPO Inizio="0.025" Bpm="{bpm:.2f}" Metro="4/4" '
+            f'Battito="1"/>\n')
+    for num in range(rng.randint(0, 3)):
+        f.write(f'      <POSITION_MARK Name="" Type="0" '
+                f'Start="{rng.uniform(0, 300):.3f}" Num="{num}"/>\n')
+    f.write("    </TRACK>\n")
+
+
+def write_library(path, track_count, untagged_ratio=0.1, duplicate_rate=0.05,
+                  seed=42):
+    """Writes a Rekordbox DJ_PLAYLISTS library with track_count tracks.
+
+    untagged_ratio is the share of tracks with an empty Genre tag and
+    duplicate_rate the share that repeat an earlier track's Name and
+    Artist under a new TrackID, as happens when the same song is imported
+    twice. The same seed always produces the same file.
+    """
+    rng = random.Random(seed)
+    artists = [f"{rng.choice(SAMPLE_WORDS)} {rng.choice(SAMPLE_WORDS)}"
+               for _ in range(max(1, track_count // 8))]
+    seen_keys = []
+    seen_key_set = set()
+    playlist_ids = []
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<DJ_PLAYLISTS Version="1.0.0">\n')
+        f.write('  <PRODUCT Name="rekordbox" Version="6.8.5" '
+                'Company="AlphaTheta"/>\n')
+        f.write(f'  <COLLECTION Entries="{track_count}">\n')
+        for track_id in range(1, track_count + 1):
+            if seen_keys and rng.random() < duplicate_rate:
+                name, artist = rng.choice(seen_keys)
+            else:
+                name, artist = random_title(rng), rng.choice(artists)
+                while (name, artist) in seen_key_set:
+                    name = f"{name} {rng.randint(2, 99)}"
+                seen_keys.append((name, artist))
+                seen_key_set.add((name, artist))
+            attrs, bpm = make_track(rng, track_id, name, artist,
+                                    rng.random() < untagged_ratio)
+            write_track(f, attrs, bpm, rng)
+            if rng.random() < 0.2:
+                playlist_ids.append(track_id)
+        f.write('  </COLLECTION>\n')
+        f.write('  <PLAYLISTS>\n')
+        f.write('    <NODE Type="0" Name="ROOT" Count="1">\n')
+        f.write(f'      <NODE Name="Benchmark" Type="1" KeyType="0" '
+                f'Entries="{len(playlist_ids)}">\n')
+        for track_id in playlist_ids:
+            f.write(f'        <TRACK Key="{track_id}"/>\n')
+        f.write('      </NODE>\n')
+        f.write('    </NODE>\n')
+        f.write('  </PLAYLISTS>\n')
+        f.write('</DJ_PLAYLISTS>\n')
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python generate_library.py <output.xml> <track_count> "
+              "[untagged_ratio] [duplicate_rate] [seed]")
+        sys.exit(1)
+
+    write_library(
+        sys.argv[1], int(sys.argv[2]),
+        untagged_ratio=float(sys.argv[3]) if len(sys.argv) > 3 else 0.1,
+        duplicate_rate=float(sys.argv[4]) if len(sys.argv) > 4 else 0.05,
+        seed=int(sys.argv[5]) if len(sys.argv) > 5 else 42
+    )
+    print(f"Wrote {sys.argv[2]} tracks to {sys.argv[1]}")
@@ -0,0 +1,151 @@
+# mock_llm.py
+import re
+import sys
+import json
+import time
+import zlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+PRIMARY_GENRES = ["House", "Techno", "Drum & Bass", "Funk/Soul/Disco",
+                  "Hip Hop / Rap", "Jazz", "Pop", "Ambient/Downtempo"]
+SUB_GENRES = ["Deep House", "Tech House", "Acid Techno", "Nu Disco",
+              "Liquid Funk", "Boom Bap", "Downtempo"]
+COMPONENTS = ["Vocal", "Instrumental", "Piano", "Strings", "Saxophone"]
+ENERGY_VIBES = ["Driving", "Hypnotic", "Uplifting", "Mellow", "Funky"]
+SITUATIONS = ["Warmup", "Peak Hour", "Closer", "Sunset", "Afterhours"]
+TIME_PERIODS = ["1980s", "1990s", "2000s", "2010s", "2020s"]
+
+
+def pick(options, seed, count):
+    """Deterministically picks count items from options."""
+    return [options[(seed + i) % len(options)] for i in range(count)]
+
+
+def tags_for_track(track):
+    """Returns a stable full-mode tag response for one track string."""
+    seed = zlib.crc32(track.encode("utf-8"))
+    return {
+        "primary_genre": PRIMARY_GENRES[seed % len(PRIMARY_GENRES)],
+        "sub_genre": pick(SUB_GENRES, seed, 1 + seed % 3),
+        "energy_level": 1 + seed % 10,
+        "components": pick(COMPONENTS, seed >> 3, 1 + seed % 2),
+        "energy_vibe": pick(ENERGY_VIBES, seed >> 5, 2),
+        "situation_environment": pick(SITUATIONS, seed >> 7, 2),
+        "time_period": pick(TIME_PERIODS, seed >> 9, 1)
+    }
+
+
+def bucket_for_genre(genre):
+    """Maps a genre name to a main bucket the way a sensible model would."""
+    lowered = genre.lower()
+    if any(w in lowered for w in ("house", "techno", "trance", "bass",
+                                  "breaks", "garage", "dubstep", "acid",
+                                  "electronica", "ambient", "downtempo")):
+        return "Electronic"
+    if "hip" in lowered or "rap" in lowered or "r&b" in lowered:
+        return "Hip Hop"
+    if any(w in lowered for w in ("jazz", "funk", "soul", "disco")):
+        return "Jazz-Funk-Soul"
+    if "rock" in lowered or "indie" in lowered:
+        return "Rock"
+    if "pop" in lowered:
+        return "Pop"
+    if any(w in lowered for w in ("reggae", "latin", "afro", "amapiano")):
+        return "World"
+    return "Miscellaneous"
+
+
+class MockChatHandler(BaseHTTPRequestHandler):
+    """Answers chat-completions requests like the tagging model would.
+
+    Understands the three prompt shapes app.py sends: single-track tags,
+    batched tags keyed by id, and genre-to-bucket maps. Each request
+    sleeps for the server's latency before replying.
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length))
+        prompt = payload["messages"][0]["content"]
+        kind, content = self.server.answer(prompt)
+        self.server.record(kind)
+        time.sleep(self.server.latency)
+
+        body = json.dumps({
+            "choices": [{"message": {"content": json.dumps(content)}}]
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """Local OpenAI-compatible server that counts calls by prompt kind."""
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, port=0):
+        super().__init__(("127.0.0.1", port), MockChatHandler)
+        self.latency = latency
+        self.calls = {"tag": 0, "tag_batch": 0, "genre_map": 0}
+        self.calls_lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def record(self, kind):
+        with self.calls_lock:
+            self.calls[kind] += 1
+
+    def snapshot(self):
+        """Returns a copy of the call counters."""
+        with self.calls_lock:
+            return dict(self.calls)
+
+    def answer(self, prompt):
+        """Returns (kind, JSON content) for one prompt."""
+        if "Genres to categorize:" in prompt:
+            listed = re.search(r"Genres to categorize: \[(.*)\]\.",
+                               prompt).group(1)
+            genres = re.findall(r"'([^']*)'", listed)
+            return "genre_map", {g: bucket_for_genre(g) for g in genres}
+
+        if "Tracks:\n" in prompt:
+            tracks = [json.loads(line) for line in prompt.splitlines()
+                      if line.startswith('{"id"')]
+            return "tag_batch", {t["id"]: tags_for_track(t["track"])
+                                 for t in tracks}
+
+        track = re.search(r"Track: '(.*)'", prompt).group(1)
+        return "tag", tags_for_track(track)
+
+
+def start_mock_llm(latency=0.0, port=0):
+    """Starts the mock server in a background thread and returns it."""
+    server = MockLLMServer(latency=latency, port=port)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    latency_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 200
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8765
+
+    server = MockLLMServer(latency=latency_ms / 1000, port=port)
+    print(f"Mock LLM listening on {server.base_url} "
+          f"({latency_ms:.0f} ms per call). "
+          f"Set OPENAI_BASE_URL to this URL to use it.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nCalls served: {server.snapshot()}")
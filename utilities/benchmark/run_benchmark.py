@@ -0,0 +1,266 @@
+# run_benchmark.py
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import contextlib
+import subprocess
+from contextlib import contextmanager
+
+from generate_library import write_library
+from mock_llm import start_mock_llm
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+PIPELINES = ["tagging", "split", "analyze"]
+
+
+# --- PHASE (runs in a fresh child process) ---
+
+def timed_db_cursor_factory(db_cursor, totals):
+    """Wraps app.db_cursor so time spent inside it is added to totals."""
+    @contextmanager
+    def timed_db_cursor():
+        start = time.perf_counter()
+        try:
+            with db_cursor() as cursor:
+                yield cursor
+        finally:
+            totals["db_seconds"] += time.perf_counter() - start
+    return timed_db_cursor
+
+
+def run_pipeline(app_module, pipeline, library_path, work_dir):
+    """Runs one pipeline end to end against library_path."""
+    if pipeline == "tagging":
+        output_path = os.path.join(work_dir, "tagged.xml")
+        log_id = app_module.log_job_start(
+            os.path.basename(library_path), library_path, "tagging",
+            "Benchmark"
+        )
+        result = app_module.process_library_task(
+            log_id, library_path, output_path, {"level": "Detailed"}
+        )
+        if "error" in result:
+            raise RuntimeError(result["error"])
+    elif pipeline == "split":
+        job_folder = tempfile.mkdtemp(prefix="split_", dir=work_dir)
+        app_module.split_xml_by_genre(library_path, job_folder)
+    elif pipeline == "analyze":
+        client = app_module.app.test_client()
+        with open(library_path, "rb") as f:
+            response = client.post(
+                "/analyze_library",
+                data={"file": (f, os.path.basename(library_path))},
+                content_type="multipart/form-data"
+            )
+        if response.status_code != 200:
+            raise RuntimeError(response.get_json())
+
+
+def run_phase(pipeline, library_path, work_dir, result_path):
+    """Times one pipeline run and writes its measurements as JSON.
+
+    Meant to run in its own process (see spawn_phase) so peak RSS covers
+    this pipeline alone. DATABASE_PATH and OPENAI_BASE_URL come from the
+    environment set by the parent.
+    """
+    sys.path.insert(0, REPO_ROOT)
+    with open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(devnull):
+        import app as app_module
+        app_module.app.test_cli_runner().invoke(args=["init-db"])
+
+        totals = {"db_seconds": 0.0}
+        app_module.db_cursor = timed_db_cursor_factory(
+            app_module.db_cursor, totals
+        )
+        start = time.perf_counter()
+        run_pipeline(app_module, pipeline, library_path, work_dir)
+        seconds = time.perf_counter() - start
+
+    with open(result_path, "w") as f:
+        json.dump({
+            "seconds": seconds,
+            "db_seconds": totals["db_seconds"],
+            "peak_rss_mb": resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss / 1024
+        }, f)
+
+
+# --- RUNNER ---
+
+def spawn_phase(pipeline, library_path, work_dir, database_path, server):
+    """Runs one phase in a child process and returns its measurements."""
+    result_path = os.path.join(work_dir, "phase_result.json")
+    env = dict(os.environ,
+               DATABASE_PATH=database_path,
+               OPENAI_BASE_URL=server.base_url,
+               OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "benchmark"))
+    calls_before = server.snapshot()
+    subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--phase", pipeline,
+         "--library", library_path, "--work-dir", work_dir,
+         "--result", result_path],
+        env=env, check=True
+    )
+    calls_after = server.snapshot()
+    with open(result_path) as f:
+        measured = json.load(f)
+    measured["llm_calls"] = {kind: calls_after[kind] - calls_before[kind]
+                             for kind in calls_after}
+    measured["llm_calls"]["total"] = sum(measured["llm_calls"].values())
+    return measured
+
+
+def benchmark_size(track_count, args, server, work_dir):
+    """Benchmarks every requested pipeline on one generated library.
+
+    Each cached pipeline gets its own database: the cold run starts empty
+    and the warm run repeats the job on the database the cold run filled.
+    """
+    library_path = os.path.join(work_dir, f"library_{track_count}.xml")
+    write_library(library_path, track_count,
+                  untagged_ratio=args.untagged_ratio,
+                  duplicate_rate=args.duplicate_rate, seed=args.seed)
+
+    results = []
+    for pipeline in args.pipelines:
+        database_path = os.path.join(
+            work_dir, f"{pipeline}_{track_count}.db"
+        )
+        cache_states = ["none"] if pipeline == "analyze" else ["cold", "warm"]
+        for cache in cache_states:
+            measured = spawn_phase(pipeline, library_path, work_dir,
+                                   database_path, server)
+            result = {
+                "pipeline": pipeline,
+                "tracks": track_count,
+                "cache": cache,
+                "seconds": round(measured["seconds"], 3),
+                "tracks_per_sec": round(track_count / measured["seconds"], 1),
+                "peak_rss_mb": round(measured["peak_rss_mb"], 1),
+                "db_seconds": round(measured["db_seconds"], 3),
+                "llm_calls": measured["llm_calls"]
+            }
+            print_row(result)
+            results.append(result)
+    return results
+
+
+def print_header():
+    print(f"{'Pipeline':<8} | {'Tracks':>7} | {'Cache':<5} | "
+          f"{'Seconds':>8} | {'Tracks/s':>9} | {'Peak MB':>8} | "
+          f"{'DB s':>8} | {'LLM calls':>9}")
+    print("-" * 84)
+
+
+def print_row(result):
+    print(f"{result['pipeline']:<8} | {result['tracks']:>7} | "
+          f"{result['cache']:<5} | {result['seconds']:>8.2f} | "
+          f"{result['tracks_per_sec']:>9.1f} | "
+          f"{result['peak_rss_mb']:>8.1f} | {result['db_seconds']:>8.3f} | "
+          f"{result['llm_calls']['total']:>9}")
+
+
+def compare_runs(results, baseline_path):
+    """Prints each result's change against a previous JSON report."""
+    with open(baseline_path) as f:
+        baseline = {(r["pipeline"], r["tracks"], r["cache"]): r
+                    for r in json.load(f)["results"]}
+
+    print(f"\n--- Compared with {baseline_path} ---\n")
+    print(f"{'Pipeline':<8} | {'Tracks':>7} | {'Cache':<5} | "
+          f"{'Tracks/s':>10} | {'Peak MB':>10} | {'LLM calls':>10}")
+    print("-" * 66)
+    for result in results:
+        before = baseline.get(
+            (result["pipeline"], result["tracks"], result["cache"])
+        )
+        if not before:
+            continue
+
+        def change(key):
+            old, new = before[key], result[key]
+            return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+        calls_delta = (result["llm_calls"]["total"] -
+                       before["llm_calls"]["total"])
+        print(f"{result['pipeline']:<8} | {result['tracks']:>7} | "
+              f"{result['cache']:<5} | {change('tracks_per_sec'):>10} | "
+              f"{change('peak_rss_mb'):>10} | {calls_delta:>+10}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the tagging, split and analyze pipelines "
+                    "on synthetic Rekordbox libraries."
+    )
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="Comma-separated library sizes in tracks.")
+    parser.add_argument("--pipelines", default=",".join(PIPELINES),
+                        help="Comma-separated pipelines to run.")
+    parser.add_argument("--latency-ms", type=float, default=20,
+                        help="Mock LLM latency per call in milliseconds.")
+    parser.add_argument("--untagged-ratio", type=float, default=0.1)
+    parser.add_argument("--duplicate-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results to this JSON file.")
+    parser.add_argument("--compare",
+                        help="Previous JSON report to compare against.")
+    parser.add_argument("--work-dir",
+                        help="Directory for libraries and databases.")
+    # Internal: used by spawn_phase to run one measured phase.
+    parser.add_argument("--phase", choices=PIPELINES,
+                        help=argparse.SUPPRESS)
+    parser.add_argument("--library", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.sizes = [int(s) for s in args.sizes.split(",") if s]
+    args.pipelines = [p for p in args.pipelines.split(",") if p]
+    unknown = set(args.pipelines) - set(PIPELINES)
+    if unknown:
+        parser.error(f"unknown pipelines: {', '.join(sorted(unknown))}")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.phase:
+        run_phase(args.phase, args.library, args.work_dir, args.result)
+        sys.exit(0)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="tag_genius_bench_")
+    os.makedirs(work_dir, exist_ok=True)
+    server = start_mock_llm(latency=args.latency_ms / 1000)
+    config = {
+        "sizes": args.sizes,
+        "pipelines": args.pipelines,
+        "latency_ms": args.latency_ms,
+        "untagged_ratio": args.untagged_ratio,
+        "duplicate_rate": args.duplicate_rate,
+        "seed": args.seed,
+        "llm_max_concurrency": os.environ.get("LLM_MAX_CONCURRENCY"),
+        "llm_batch_size": os.environ.get("LLM_BATCH_SIZE"),
+        "xml_backend": os.environ.get("XML_BACKEND")
+    }
+
+    print(f"\n--- Pipeline Benchmark ({args.latency_ms:.0f} ms mock LLM "
+          f"latency) ---\n")
+    print_header()
+    results = []
+    for track_count in args.sizes:
+        results.extend(benchmark_size(track_count, args, server, work_dir))
+    server.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": config, "results": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        compare_runs(results, args.compare)
+    print(f"\nLibraries and databases kept under {work_dir}")
@@ -0,0 +1,129 @@
+# benchmark_db.py
+import os
+import sys
+import io
+import time
+import sqlite3
+import tempfile
+import contextlib
+from contextlib import contextmanager
+
+
+def legacy_db_cursor_factory(database_path):
+    """Builds the original connect-per-use db_cursor for comparison."""
+    @contextmanager
+    def legacy_db_cursor():
+        conn = sqlite3.connect(database_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        try:
+            yield cursor
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    return legacy_db_cursor
+
+
+def write_library(path, track_count):
+    """Writes a minimal Rekordbox XML library with track_count tracks."""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<DJ_PLAYLISTS Version="1.0.0">\n')
+        f.write(f'  <COLLECTION Entries="{track_count}">\n')
+        for i in range(track_count):
+            f.write(f'    <TRACK TrackID="{i}" Name="Track {i}" '
+                    f'Artist="Artist {i % 100}" Genre="House" '
+                    f'AverageBpm="124.00" Comments="" Rating="0"/>\n')
+        f.write('  </COLLECTION>\n</DJ_PLAYLISTS>\n')
+
+
+def connections_per_second(app_module, duration=2.0):
+    """Counts how many db_cursor round trips complete per second."""
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        with app_module.db_cursor() as cursor:
+            cursor.execute("SELECT 1").fetchone()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def history_latency(app_module, requests_count=200):
+    """Returns p50 and p95 latency in ms for GET /history."""
+    client = app_module.app.test_client()
+    timings = []
+    for _ in range(requests_count):
+        start = time.perf_counter()
+        client.get('/history')
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+
+def tagging_time(app_module, library_path, output_path):
+    """Times a Clear-mode tagging job, which is dominated by DB writes."""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        app_module.process_library_task(1, library_path, output_path,
+                                        {"level": "Clear"})
+    return time.perf_counter() - start
+
+
+def run_benchmark(app_module, label, library_path, output_path):
+    """Runs every measurement and prints one result row."""
+    cps = connections_per_second(app_module)
+    p50, p95 = history_latency(app_module)
+    tag_seconds = tagging_time(app_module, library_path, output_path)
+    print(f"{label:<10} | {cps:>12.0f} | {p50:>12.2f} | {p95:>12.2f} | "
+          f"{tag_seconds:>10.2f}")
+
+
+def seed_database(app_module, history_rows):
+    """Creates the schema and fills processing_log with finished jobs."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        app_module.app.test_cli_runner().invoke(args=['init-db'])
+    with app_module.db_cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO processing_log (original_filename, status, "
+            "job_type, job_display_name) VALUES (?, ?, ?, ?)",
+            [(f"lib_{i}.xml", 'Completed', 'tagging', f"Job {i}")
+             for i in range(history_rows)]
+        )
+
+
+if __name__ == "__main__":
+    track_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    history_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    work_dir = tempfile.mkdtemp(prefix="tag_genius_bench_")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    import app as app_module
+
+    library_path = os.path.join(work_dir, "library.xml")
+    output_path = os.path.join(work_dir, "tagged.xml")
+    write_library(library_path, track_count)
+
+    print(f"\n--- SQLite Connection Benchmark ({track_count} tracks, "
+          f"{history_rows} history rows) ---\n")
+    print(f"{'Mode':<10} | {'Conn/sec':>12} | {'/history p50':>12} | "
+          f"{'/history p95':>12} | {'Tagging s':>10}")
+    print("-" * 68)
+
+    # Before: a fresh connection per use with default pragmas.
+    pooled_db_cursor = app_module.db_cursor
+    app_module.db_cursor = legacy_db_cursor_factory(
+        os.path.join(work_dir, "before.db")
+    )
+    seed_database(app_module, history_rows)
+    run_benchmark(app_module, "Before", library_path, output_path)
+
+    # After: pooled, WAL-mode connections on a separate database file.
+    app_module.db_cursor = pooled_db_cursor
+    app_module.DATABASE_PATH = os.path.join(work_dir, "after.db")
+    seed_database(app_module, history_rows)
+    run_benchmark(app_module, "After", library_path, output_path)
+    print(f"\nResults written under {work_dir}")
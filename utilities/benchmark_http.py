@@ -0,0 +1,93 @@
+# benchmark_http.py
+import os
+import sys
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+
+STUB_RESPONSE = json.dumps({
+    "choices": [{"message": {"content": json.dumps({
+        "primary_genre": "House", "sub_genre": ["Deep House"],
+        "energy_level": 6
+    })}}]
+}).encode('utf-8')
+
+
+class StubChatHandler(BaseHTTPRequestHandler):
+    """Answers every POST with a fixed chat-completions response."""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(STUB_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(STUB_RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server():
+    """Starts the stub server on a free local port and returns its URL."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubChatHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def time_calls(call, count):
+    """Returns per-call latencies in milliseconds, sorted."""
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings
+
+
+def report(label, timings):
+    """Prints mean, p50 and p95 for one set of timings."""
+    mean = sum(timings) / len(timings)
+    p50 = timings[len(timings) // 2]
+    p95 = timings[int(len(timings) * 0.95)]
+    print(f"{label:<22} | {mean:>9.3f} | {p50:>9.3f} | {p95:>9.3f}")
+
+
+if __name__ == "__main__":
+    call_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    server, base_url = start_stub_server()
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    import app as app_module
+
+    payload = {"model": app_module.OPENAI_MODEL,
+               "messages": [{"role": "user", "content": "ping"}]}
+    headers = {"Content-Type": "application/json",
+               "Authorization": f"Bearer {os.environ['OPENAI_API_KEY']}"}
+
+    def unpooled_call():
+        requests.post(app_module.OPENAI_CHAT_URL, headers=headers,
+                      data=json.dumps(payload), timeout=30).json()
+
+    def pooled_call():
+        app_module.post_chat_completion(payload, 30, "full").json()
+
+    print(f"\n--- HTTP Client Benchmark ({call_count} calls against "
+          f"{base_url}) ---\n")
+    print(f"{'Mode':<22} | {'Mean ms':>9} | {'p50 ms':>9} | {'p95 ms':>9}")
+    print("-" * 58)
+    report("requests.post", time_calls(unpooled_call, call_count))
+    report("pooled session", time_calls(pooled_call, call_count))
+    server.shutdown()
@@ -1,8 +1,14 @@
 # compare_ratings.py
-import xml.etree.ElementTree as ET
 import sys
 import os
 
+# lxml parses large libraries much faster; the standard library is used
+# when it is not installed.
+try:
+    from lxml import etree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
 
 def convert_rating_to_stars(rating_value):
     """Converts a Rekordbox XML rating value to a 1-5 star integer."""
@@ -32,7 +38,7 @@ def parse_xml_ratings(filepath):
 
             rating = track.get('Rating')
             ratings[key] = convert_rating_to_stars(rating)
-    except (ET.ParseError, FileNotFoundError) as e:
+    except (ET.ParseError, OSError) as e:
         print(f"Error parsing file {filepath}: {e}")
     return ratings
 
@@ -144,39 +144,57 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    // Poll job status
+    // Follow job status via server-sent events, falling back to polling
     function pollJobStatus(jobId, fileName) {
-        const pollInterval = setInterval(async () => {
-            try {
-                const response = await fetch(`${API_BASE_URL}/history`);
-                if (!response.ok) throw new Error('Failed to fetch history');
+        let pollInterval = null;
 
-                const history = await response.json();
-                const job = history.find(j => j.id === jobId);
+        const handleJob = (job) => {
+            if (job.status !== 'Completed' && job.status !== 'Failed') return false;
 
-                if (job && (job.status === 'Completed' || job.status === 'Failed')) {
+            if (job.status === 'Failed') {
+                alert(`Tagging failed for ${fileName}`);
+            }
+            // Reload the workspace to show updated button states
+            const lastSplitResults = sessionStorage.getItem('lastSplitResults');
+            if (lastSplitResults) {
+                displayFiles(JSON.parse(lastSplitResults));
+            }
+            return true;
+        };
+
+        const startPolling = () => {
+            pollInterval = setInterval(async () => {
+                try {
+                    const response = await fetch(`${API_BASE_URL}/job_status/${jobId}`);
+                    if (!response.ok) throw new Error('Failed to fetch job status');
+
+                    const job = await response.json();
+                    if (handleJob(job)) clearInterval(pollInterval);
+                } catch (error) {
+                    console.error('Polling error:', error);
                     clearInterval(pollInterval);
-
-                    if (job.status === 'Completed') {
-                        // Reload the workspace to show updated button states
-                        const lastSplitResults = sessionStorage.getItem('lastSplitResults');
-                        if (lastSplitResults) {
-                            displayFiles(JSON.parse(lastSplitResults));
-                        }
-                    } else {
-                        alert(`Tagging failed for ${fileName}`);
-                        // Reload to reset button states
-                        const lastSplitResults = sessionStorage.getItem('lastSplitResults');
-                        if (lastSplitResults) {
-                            displayFiles(JSON.parse(lastSplitResults));
-                        }
-                    }
                 }
-            } catch (error) {
-                console.error('Polling error:', error);
-                clearInterval(pollInterval);
-            }
-        }, 5000);
+            }, 5000);
+        };
+
+        if (!window.EventSource) {
+            startPolling();
+            return;
+        }
+
+        const source = new EventSource(`${API_BASE_URL}/job_events/${jobId}`);
+        // Streams end after a short while and EventSource reconnects;
+        // fall back to polling only after repeated failures.
+        let failedConnects = 0;
+        source.onopen = () => { failedConnects = 0; };
+        source.onmessage = (event) => {
+            if (handleJob(JSON.parse(event.data))) source.close();
+        };
+        source.onerror = () => {
+            if (source.readyState === EventSource.CONNECTING && ++failedConnects < 3) return;
+            source.close();
+            startPolling();
+        };
     }
 
     // Handle button clicks
@@ -225,11 +243,16 @@ document.addEventListener('DOMContentLoaded', () => {
     // Restore job from history database
     async function restoreJobFromHistory(jobId) {
         try {
-            const response = await fetch(`${API_BASE_URL}/history`);
-            if (!response.ok) throw new Error('Failed to fetch history');
+            const response = await fetch(`${API_BASE_URL}/job_status/${jobId}`);
+            if (response.status === 404) {
+                console.error('Job not found:', jobId);
+                loadingMessage.classList.add('hidden');
+                emptyMessage.classList.remove('hidden');
+                return;
+            }
+            if (!response.ok) throw new Error('Failed to fetch job status');
 
-            const history = await response.json();
-            const job = history.find(j => j.id == jobId);
+            const job = await response.json();
 
             if (!job) {
                 console.error('Job not found:', jobId);